@@ -1,4 +1,4 @@
-a/sample_conversations.json"""
+"""
 Causal Analysis System for Customer Service Conversations
 """
 
@@ -0,0 +1,536 @@
+"""
+Benchmark Suite for Causal Analysis System
+Measures memory and speed of the retrieval and analysis components
+on synthetic corpora of configurable size
+"""
+
+import gc
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+from models.pattern_analyzer import HAS_NUMPY, PatternAnalyzer
+from task1_retrieval import ConversationRetriever, TranscriptStore
+from task2_causal_analysis import CausalAnalyzer
+from utils.helpers import save_results
+
+
+DOMAINS = {
+    "Healthcare Services": [
+        "I can't log in to the patient portal",
+        "I've been waiting three weeks for my prescription refill",
+        "The app shows error code 3309 every time",
+        "I need to speak with a supervisor about my claim",
+        "Let me check your appointment history",
+    ],
+    "Banking": [
+        "I got a fraud alert about a charge I didn't make",
+        "I see a charge for $356.82 in New York",
+        "I'm blocking your card and reversing the charge",
+        "My account was locked after several attempts",
+        "You'll get a new card in 2-3 days",
+    ],
+    "E-commerce Retail": [
+        "The tracking shows delivered but I never received it",
+        "I checked my camera and asked my neighbor",
+        "We'll send a replacement with expedited shipping",
+        "The package went to the wrong address",
+        "I'd like a full refund for the order",
+    ],
+}
+
+STARTUP_BUDGET_S = 1.0
+
+# Runs in a fresh interpreter so module imports are measured cold
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+from main import CausalAnalysisSystem, create_sample_data
+imported = time.perf_counter()
+system = CausalAnalysisSystem(cache_dir=None, snapshot_dir=None, history_path=None)
+system.retriever.load_conversations(create_sample_data())
+system.loaded = True
+system.process_query("Why did the healthcare conversation escalate?")
+ready = time.perf_counter()
+print(imported - start, ready - start)
+"""
+
+INTENTS = [
+    "Escalation - Repeated Service Failures",
+    "Fraud Alert Investigation",
+    "Delivery Investigation",
+    "Refund Resolved with Compensation",
+    "Account Inquiry",
+]
+
+
+# The original per-turn layout, without __slots__, as the memory baseline
+@dataclass
+class BaselineTurn:
+    turn_id: int
+    speaker: str
+    text: str
+    timestamp: Optional[str] = None
+
+
+@dataclass
+class BaselineTranscript:
+    transcript_id: str
+    domain: str
+    outcome: str
+    turns: List[BaselineTurn]
+    metadata: Dict[str, Any]
+
+
+def generate_corpus(n_transcripts: int, seed: int = 0) -> Dict[str, List[Dict]]:
+    """Generate a synthetic corpus in the sample data format"""
+    rng = random.Random(seed)
+    filler = [s for phrases in DOMAINS.values() for s in phrases]
+    transcripts = []
+
+    for i in range(n_transcripts):
+        domain = rng.choice(list(DOMAINS))
+        turns = []
+        for j in range(rng.randint(4, 14)):
+            phrases = DOMAINS[domain] if rng.random() < 0.8 else filler
+            turns.append({
+                "speaker": "Agent" if j % 2 == 0 else "Customer",
+                "text": " ".join(rng.choice(phrases) + "." for _ in range(rng.randint(1, 3)))
+            })
+        transcripts.append({
+            "transcript_id": f"SYN-{i:07d}",
+            "domain": domain,
+            "intent": rng.choice(INTENTS),
+            "reason_for_call": rng.choice(DOMAINS[domain]),
+            "time_of_interaction": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} "
+                                   f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00",
+            "conversation": turns
+        })
+
+    return {"transcripts": transcripts}
+
+
+def generate_queries(n_queries: int, seed: int = 0) -> List[str]:
+    """Generate analyst-style questions over the synthetic domains"""
+    rng = random.Random(seed)
+    phrases = [s for phrases in DOMAINS.values() for s in phrases]
+    templates = [
+        "Why did customers say \"{}\"?",
+        "What caused calls where the customer said {}",
+        "Find conversations like: {}",
+    ]
+    return [rng.choice(templates).format(rng.choice(phrases).lower()) for _ in range(n_queries)]
+
+
+def uncompiled_pattern_outputs(analyzer: PatternAnalyzer, text: str) -> Tuple[Any, ...]:
+    """PatternAnalyzer outputs computed by passing every raw pattern to ``re`` one at a time"""
+    text_lower = text.lower()
+    scores = {
+        outcome: sum(1 for p in patterns if re.search(p, text_lower)) / len(patterns)
+        for outcome, patterns in analyzer.outcome_patterns.items()
+    }
+    best_outcome = max(scores, key=scores.get)
+    factors = []
+    for category, patterns in analyzer.causal_patterns.items():
+        for pattern, template in patterns:
+            match = re.search(pattern, text_lower)
+            if match:
+                factor = template.format(*match.groups()) if match.groups() else template
+                factors.append(f"{category.title()}: {factor}")
+    entities = {}
+    for entity_type, pattern in analyzer.entity_patterns.items():
+        matches = re.findall(pattern, text, re.IGNORECASE)
+        if matches:
+            entities[entity_type] = matches
+    return (best_outcome, scores[best_outcome]), factors, entities
+
+
+class SystemBenchmark:
+    """Benchmarks the causal analysis system"""
+
+    def __init__(self, n_transcripts: int = 5000):
+        self.data = generate_corpus(n_transcripts)
+        self.results = {
+            'timestamp': datetime.now().isoformat(),
+            'corpus_size': n_transcripts
+        }
+
+    def benchmark_memory(self) -> Dict[str, Any]:
+        """Compare bytes per turn of the original dataclass layout and the columnar store"""
+        print("\n📊 Benchmarking Transcript Memory")
+        print("-" * 50)
+
+        parser = ConversationRetriever(use_embeddings=False)
+        lines = [json.dumps(t) for t in self.data['transcripts']]
+
+        # Before: the original unslotted dataclass per turn plus a list and
+        # dict per transcript
+        gc.collect()
+        tracemalloc.start()
+        objects = {}
+        for idx, line in enumerate(lines):
+            transcript = parser._parse_conversation(json.loads(line), idx)
+            objects[transcript.transcript_id] = BaselineTranscript(
+                transcript_id=transcript.transcript_id,
+                domain=transcript.domain,
+                outcome=transcript.outcome,
+                turns=[
+                    BaselineTurn(turn.turn_id, turn.speaker, turn.text, turn.timestamp)
+                    for turn in transcript.turns
+                ],
+                metadata=transcript.metadata
+            )
+        transcript = None
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del objects
+
+        # After: columnar store built from the same records
+        gc.collect()
+        tracemalloc.start()
+        store = TranscriptStore(view_cache_size=0)
+        for idx, line in enumerate(lines):
+            store.add(parser._parse_conversation(json.loads(line), idx))
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        turns = max(store.turn_count, 1)
+        results = {
+            'turns': store.turn_count,
+            'objects_bytes': before,
+            'store_bytes': after,
+            'objects_bytes_per_turn': round(before / turns, 1),
+            'store_bytes_per_turn': round(after / turns, 1),
+            'reduction': round(before / max(after, 1), 2)
+        }
+
+        print(f"   Turns: {results['turns']}")
+        print(f"   Baseline dataclasses: {results['objects_bytes_per_turn']:.1f} bytes/turn")
+        print(f"   Columnar store: {results['store_bytes_per_turn']:.1f} bytes/turn")
+        print(f"   Reduction: {results['reduction']:.2f}x")
+
+        return results
+
+    def benchmark_startup(self) -> Dict[str, Any]:
+        """Measure cold import and time to first answered query"""
+        print("\n📊 Benchmarking Cold Startup")
+        print("-" * 50)
+
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        wall = time.perf_counter() - start
+        import_s, ready_s = (float(v) for v in output.split()[-2:])
+
+        results = {
+            'import_s': round(import_s, 3),
+            'first_query_s': round(ready_s, 3),
+            'process_wall_s': round(wall, 3),
+            'budget_s': STARTUP_BUDGET_S,
+            'within_budget': wall <= STARTUP_BUDGET_S
+        }
+
+        print(f"   Module import: {results['import_s'] * 1000:.0f}ms")
+        print(f"   First query answered: {results['first_query_s'] * 1000:.0f}ms")
+        print(f"   Process wall time: {results['process_wall_s'] * 1000:.0f}ms "
+              f"(budget {STARTUP_BUDGET_S * 1000:.0f}ms: {'✅' if results['within_budget'] else '❌'})")
+
+        return results
+
+    def benchmark_batch_queries(self, n_queries: int = 1000, top_k: int = 5) -> Dict[str, Any]:
+        """Compare queries/second of one-at-a-time and batched retrieval"""
+        print("\n📊 Benchmarking Batched Retrieval")
+        print("-" * 50)
+
+        queries = generate_queries(n_queries)
+        results = {'n_queries': n_queries, 'top_k': top_k}
+
+        for mode, use_embeddings in (('keyword', False), ('semantic', True)):
+            retriever = ConversationRetriever(use_embeddings=use_embeddings)
+            if use_embeddings and not retriever.has_embeddings:
+                continue
+            retriever.load_conversations(self.data)
+            retriever.warm_up()
+            retriever.retrieve_many(queries[:8], top_k)
+
+            start = time.perf_counter()
+            single = [retriever.retrieve(q, top_k) for q in queries]
+            single_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            batched = retriever.retrieve_many(queries, top_k)
+            batched_s = time.perf_counter() - start
+
+            results[mode] = {
+                'single_qps': round(n_queries / single_s, 1),
+                'batched_qps': round(n_queries / batched_s, 1),
+                'speedup': round(single_s / batched_s, 2),
+                # Batched BLAS kernels can differ in the last bit, reordering exact ties
+                'agreement': round(sum(
+                    set(a) == set(b) for a, b in zip(single, batched)
+                ) / n_queries, 3)
+            }
+            print(f"   {mode.capitalize()}: {results[mode]['single_qps']:.0f} -> "
+                  f"{results[mode]['batched_qps']:.0f} queries/s "
+                  f"({results[mode]['speedup']:.2f}x, agreement {results[mode]['agreement']:.1%})")
+
+        return results
+
+    def benchmark_filters(self, n_queries: int = 200, top_k: int = 5) -> Dict[str, Any]:
+        """Compare per-query latency with and without metadata filters"""
+        print("\n📊 Benchmarking Filtered Retrieval")
+        print("-" * 50)
+
+        retriever = ConversationRetriever(use_embeddings=False)
+        retriever.load_conversations(self.data)
+        queries = generate_queries(n_queries)
+        filter_sets = {
+            'domain': {'domain': 'Banking'},
+            'domain_outcome_month': {
+                'domain': 'Banking', 'outcome': 'fraud_resolved',
+                'since': '2025-06-01', 'until': '2025-06-30 23:59:59'
+            }
+        }
+
+        start = time.perf_counter()
+        for q in queries:
+            retriever.retrieve(q, top_k)
+        unfiltered_ms = (time.perf_counter() - start) * 1000 / n_queries
+        results = {'unfiltered_ms': round(unfiltered_ms, 3)}
+        print(f"   Unfiltered: {unfiltered_ms:.3f}ms/query")
+
+        for name, filters in filter_sets.items():
+            selected = len(retriever.metadata_index.match(**filters))
+            start = time.perf_counter()
+            for q in queries:
+                retriever.retrieve(q, top_k, filters=filters)
+            elapsed = (time.perf_counter() - start) * 1000 / n_queries
+            results[name] = {
+                'selectivity': round(selected / max(len(retriever.store), 1), 4),
+                'avg_time_ms': round(elapsed, 3)
+            }
+            print(f"   {name}: {elapsed:.3f}ms/query "
+                  f"({results[name]['selectivity']:.1%} of corpus)")
+
+        return results
+
+    def benchmark_shards(self, n_queries: int = 500, top_k: int = 5) -> Dict[str, Any]:
+        """Keyword throughput from one process up to one shard worker per core"""
+        print("\n📊 Benchmarking Sharded Retrieval")
+        print("-" * 50)
+
+        queries = generate_queries(n_queries)
+        worker_counts = [1]
+        while worker_counts[-1] < max(os.cpu_count() or 1, 2):
+            worker_counts.append(worker_counts[-1] * 2)
+        results = {'n_queries': n_queries, 'cpu_count': os.cpu_count(), 'settings': []}
+        baseline_ids = None
+        baseline_qps = None
+
+        for workers in worker_counts:
+            # One worker means scoring in this process
+            retriever = ConversationRetriever(use_embeddings=False, n_shards=workers if workers > 1 else 0)
+            retriever.load_conversations(self.data)
+            start = time.perf_counter()
+            retriever.retrieve_many(queries[:1], top_k)
+            startup_s = time.perf_counter() - start
+            if workers > 1 and retriever._shards is None:
+                print("   Skipped: shard workers could not be started (numpy is required)")
+                break
+
+            start = time.perf_counter()
+            ids = retriever.retrieve_many(queries, top_k)
+            qps = n_queries / (time.perf_counter() - start)
+            retriever.close_shards()
+
+            if baseline_ids is None:
+                baseline_ids, baseline_qps = ids, qps
+            setting = {
+                'workers': workers,
+                'startup_s': round(startup_s, 3),
+                'qps': round(qps, 1),
+                'speedup': round(qps / baseline_qps, 2),
+                'same_results': ids == baseline_ids
+            }
+            results['settings'].append(setting)
+            print(f"   {workers:>2} worker(s): {qps:.0f} queries/s ({setting['speedup']:.2f}x, "
+                  f"startup {startup_s:.2f}s, same results: {setting['same_results']})")
+
+        return results
+
+    def benchmark_analysis(self, n_queries: int = 500, top_k: int = 3) -> Dict[str, Any]:
+        """Compare analysis latency with features extracted per call and memoized"""
+        print("\n📊 Benchmarking Causal Analysis")
+        print("-" * 50)
+
+        retriever = ConversationRetriever(use_embeddings=False)
+        retriever.load_conversations(self.data)
+        queries = generate_queries(n_queries)
+        batches = [
+            (q, [retriever.get_transcript(tid) for tid in retriever.retrieve(q, top_k)])
+            for q in queries
+        ]
+
+        results = {}
+        explanations = {}
+        for name, cache_size in (('uncached', 0), ('memoized', 4096)):
+            analyzer = CausalAnalyzer(feature_cache_size=cache_size)
+            for q, transcripts in batches:
+                analyzer.analyze(q, transcripts, include_history=False)
+            start = time.perf_counter()
+            explanations[name] = [
+                analyzer.analyze(q, transcripts, include_history=False) for q, transcripts in batches
+            ]
+            elapsed = (time.perf_counter() - start) * 1e6 / n_queries
+            results[name + '_us'] = round(elapsed, 1)
+            print(f"   {name.capitalize()} features: {elapsed:.1f}us/analysis")
+
+        results['speedup'] = round(results['uncached_us'] / max(results['memoized_us'], 1e-9), 2)
+        results['same_results'] = all(
+            (a.primary_cause, a.supporting_factors, a.evidence_spans) ==
+            (b.primary_cause, b.supporting_factors, b.evidence_spans)
+            for a, b in zip(explanations['uncached'], explanations['memoized'])
+        )
+        print(f"   Speedup: {results['speedup']:.2f}x (same results: {results['same_results']})")
+
+        return results
+
+    def benchmark_patterns(self, n_texts: int = 1000, repeats: int = 3) -> Dict[str, Any]:
+        """PatternAnalyzer throughput with raw patterns and with compiled, literal-gated ones"""
+        print("\n📊 Benchmarking Pattern Analyzer")
+        print("-" * 50)
+
+        analyzer = PatternAnalyzer()
+        texts = [
+            " ".join(turn["text"] for turn in transcript["conversation"])
+            for transcript in self.data["transcripts"][:n_texts]
+        ]
+        kb = sum(len(text) for text in texts) / 1024
+
+        def compiled_outputs(text):
+            return (
+                analyzer.classify_outcome(text),
+                analyzer.extract_causal_factors(text),
+                analyzer.extract_entities(text)
+            )
+
+        results = {'kb': round(kb, 1)}
+        outputs = {}
+        for name, run in (('uncompiled', lambda text: uncompiled_pattern_outputs(analyzer, text)),
+                          ('compiled', compiled_outputs)):
+            best = float('inf')
+            for _ in range(repeats):
+                start = time.perf_counter()
+                outputs[name] = [run(text) for text in texts]
+                best = min(best, time.perf_counter() - start)
+            results[name + '_us_per_kb'] = round(best * 1e6 / kb, 1)
+            print(f"   {name.capitalize()} patterns: {best * 1e6 / kb:.1f}us/KB ({kb / 1024 / best:.1f} MB/s)")
+
+        results['speedup'] = round(results['uncompiled_us_per_kb'] / max(results['compiled_us_per_kb'], 1e-9), 2)
+        results['same_results'] = outputs['uncompiled'] == outputs['compiled']
+        print(f"   Speedup: {results['speedup']:.2f}x (same results: {results['same_results']})")
+
+        if HAS_NUMPY:
+            start = time.perf_counter()
+            single = [analyzer.classify_outcome(text) for text in texts]
+            single_s = time.perf_counter() - start
+            start = time.perf_counter()
+            _, labels, confidences = analyzer.classify_many(texts)
+            batch_s = time.perf_counter() - start
+            results['classify_per_s'] = round(len(texts) / max(single_s, 1e-9), 1)
+            results['classify_many_per_s'] = round(len(texts) / max(batch_s, 1e-9), 1)
+            results['same_labels'] = single == list(zip(labels, confidences.tolist()))
+            print(f"   Outcomes: {results['classify_per_s']:.0f}/s one at a time, "
+                  f"{results['classify_many_per_s']:.0f}/s with classify_many "
+                  f"(same labels: {results['same_labels']})")
+
+        return results
+
+    def benchmark_corpus_analysis(self, chunk_size: int = 500) -> Dict[str, Any]:
+        """Corpus-wide analysis throughput from one process up to one worker per core"""
+        print("\n📊 Benchmarking Corpus Analysis")
+        print("-" * 50)
+
+        retriever = ConversationRetriever(use_embeddings=False)
+        retriever.load_conversations(self.data)
+        analyzer = CausalAnalyzer()
+        worker_counts = [1]
+        while worker_counts[-1] < max(os.cpu_count() or 1, 2):
+            worker_counts.append(worker_counts[-1] * 2)
+        results = {'cpu_count': os.cpu_count(), 'settings': []}
+        baseline_rate = None
+
+        with tempfile.TemporaryDirectory() as directory:
+            for workers in worker_counts:
+                report = analyzer.analyze_corpus(
+                    retriever,
+                    os.path.join(directory, f"explanations-{workers}.jsonl"),
+                    n_workers=workers,
+                    chunk_size=chunk_size
+                )
+                rate = report['transcripts'] / max(report['elapsed_s'], 1e-9)
+                if baseline_rate is None:
+                    baseline_rate = rate
+                setting = {
+                    'workers': workers,
+                    'elapsed_s': report['elapsed_s'],
+                    'transcripts_per_s': round(rate, 1),
+                    'speedup': round(rate / baseline_rate, 2)
+                }
+                results['settings'].append(setting)
+                print(f"   {workers:>2} worker(s): {rate:.0f} transcripts/s ({setting['speedup']:.2f}x)")
+
+        return results
+
+    def run_benchmarks(self) -> Dict[str, Any]:
+        """Run all benchmarks"""
+        print("\n" + "=" * 60)
+        print("⏱️  CAUSAL ANALYSIS SYSTEM BENCHMARKS")
+        print("=" * 60)
+        print(f"   Corpus: {self.results['corpus_size']} synthetic transcripts")
+
+        self.results['startup'] = self.benchmark_startup()
+        self.results['memory'] = self.benchmark_memory()
+        self.results['batch_queries'] = self.benchmark_batch_queries()
+        self.results['filters'] = self.benchmark_filters()
+        self.results['shards'] = self.benchmark_shards()
+        self.results['analysis'] = self.benchmark_analysis()
+        self.results['patterns'] = self.benchmark_patterns()
+        self.results['corpus_analysis'] = self.benchmark_corpus_analysis()
+
+        print("=" * 60)
+        return self.results
+
+    def save_results(self, output_path: str = "benchmark_results.json"):
+        """Save benchmark results to file"""
+        save_results(self.results, output_path)
+        print(f"\n✅ Results saved to: {output_path}")
+
+
+def main():
+    """Main benchmark entry point"""
+    n_transcripts = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    benchmark = SystemBenchmark(n_transcripts)
+    benchmark.run_benchmarks()
+    benchmark.save_results("benchmark_results.json")
+
+
+if __name__ == "__main__":
+    main()
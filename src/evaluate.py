@@ -14,6 +14,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 from src.task1_retrieval import ConversationRetriever
 from src.task2_causal_analysis import CausalAnalyzer
+from src.models.vector_index import VectorIndex
 from src.utils.helpers import load_json_file, save_results
 
 
@@ -32,12 +33,10 @@ class SystemEvaluator:
     
     def load_data(self, conv_path: str, query_path: str) -> bool:
         """Load conversation and query data"""
-        conv_data = load_json_file(conv_path)
-        if conv_data:
-            self.retriever.load_conversations(conv_data)
+        count = self.retriever.load_file(conv_path)
         
         self.queries = load_json_file(query_path)
-        return conv_data is not None and self.queries is not None
+        return count > 0 and self.queries is not None
     
     def evaluate_task1(self) -> Dict[str, Any]:
         """Evaluate Task 1: Conversation Retrieval"""
@@ -53,18 +52,18 @@ class SystemEvaluator:
         }
         
         queries = self.queries.get('queries', [])
-        total_time = 0
         domain_correct = 0
         
-        for query_data in queries:
+        # Retrieve the whole query set as one batch
+        start_time = time.time()
+        retrieved = self.retriever.retrieve_many([q['query'] for q in queries], top_k=1)
+        total_time = (time.time() - start_time) * 1000
+        elapsed = total_time / max(len(queries), 1)
+        
+        for query_data, retrieved_ids in zip(queries, retrieved):
             query = query_data['query']
             expected_domain = query_data.get('expected_domain', '')
             
-            start_time = time.time()
-            retrieved_ids = self.retriever.retrieve(query, top_k=1)
-            elapsed = (time.time() - start_time) * 1000
-            
-            total_time += elapsed
             results['total_queries'] += 1
             
             if retrieved_ids:
@@ -114,13 +113,13 @@ class SystemEvaluator:
         total_factors = 0
         total_evidence = 0
         cause_matches = 0
+        retrieved = self.retriever.retrieve_many([q['query'] for q in queries], top_k=1)
         
-        for query_data in queries:
+        for query_data, retrieved_ids in zip(queries, retrieved):
             query = query_data['query']
             expected_causes = query_data.get('expected_causes', [])
             
-            # Retrieve and analyze
-            retrieved_ids = self.retriever.retrieve(query, top_k=1)
+            # Analyze the retrieved transcripts
             transcripts = [
                 self.retriever.get_transcript(tid)
                 for tid in retrieved_ids
@@ -165,6 +164,121 @@ class SystemEvaluator:
         
         return results
     
+    def evaluate_ann_recall(
+        self,
+        k: int = 5,
+        nprobe_values: List[int] = (1, 2, 4, 8, 16, 32)
+    ) -> Dict[str, Any]:
+        """Compare ANN retrieval against exact search across nprobe settings"""
+        print("\n📊 Evaluating ANN Recall")
+        print("-" * 50)
+        
+        self.retriever.warm_up()
+        index = self.retriever.vector_index
+        if index is None or not len(index):
+            print("   Skipped: semantic index not available")
+            return {'skipped': True}
+        
+        built_here = index.ann is None
+        if built_here:
+            index.build_ann()
+        original_nprobe = index.ann.nprobe
+        
+        vectors = self.retriever.encode_queries([q['query'] for q in self.queries.get('queries', [])])
+        start_time = time.time()
+        exact = [set(tid for tid, _ in m) for m in index.search_many(vectors, k, exact=True)]
+        exact_ms = (time.time() - start_time) * 1000 / max(len(vectors), 1)
+        
+        results = {
+            'k': k,
+            'n_lists': index.ann.n_lists,
+            'exact_time_ms': round(exact_ms, 3),
+            'settings': []
+        }
+        print(f"   Exact search: {exact_ms:.3f}ms/query ({index.ann.n_lists} lists)")
+        
+        for nprobe in nprobe_values:
+            index.ann.nprobe = nprobe
+            start_time = time.time()
+            approx = [set(tid for tid, _ in index.search(v, k)) for v in vectors]
+            elapsed = (time.time() - start_time) * 1000 / max(len(vectors), 1)
+            recall = sum(
+                len(a & e) / len(e) for a, e in zip(approx, exact) if e
+            ) / max(len(vectors), 1)
+            
+            results['settings'].append({
+                'nprobe': nprobe,
+                'recall_at_k': round(recall, 3),
+                'avg_time_ms': round(elapsed, 3)
+            })
+            print(f"   nprobe={nprobe:<3} Recall@{k}: {recall:.1%}  Time: {elapsed:.3f}ms/query")
+        
+        index.ann.nprobe = original_nprobe
+        if built_here:
+            index.ann = None
+        
+        return results
+    
+    def evaluate_quantization(
+        self,
+        k: int = 5,
+        dtypes: List[str] = ('float16', 'int8'),
+        rerank: int = 50
+    ) -> Dict[str, Any]:
+        """Compare quantized embedding storage against float32 on memory and recall@k"""
+        print("\n📊 Evaluating Embedding Quantization")
+        print("-" * 50)
+        
+        self.retriever.warm_up()
+        index = self.retriever.vector_index
+        if index is None or not len(index):
+            print("   Skipped: semantic index not available")
+            return {'skipped': True}
+        
+        live = index.candidate_rows(index.ids)
+        ids = [index.ids[r] for r in live]
+        reference = VectorIndex(dtype='float32')
+        reference.add(ids, index.dequantize(live))
+        
+        vectors = self.retriever.encode_queries([q['query'] for q in self.queries.get('queries', [])])
+        start_time = time.time()
+        exact = [set(tid for tid, _ in m) for m in reference.search_many(vectors, k, exact=True)]
+        exact_ms = (time.time() - start_time) * 1000 / max(len(vectors), 1)
+        
+        results = {
+            'k': k,
+            'float32_bytes': reference.nbytes,
+            'float32_time_ms': round(exact_ms, 3),
+            'settings': []
+        }
+        print(f"   float32: {reference.nbytes / 1e6:.2f}MB  Time: {exact_ms:.3f}ms/query")
+        
+        for dtype in dtypes:
+            for rerank_k in (0, rerank):
+                quantized = VectorIndex(dtype=dtype, rerank=rerank_k)
+                quantized.add(ids, reference.matrix)
+                start_time = time.time()
+                approx = [set(tid for tid, _ in m) for m in quantized.search_many(vectors, k, exact=True)]
+                elapsed = (time.time() - start_time) * 1000 / max(len(vectors), 1)
+                recall = sum(
+                    len(a & e) / len(e) for a, e in zip(approx, exact) if e
+                ) / max(len(vectors), 1)
+                saving = 1 - quantized.nbytes / max(reference.nbytes, 1)
+                
+                results['settings'].append({
+                    'dtype': dtype,
+                    'rerank': rerank_k,
+                    'bytes': quantized.nbytes,
+                    'memory_saving': round(saving, 3),
+                    'recall_at_k': round(recall, 3),
+                    'recall_loss': round(1 - recall, 3),
+                    'avg_time_ms': round(elapsed, 3)
+                })
+                print(f"   {dtype:<8} rerank={rerank_k:<3} Memory: -{saving:.0%}  "
+                      f"Recall@{k}: {recall:.1%}  Time: {elapsed:.3f}ms/query")
+        
+        return results
+    
     def run_evaluation(self) -> Dict[str, Any]:
         """Run complete evaluation"""
         print("\n" + "=" * 60)
@@ -174,6 +288,8 @@ class SystemEvaluator:
         # Evaluate both tasks
         self.results['task1_retrieval'] = self.evaluate_task1()
         self.results['task2_causal_analysis'] = self.evaluate_task2()
+        self.results['ann_recall'] = self.evaluate_ann_recall()
+        self.results['quantization'] = self.evaluate_quantization()
         
         # Calculate overall metrics
         t1 = self.results['task1_retrieval']
@@ -186,7 +302,7 @@ class SystemEvaluator:
                  t2.get('avg_confidence', 0) * 0.3 +
                  t2.get('cause_coverage', 0) * 0.2), 3
             ),
-            'total_transcripts': len(self.retriever.conversations_by_id),
+            'total_transcripts': len(self.retriever.store),
             'total_queries_evaluated': t1.get('total_queries', 0)
         }
         
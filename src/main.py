@@ -2,16 +2,20 @@
 Main Entry Point for Causal Analysis System
 """
 
+import copy
 import os
 import sys
 import json
 import logging
+from dataclasses import replace
 from datetime import datetime
+from typing import Any, Dict, Optional
 
 # Import from current directory since we're in src
+from models.query_cache import QueryCache
 from task1_retrieval import ConversationRetriever
 from task2_causal_analysis import CausalAnalyzer, CausalExplanation
-from utils.helpers import format_explanation, load_json_file
+from utils.helpers import format_explanation
 
 # Configure logging
 logging.basicConfig(
@@ -20,6 +24,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "embedding_cache")
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "retriever_snapshot")
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "analysis_history.jsonl")
+HISTORY_PAGE_SIZE = 10
+
 
 def create_sample_data():
     """Create sample conversation data"""
@@ -60,30 +69,57 @@ def create_sample_data():
 class CausalAnalysisSystem:
     """Complete causal analysis system"""
     
-    def __init__(self):
-        """Initialize the system"""
-        self.retriever = ConversationRetriever()
-        self.analyzer = CausalAnalyzer()
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        query_cache_size: int = 256,
+        query_cache_ttl: Optional[float] = None,
+        query_cache_bytes: Optional[int] = None,
+        snapshot_dir: Optional[str] = None,
+        history_path: Optional[str] = None
+    ):
+        """
+        Initialize the system
+        
+        Args:
+            cache_dir: Directory for the persistent embedding cache (None
+                disables it)
+            query_cache_size: Query results kept in memory (0 disables the cache)
+            query_cache_ttl: Seconds a cached result stays valid
+            query_cache_bytes: Bound on the estimated size of cached results
+            snapshot_dir: Directory of the retriever snapshot reused across
+                restarts while the data file is unchanged (None disables it)
+            history_path: JSON Lines file the analysis history is appended to
+                (None keeps only the recent history in memory)
+        """
+        self.retriever = ConversationRetriever(cache_dir=cache_dir)
+        self.analyzer = CausalAnalyzer(history_path=history_path)
+        self.analyzer.track(self.retriever)
+        self.query_cache = QueryCache(query_cache_size, query_cache_ttl, query_cache_bytes)
+        self.snapshot_dir = snapshot_dir
         self.loaded = False
     
     def load_data(self) -> bool:
         """Load conversation data"""
         # Try to find data file
-        data = None
+        count = 0
         paths_to_try = [
+            "../data/sample_conversations.jsonl.gz",
+            "../data/sample_conversations.jsonl",
             "../data/sample_conversations.json",
+            "data/sample_conversations.jsonl.gz",
+            "data/sample_conversations.jsonl",
             "data/sample_conversations.json",
             "sample_conversations.json"
         ]
         
         for path in paths_to_try:
             if os.path.exists(path):
-                logger.info(f"Loading data from: {path}")
-                data = load_json_file(path)
-                if data:
+                count = self._load_source(path)
+                if count:
                     break
         
-        if not data:
+        if not count:
             logger.info("No data file found. Creating sample data...")
             data = create_sample_data()
             
@@ -95,27 +131,107 @@ class CausalAnalysisSystem:
                 logger.info("Saved sample data to ../data/sample_conversations.json")
             except:
                 pass
+            
+            count = self.retriever.load_conversations(data)
         
-        count = self.retriever.load_conversations(data)
         self.loaded = count > 0
+        
+        # Load the embedding model off the startup path
+        self.retriever.warm_up(background=True)
         return self.loaded
     
-    def process_query(self, query: str, top_k: int = 3) -> CausalExplanation:
-        """Process a user query"""
+    def _load_source(self, path: str) -> int:
+        """Load a data file, from the retriever snapshot when it was built from the same file"""
+        stat = os.stat(path)
+        source = {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+        if self.snapshot_dir and ConversationRetriever.snapshot_source(self.snapshot_dir) == source:
+            try:
+                logger.info(f"Loading snapshot of {path} from: {self.snapshot_dir}")
+                return self.retriever.load(self.snapshot_dir)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Could not load snapshot: {e}")
+        
+        logger.info(f"Loading data from: {path}")
+        count = self.retriever.load_file(path)
+        if count and self.snapshot_dir:
+            try:
+                self.retriever.save(self.snapshot_dir, source)
+            except OSError as e:
+                logger.warning(f"Could not save snapshot: {e}")
+        return count
+    
+    def process_query(
+        self,
+        query: str,
+        top_k: int = 3,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> CausalExplanation:
+        """Process a user query, optionally restricted by retriever filters"""
         if not self.loaded:
             if not self.load_data():
                 return self.analyzer._empty_explanation(query)
         
+        # Results only change with the query words, top_k, filters or the corpus
+        key = (
+            " ".join(query.lower().split()),
+            top_k,
+            repr(sorted(filters.items())) if filters else None,
+            self.retriever.version
+        )
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            # A fresh copy, so callers never see or change the cached lists
+            _, explanation = cached
+            explanation = replace(copy.deepcopy(explanation), query=query, timestamp=datetime.now().isoformat())
+            self.analyzer.record(explanation)
+            return explanation
+        
         # Task 1: Retrieve
-        relevant_ids = self.retriever.retrieve(query, top_k=top_k)
+        matches = self.retriever.retrieve_with_turns(query, top_k=top_k, filters=filters)
         transcripts = [
-            self.retriever.get_transcript(tid) 
-            for tid in relevant_ids 
-            if self.retriever.get_transcript(tid)
+            t for t in (self.retriever.get_transcript(tid) for tid, _ in matches)
+            if t
         ]
         
         # Task 2: Analyze
-        return self.analyzer.analyze(query, transcripts)
+        explanation = self.analyzer.analyze(query, transcripts, matched_turns=dict(matches))
+        self.query_cache.put(key, (matches, copy.deepcopy(explanation)))
+        return explanation
+    
+    def compact_cache(self):
+        """Remove stale entries from the embedding cache"""
+        cache = self.retriever.embedding_cache
+        if cache is None:
+            print("\nℹ️  Embedding cache is not enabled\n")
+            return
+        removed = self.retriever.compact_embedding_cache()
+        stats = cache.stats()
+        print(f"\n🧹 Removed {removed} stale embeddings "
+              f"({stats['entries']} kept, {stats['hits']} hits, {stats['misses']} misses)\n")
+    
+    def show_stats(self):
+        """Display query cache statistics"""
+        stats = self.query_cache.stats()
+        print(f"\n📈 Query cache: {stats['entries']} entries ({stats['bytes']} bytes), "
+              f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}), "
+              f"{stats['evictions']} evictions, {stats['expirations']} expirations\n")
+    
+    def show_history(self, page: int = 0):
+        """Display one page of past analyses, newest first"""
+        records = self.analyzer.history.page(page, HISTORY_PAGE_SIZE)
+        if not records:
+            print("\nℹ️  No analyses on this page\n")
+            return
+        print(f"\n🕘 Analysis History (page {page}):")
+        print("-" * 60)
+        for record in records:
+            print(f"  {record['timestamp'][:19]}  {record['query']}")
+            print(f"    → {record['explanation']}")
+        print("-" * 60)
+    
+    def close(self):
+        """Release the files held open by the analyzer"""
+        self.analyzer.close()
     
     def list_transcripts(self):
         """Display all transcripts"""
@@ -136,48 +252,69 @@ def main():
     print("🔍 CAUSAL ANALYSIS SYSTEM")
     print("=" * 80)
     
-    system = CausalAnalysisSystem()
+    system = CausalAnalysisSystem(
+        cache_dir=EMBEDDING_CACHE_DIR,
+        snapshot_dir=SNAPSHOT_DIR,
+        history_path=HISTORY_PATH
+    )
     
     if not system.load_data():
         print("⚠️  Using sample data")
     
-    print("\n💡 Commands: 'quit', 'list', 'help'\n")
+    print("\n💡 Commands: 'quit', 'list', 'compact', 'stats', 'history [page]', 'help'\n")
     
-    while True:
-        try:
-            query = input("🔎 Query: ").strip()
-            
-            if not query:
-                continue
-            
-            if query.lower() == 'quit':
-                print("\n👋 Goodbye!")
+    try:
+        while True:
+            try:
+                query = input("🔎 Query: ").strip()
+                
+                if not query:
+                    continue
+                
+                if query.lower() == 'quit':
+                    print("\n👋 Goodbye!")
+                    break
+                
+                if query.lower() == 'list':
+                    system.list_transcripts()
+                    continue
+                
+                if query.lower() == 'compact':
+                    system.compact_cache()
+                    continue
+                
+                if query.lower() == 'stats':
+                    system.show_stats()
+                    continue
+                
+                if query.lower().split()[0] == 'history' and len(query.split()) <= 2:
+                    page = query.split()[1] if len(query.split()) == 2 else '0'
+                    if page.isdigit():
+                        system.show_history(int(page))
+                        continue
+                
+                if query.lower() == 'help':
+                    print("\n📖 Example Queries:")
+                    print("  • Why did the healthcare conversation escalate?")
+                    print("  • What was the fraud amount?")
+                    print("  • What error code was mentioned?")
+                    print("  • How long did the issue persist?\n")
+                    continue
+                
+                print("\n⏳ Processing...")
+                explanation = system.process_query(query)
+                print(format_explanation(explanation))
+                print()
+                
+            except (KeyboardInterrupt, EOFError):
+                print("\n\n👋 Goodbye!")
                 break
-            
-            if query.lower() == 'list':
-                system.list_transcripts()
-                continue
-            
-            if query.lower() == 'help':
-                print("\n📖 Example Queries:")
-                print("  • Why did the healthcare conversation escalate?")
-                print("  • What was the fraud amount?")
-                print("  • What error code was mentioned?")
-                print("  • How long did the issue persist?\n")
-                continue
-            
-            print("\n⏳ Processing...")
-            explanation = system.process_query(query)
-            print(format_explanation(explanation))
-            print()
-            
-        except KeyboardInterrupt:
-            print("\n\n👋 Goodbye!")
-            break
-        except Exception as e:
-            print(f"❌ Error: {e}\n")
-            import traceback
-            traceback.print_exc()
+            except Exception as e:
+                print(f"❌ Error: {e}\n")
+                import traceback
+                traceback.print_exc()
+    finally:
+        system.close()
 
 
 if __name__ == "__main__":
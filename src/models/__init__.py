@@ -3,5 +3,14 @@ Models module for pattern analysis
 """
 
 from .pattern_analyzer import PatternAnalyzer
+from .ann_index import IVFIndex
+from .embedding_cache import EmbeddingCache
+from .fusion import reciprocal_rank_fusion, weighted_score_fusion
+from .keyword_index import KeywordIndex
+from .metadata_index import MetadataIndex
+from .query_cache import QueryCache
+from .vector_index import TurnIndex, VectorIndex
 
-__all__ = ['PatternAnalyzer']
\ No newline at end of file
+__all__ = ['PatternAnalyzer', 'IVFIndex', 'EmbeddingCache', 'KeywordIndex', 'MetadataIndex',
+           'QueryCache', 'TurnIndex', 'VectorIndex',
+           'reciprocal_rank_fusion', 'weighted_score_fusion']
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+Analysis History Module
+Bounded in-memory record of analyses with an optional append-only spill file
+"""
+
+import json
+import os
+from array import array
+from collections import deque
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    from utils.helpers import iter_jsonl
+except ImportError:
+    from ..utils.helpers import iter_jsonl
+
+from .metadata_index import _to_epoch
+
+
+class AnalysisHistory:
+    """
+    Ring buffer of the most recent analysis records.
+
+    Memory holds at most ``capacity`` records; older ones are dropped as
+    new ones arrive. With a ``spill_path`` every record is also appended
+    to that JSON Lines file as it is added, so nothing is lost and the
+    file keeps growing across restarts. ``page`` and ``between`` read the
+    spill file when there is one, and the in-memory records otherwise.
+    ``page`` seeks to its records through the byte offset of every record
+    in the file, found by one scan on first use and extended as records
+    are appended, so a page costs the same wherever it is. ``between``
+    streams the file.
+    """
+
+    def __init__(self, capacity: int = 1000, spill_path: Optional[str] = None):
+        """
+        Initialize an empty history
+
+        Args:
+            capacity: Records kept in memory
+            spill_path: JSON Lines file every record is appended to
+        """
+        if capacity < 0:
+            raise ValueError("capacity must be non-negative")
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.total = 0
+        self._records: "deque[Dict[str, Any]]" = deque(maxlen=capacity)
+        self._spill = None
+        self._spill_size = 0
+        # Byte offset of every record in the spill file, built on first use
+        self._offsets: Optional[array] = None
+        if spill_path:
+            directory = os.path.dirname(os.path.abspath(spill_path))
+            os.makedirs(directory, exist_ok=True)
+            self._spill = open(spill_path, 'ab')
+            self._spill_size = self._spill.tell()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Add a record, evicting the oldest in-memory one when full"""
+        self._records.append(record)
+        self.total += 1
+        if self._spill is not None:
+            line = (json.dumps(record, default=str) + "\n").encode('utf-8')
+            self._spill.write(line)
+            self._spill.flush()
+            if self._offsets is not None:
+                self._offsets.append(self._spill_size)
+            self._spill_size += len(line)
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """In-memory records, oldest first, optionally only the last ``limit``"""
+        if limit is None or limit >= len(self._records):
+            return list(self._records)
+        if limit <= 0:
+            return []
+        return list(islice(self._records, len(self._records) - limit, None))
+
+    def page(self, page: int = 0, page_size: int = 20, newest_first: bool = True) -> List[Dict[str, Any]]:
+        """
+        One page of the history.
+
+        Args:
+            page: Page number, starting at 0
+            page_size: Records per page
+            newest_first: Count pages back from the latest record
+
+        Returns:
+            The page's records in the requested order
+        """
+        if page < 0 or page_size <= 0:
+            return []
+        start = page * page_size
+        if self.spill_path is None:
+            records = list(self._records)
+            if newest_first:
+                records.reverse()
+            return records[start:start + page_size]
+        
+        offsets = self._index()
+        if newest_first:
+            end = max(len(offsets) - start, 0)
+            selected = reversed(offsets[max(end - page_size, 0):end])
+        else:
+            selected = offsets[start:start + page_size]
+        records = []
+        with open(self.spill_path, 'rb') as f:
+            for offset in selected:
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+        return records
+
+    def between(self, since: Any = None, until: Any = None) -> Iterator[Dict[str, Any]]:
+        """
+        Records whose timestamp falls within the bounds, oldest first.
+
+        Args:
+            since: Earliest time (datetime, date or ISO string), inclusive
+            until: Latest time (datetime, date or ISO string), inclusive;
+                a date without a time includes that whole day
+
+        Raises:
+            ValueError: If a bound cannot be interpreted as a time
+        """
+        bounds = [_to_epoch(since), _to_epoch(until, end_of_day=True)]
+        for bound, epoch in zip((since, until), bounds):
+            if bound is not None and epoch is None:
+                raise ValueError(f"Cannot interpret {bound!r} as a time")
+        lo, hi = bounds
+        for record in self._iter_records():
+            epoch = _to_epoch(record.get('timestamp'))
+            if epoch is None:
+                continue
+            if (lo is None or epoch >= lo) and (hi is None or epoch <= hi):
+                yield record
+
+    def clear(self) -> None:
+        """Drop the in-memory records; the spill file is append-only and kept"""
+        self._records.clear()
+
+    def close(self) -> None:
+        """Close the spill file"""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def _index(self) -> array:
+        """Byte offsets of the spill file's records, scanning the file the first time"""
+        if self._offsets is None:
+            offsets = array('q')
+            if os.path.exists(self.spill_path):
+                position = 0
+                with open(self.spill_path, 'rb') as f:
+                    for line in f:
+                        # Skipped by iter_jsonl too
+                        if line.strip():
+                            try:
+                                json.loads(line)
+                                offsets.append(position)
+                            except ValueError:
+                                pass
+                        position += len(line)
+            self._offsets = offsets
+        return self._offsets
+
+    def _iter_records(self) -> Iterator[Dict[str, Any]]:
+        """Every record oldest first, from the spill file when there is one"""
+        if self.spill_path is None:
+            return iter(list(self._records))
+        if not os.path.exists(self.spill_path):
+            return iter(())
+        return iter_jsonl(self.spill_path)
@@ -0,0 +1,146 @@
+"""
+ANN Index Module
+Inverted-file (IVF) approximate nearest neighbour search
+"""
+
+import logging
+from typing import Optional
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the rows of an embedding matrix.
+
+    Rows are clustered with spherical k-means; each cluster keeps the row
+    numbers assigned to it as one contiguous slice of ``order``. A query
+    only scores the rows in the ``nprobe`` clusters whose centroids are
+    closest, trading recall for latency. Rows appended to the matrix after
+    the index was built are scanned exhaustively until the next rebuild.
+    """
+
+    def __init__(
+        self,
+        centroids: "np.ndarray",
+        order: "np.ndarray",
+        offsets: "np.ndarray",
+        nprobe: int = 8,
+        fingerprint: str = ''
+    ):
+        """Wrap prebuilt index arrays"""
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.nprobe = nprobe
+        self.fingerprint = fingerprint
+
+    @property
+    def n_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    @property
+    def size(self) -> int:
+        """Number of matrix rows covered by the index"""
+        return self.order.shape[0]
+
+    @classmethod
+    def build(
+        cls,
+        matrix: "np.ndarray",
+        n_lists: Optional[int] = None,
+        nprobe: int = 8,
+        iterations: int = 10,
+        sample_size: int = 256,
+        seed: int = 0
+    ) -> "IVFIndex":
+        """
+        Cluster a normalized matrix into inverted lists.
+
+        Args:
+            matrix: Normalized embedding rows
+            n_lists: Number of clusters (defaults to sqrt of row count)
+            nprobe: Clusters scanned per query
+            iterations: k-means iterations
+            sample_size: Training points per cluster
+            seed: Random seed for centroid initialization
+
+        Returns:
+            Built index
+        """
+        if not HAS_NUMPY:
+            raise ImportError("IVFIndex requires numpy")
+        n_rows = matrix.shape[0]
+        n_lists = max(1, min(n_lists or int(np.sqrt(n_rows)), n_rows))
+        rng = np.random.default_rng(seed)
+
+        train_size = min(n_rows, n_lists * sample_size)
+        train = matrix[np.sort(rng.choice(n_rows, train_size, replace=False))]
+        centroids = train[rng.choice(train_size, n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, train)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            sums[empty] = centroids[empty]
+            norms[empty] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        labels = np.empty(n_rows, dtype=np.int64)
+        for start in range(0, n_rows, 65536):
+            labels[start:start + 65536] = np.argmax(matrix[start:start + 65536] @ centroids.T, axis=1)
+
+        order = np.argsort(labels, kind='stable').astype(np.int64)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=n_lists), out=offsets[1:])
+
+        logger.info(f"Built IVF index with {n_lists} lists over {n_rows} vectors")
+        return cls(centroids, order, offsets, nprobe)
+
+    def candidates(self, query: "np.ndarray", total_rows: int) -> "np.ndarray":
+        """Row numbers to score for a normalized query"""
+        nprobe = min(self.nprobe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        if nprobe < self.n_lists:
+            probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probes = np.arange(self.n_lists)
+        parts = [self.order[self.offsets[p]:self.offsets[p + 1]] for p in probes]
+        if total_rows > self.size:
+            parts.append(np.arange(self.size, total_rows, dtype=np.int64))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def save(self, path: str) -> None:
+        """Write the index arrays to an ``.npz`` file"""
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                version=np.array(FORMAT_VERSION),
+                centroids=self.centroids,
+                order=self.order,
+                offsets=self.offsets,
+                fingerprint=np.array(self.fingerprint)
+            )
+
+    @classmethod
+    def load(cls, path: str, nprobe: int = 8) -> "IVFIndex":
+        """Read an index written by ``save``"""
+        if not HAS_NUMPY:
+            raise ImportError("IVFIndex requires numpy")
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['version']) != FORMAT_VERSION:
+                raise ValueError(f"Unsupported IVF index version {int(data['version'])}")
+            return cls(
+                data['centroids'], data['order'], data['offsets'],
+                nprobe, str(data['fingerprint'])
+            )
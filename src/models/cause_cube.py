@@ -0,0 +1,217 @@
+"""
+Cause Cube Module
+Incrementally maintained label counts per domain, outcome and period
+"""
+
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .metadata_index import _to_epoch
+from .snapshot import Part, to_array
+
+# A cell is (domain, outcome, period); None stands for every value
+Cell = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+class CauseCube:
+    """
+    Counts of detected labels (causes, factors, entities) per domain,
+    outcome and period.
+
+    Every transcript is counted in each roll-up of its cell: the exact
+    domain and outcome or all of them, crossed with all time, its year
+    ('2025'), month ('2025-06') and day ('2025-06-14'). Reading the
+    counts of any such combination is a single cell lookup, whatever the
+    corpus size. Labels are interned to integer codes and a cell keeps a
+    sparse dict of the codes it has seen, so memory follows the labels
+    actually present in each cell rather than the whole vocabulary.
+    Labels should come from a bounded set (rule templates, bucketed
+    values), not from free text. Each transcript keeps the codes of its
+    labels so that removing or replacing it subtracts exactly what it
+    added.
+    """
+
+    def __init__(self):
+        """Initialize an empty cube"""
+        self.labels: List[Tuple[str, str]] = []
+        self._codes: Dict[Tuple[str, str], int] = {}
+        self._cells: Dict[Cell, int] = {}
+        self._totals = array('I')
+        self._counts: List[Dict[int, int]] = []
+        self._members: Dict[str, Tuple[Tuple[str, str, Optional[str]], array]] = {}
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def __contains__(self, transcript_id: str) -> bool:
+        return transcript_id in self._members
+
+    def add(
+        self,
+        transcript_id: str,
+        domain: str,
+        outcome: str,
+        time_of_interaction: Any,
+        labels: Iterable[Tuple[str, str]]
+    ) -> None:
+        """
+        Count a transcript's labels, replacing any previous version
+
+        Args:
+            transcript_id: Transcript id
+            domain: Business domain
+            outcome: Conversation outcome
+            time_of_interaction: Datetime, date or ISO string (None counts
+                the transcript in the all-time cells only)
+            labels: (kind, label) pairs, e.g. ('cause', 'card blocked for security')
+        """
+        self.remove(transcript_id)
+        epoch = _to_epoch(time_of_interaction)
+        day = None if epoch is None else datetime.fromtimestamp(epoch).date().isoformat()
+        codes = array('I', sorted({self._code(label) for label in labels}))
+        key = (domain, outcome, day)
+        self._members[transcript_id] = (key, codes)
+        self._update(key, codes, 1)
+
+    def remove(self, transcript_id: str) -> bool:
+        """Subtract a transcript's labels"""
+        member = self._members.pop(transcript_id, None)
+        if member is None:
+            return False
+        self._update(*member, -1)
+        return True
+
+    def clear(self) -> None:
+        """Drop every count"""
+        self.__init__()
+
+    def counts(
+        self,
+        domain: Optional[str] = None,
+        outcome: Optional[str] = None,
+        period: Optional[str] = None
+    ) -> Tuple[int, Dict[str, Dict[str, int]]]:
+        """
+        Label counts of one cell.
+
+        Args:
+            domain: Domain, or None for all
+            outcome: Outcome, or None for all
+            period: Year, month or day in ISO form ('2025', '2025-06',
+                '2025-06-14'), or None for all time
+
+        Returns:
+            Number of transcripts in the cell and, per label kind, the
+            count of each label, most frequent first
+        """
+        cell = self._cells.get((domain, outcome, period))
+        if cell is None or not self._totals[cell]:
+            return 0, {}
+        by_kind: Dict[str, Dict[str, int]] = {}
+        for code, count in sorted(self._counts[cell].items(), key=lambda item: (-item[1], item[0])):
+            kind, label = self.labels[code]
+            by_kind.setdefault(kind, {})[label] = count
+        return self._totals[cell], by_kind
+
+    def count(
+        self,
+        kind: str,
+        label: str,
+        domain: Optional[str] = None,
+        outcome: Optional[str] = None,
+        period: Optional[str] = None
+    ) -> Tuple[int, int]:
+        """Transcripts with a label and transcripts in total in one cell"""
+        cell = self._cells.get((domain, outcome, period))
+        if cell is None:
+            return 0, 0
+        code = self._codes.get((kind, label))
+        return self._counts[cell].get(code, 0), self._totals[cell]
+
+    def snapshot(self) -> Part:
+        """Members and cell counts for ``save_snapshot``"""
+        keys: Dict[Tuple[str, str, Optional[str]], int] = {}
+        member_keys = array('I')
+        member_indptr = array('q', [0])
+        member_codes = array('I')
+        for key, codes in self._members.values():
+            member_keys.append(keys.setdefault(key, len(keys)))
+            member_codes.extend(codes)
+            member_indptr.append(len(member_codes))
+        cell_indptr = array('q', [0])
+        cell_codes = array('I')
+        cell_counts = array('I')
+        for counts in self._counts:
+            cell_codes.extend(counts)
+            cell_counts.extend(counts.values())
+            cell_indptr.append(len(cell_codes))
+        arrays = {
+            'member_keys': member_keys,
+            'member_indptr': member_indptr,
+            'member_codes': member_codes,
+            'cell_totals': self._totals,
+            'cell_indptr': cell_indptr,
+            'cell_codes': cell_codes,
+            'cell_counts': cell_counts
+        }
+        state = {
+            'labels': self.labels,
+            'ids': list(self._members),
+            'keys': list(keys),
+            'cells': list(self._cells)
+        }
+        return arrays, state
+
+    def restore(self, arrays: Dict[str, Any], state: Dict[str, Any]) -> None:
+        """Replace the contents with a snapshot written by ``snapshot``"""
+        self.__init__()
+        for label in state['labels']:
+            self._code(tuple(label))
+        keys = [tuple(key) for key in state['keys']]
+        # Plain lists slice far faster than the mapped buffers
+        indptr, codes = arrays['member_indptr'].tolist(), arrays['member_codes'].tolist()
+        for i, (transcript_id, key) in enumerate(zip(state['ids'], arrays['member_keys'].tolist())):
+            self._members[transcript_id] = (keys[key], array('I', codes[indptr[i]:indptr[i + 1]]))
+        self._cells = {tuple(cell): number for number, cell in enumerate(state['cells'])}
+        self._totals = to_array(arrays['cell_totals'], 'I')
+        indptr = arrays['cell_indptr'].tolist()
+        codes, counts = arrays['cell_codes'].tolist(), arrays['cell_counts'].tolist()
+        self._counts = [
+            dict(zip(codes[indptr[i]:indptr[i + 1]], counts[indptr[i]:indptr[i + 1]]))
+            for i in range(len(self._totals))
+        ]
+
+    def _code(self, label: Tuple[str, str]) -> int:
+        """Intern a (kind, label) pair"""
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def _update(self, key: Tuple[str, str, Optional[str]], codes: array, delta: int):
+        """Add or subtract one transcript in every roll-up of its cell"""
+        domain, outcome, day = key
+        periods = [None] if day is None else [None, day[:4], day[:7], day]
+        for d in (domain, None):
+            for o in (outcome, None):
+                for period in periods:
+                    cell = self._cell((d, o, period))
+                    self._totals[cell] += delta
+                    counts = self._counts[cell]
+                    for code in codes:
+                        count = counts.get(code, 0) + delta
+                        if count:
+                            counts[code] = count
+                        else:
+                            del counts[code]
+
+    def _cell(self, cell: Cell) -> int:
+        """Number of a cell, allocated on first use"""
+        number = self._cells.get(cell)
+        if number is None:
+            number = self._cells[cell] = len(self._totals)
+            self._totals.append(0)
+            self._counts.append({})
+        return number
@@ -0,0 +1,110 @@
+"""
+Cue Matcher Module
+Evaluates a fixed set of substring and regex cues against a text
+"""
+
+import re
+from typing import Dict, Iterable, Optional
+
+
+class CueMatcher:
+    """
+    Compiled set of literal and regex cues.
+
+    ``match`` returns the hits of one text, evaluated lazily: a cue is
+    tested the first time a rule looks it up and remembered, so rules
+    sharing a cue, or several rule tables consuming the same hits, never
+    test it twice, and rules that stop at their first present cue skip the
+    rest. Literals cost one substring search, which CPython runs in C and
+    which beats folding a few dozen cues into one combined regex (a
+    lookahead alternation scanning every position measured about 8x slower
+    on transcript text). Capture patterns are compiled once.
+    """
+
+    def __init__(self, literals: Iterable[str], captures: Optional[Dict[str, str]] = None):
+        """
+        Compile the cues
+
+        Args:
+            literals: Substrings to detect
+            captures: Name to regex; a match reports its first group, or the
+                whole match when the pattern has no group
+        """
+        self.literals = frozenset(literals)
+        self.captures = {name: re.compile(pattern) for name, pattern in (captures or {}).items()}
+        clashes = self.literals & set(self.captures)
+        if clashes:
+            raise ValueError(f"Capture names clash with literal cues: {sorted(clashes)}")
+        self._absent = dict.fromkeys([*self.literals, *self.captures])
+
+    def match(self, text: str) -> "CueHits":
+        """Hits of the cues in a text"""
+        return CueHits(self, text)
+
+    def find_all(self, text: str) -> Dict[str, str]:
+        """Every cue present in a text, with its value, evaluated eagerly"""
+        found = {cue: cue for cue in self.literals if cue in text}
+        for name in self.captures:
+            value = self.evaluate(name, text)
+            if value is not None:
+                found[name] = value
+        return found
+
+    def merge(self, found: Iterable[Dict[str, str]]) -> "CueHits":
+        """
+        Hits over several texts from their ``find_all`` results.
+
+        A literal is present if any text has it and a capture takes its
+        value from the first text that has one, as if the texts had been
+        joined and matched at once (except for a cue straddling two texts).
+        """
+        hits = CueHits(self, None)
+        hits.update(self._absent)
+        for values in reversed(list(found)):
+            hits.update(values)
+        return hits
+
+    def evaluate(self, cue: str, text: str) -> Optional[str]:
+        """
+        Test one cue against a text.
+
+        Returns:
+            The literal itself or the captured value when the cue is
+            present, None otherwise
+
+        Raises:
+            KeyError: If the cue was not compiled into this matcher
+        """
+        pattern = self.captures.get(cue)
+        if pattern is not None:
+            m = pattern.search(text)
+            if m is None:
+                return None
+            return m.group(1) if pattern.groups else m.group(0)
+        if cue not in self.literals:
+            raise KeyError(cue)
+        return cue if cue in text else None
+
+
+class CueHits(dict):
+    """
+    Cue results for one text: ``hits[cue]`` is the literal or captured
+    value, or None when the cue is absent. A cue is evaluated on its first
+    lookup and stored, so later lookups are plain dict hits. Hits built by
+    ``CueMatcher.merge`` hold every cue up front and have no text.
+    """
+
+    __slots__ = ('matcher', 'text')
+
+    def __init__(self, matcher: CueMatcher, text: Optional[str]):
+        super().__init__()
+        self.matcher = matcher
+        self.text = text
+
+    def __missing__(self, cue: str) -> Optional[str]:
+        if cue in self.matcher.literals:
+            value = cue if cue in self.text else None
+        else:
+            value = self.matcher.evaluate(cue, self.text)
+        self[cue] = value
+        return value
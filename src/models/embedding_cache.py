@@ -0,0 +1,218 @@
+"""
+Embedding Cache Module
+Persistent content-addressed store for transcript embeddings
+"""
+
+import hashlib
+import logging
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by model name and text hash.
+
+    Each model gets its own directory of segments. A segment is an ``.npy``
+    matrix plus a ``.keys`` sidecar holding one text hash per row. Segments
+    are opened memory-mapped, so cached vectors are read straight from the
+    page cache instead of being rebuilt as Python objects. New vectors are
+    buffered and written as a fresh segment on ``flush``; once there are
+    more than ``max_segments`` segments, the newest ones are merged so that
+    the segment count (and open maps) stays bounded however small the
+    flushes are. ``compact`` merges all segments into one and drops stale
+    entries.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_segments: int = 8):
+        """Open (or create) the cache for a model"""
+        if not HAS_NUMPY:
+            raise ImportError("EmbeddingCache requires numpy")
+        self.model_name = model_name
+        self.max_segments = max(max_segments, 1)
+        self.path = os.path.join(cache_dir, re.sub(r'[^\w.-]', '_', model_name))
+        os.makedirs(self.path, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self._segments: List["np.ndarray"] = []
+        self._segment_names: List[str] = []
+        self._locations: Dict[str, Tuple[int, int]] = {}
+        self._pending: Dict[str, "np.ndarray"] = {}
+        self._load_segments()
+
+    @staticmethod
+    def key(text: str) -> str:
+        """Content hash used as the cache key"""
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._locations) + len(self._pending)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._pending or key in self._locations
+
+    def get(self, key: str) -> Optional["np.ndarray"]:
+        """Return the cached vector for a key, counting the hit or miss"""
+        vector = self._pending.get(key)
+        if vector is None:
+            location = self._locations.get(key)
+            if location is not None:
+                segment, row = location
+                vector = self._segments[segment][row]
+        if vector is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return vector
+
+    def put(self, key: str, vector: "np.ndarray") -> None:
+        """Buffer a vector until the next flush"""
+        if key not in self:
+            self._pending[key] = np.asarray(vector, dtype=np.float32)
+
+    def flush(self) -> int:
+        """Write buffered vectors as a new segment and return their count"""
+        if not self._pending:
+            return 0
+        keys = list(self._pending)
+        name = self._write_segment(keys, np.vstack([self._pending[k] for k in keys]))
+        self._open_segment(name)
+        self._pending = {}
+        if len(self._segments) > self.max_segments:
+            self._merge_tail()
+        return len(keys)
+
+    def compact(self, live_keys: Optional[Iterable[str]] = None) -> int:
+        """
+        Merge all segments into one, dropping stale entries.
+
+        Args:
+            live_keys: Keys to keep; when omitted every entry is kept and
+                only the segments are merged
+
+        Returns:
+            Number of entries removed
+        """
+        self.flush()
+        before = len(self._locations)
+        keep = list(self._locations) if live_keys is None else [
+            k for k in dict.fromkeys(live_keys) if k in self._locations
+        ]
+        old_names = list(self._segment_names)
+
+        if keep:
+            vectors = np.vstack([self._segments[s][r] for s, r in (self._locations[k] for k in keep)])
+            new_name = self._write_segment(keep, vectors)
+        else:
+            new_name = None
+
+        self._segments = []
+        self._segment_names = []
+        self._locations = {}
+        self._remove_segments(old_names)
+        if new_name:
+            self._open_segment(new_name)
+
+        removed = before - len(self._locations)
+        logger.info(f"Compacted embedding cache: kept {len(self._locations)}, removed {removed}")
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        """Get cache counters"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self),
+            'segments': len(self._segments)
+        }
+
+    def _merge_tail(self):
+        """
+        Merge the newest segments into one.
+
+        The run starts early enough to bring the count back to
+        ``max_segments`` and extends while the next older segment is no more
+        than twice the size of the run, so segment sizes grow geometrically
+        and each vector is rewritten only a logarithmic number of times.
+        """
+        sizes = [segment.shape[0] for segment in self._segments]
+        start = len(sizes) - 1
+        tail = sizes[start]
+        while start > 0 and (start >= self.max_segments or sizes[start - 1] <= 2 * tail):
+            start -= 1
+            tail += sizes[start]
+
+        merged = sorted(
+            (location, key) for key, location in self._locations.items() if location[0] >= start
+        )
+        keys = [key for _, key in merged]
+        vectors = np.vstack([self._segments[s][r] for (s, r), _ in merged])
+        new_name = self._write_segment(keys, vectors)
+
+        old_names = self._segment_names[start:]
+        del self._segments[start:]
+        del self._segment_names[start:]
+        for key in keys:
+            del self._locations[key]
+        self._remove_segments(old_names)
+        self._open_segment(new_name)
+
+    def _remove_segments(self, names: List[str]):
+        """Delete segment files"""
+        for name in names:
+            for ext in ('.npy', '.keys'):
+                try:
+                    os.remove(os.path.join(self.path, name + ext))
+                except OSError:
+                    pass
+
+    def _load_segments(self):
+        """Memory-map every complete segment in the cache directory"""
+        names = sorted(f[:-4] for f in os.listdir(self.path) if f.endswith('.npy'))
+        for name in names:
+            if os.path.exists(os.path.join(self.path, name + '.keys')):
+                self._open_segment(name)
+
+    def _open_segment(self, name: str):
+        """Register one segment's rows"""
+        try:
+            vectors = np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r')
+            with open(os.path.join(self.path, name + '.keys'), 'r', encoding='utf-8') as f:
+                keys = f.read().split()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable cache segment {name}: {e}")
+            return
+        if len(keys) != vectors.shape[0]:
+            logger.warning(f"Skipping cache segment {name}: key count does not match rows")
+            return
+
+        segment = len(self._segments)
+        self._segments.append(vectors)
+        self._segment_names.append(name)
+        for row, key in enumerate(keys):
+            self._locations[key] = (segment, row)
+
+    def _write_segment(self, keys: List[str], vectors: "np.ndarray") -> str:
+        """Atomically write a segment and return its name"""
+        existing = [int(f[8:13]) for f in os.listdir(self.path)
+                    if re.fullmatch(r'segment-\d{5}\.npy', f)]
+        name = f"segment-{max(existing, default=-1) + 1:05d}"
+        base = os.path.join(self.path, name)
+
+        with open(base + '.npy.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
+        with open(base + '.keys.tmp', 'w', encoding='utf-8') as f:
+            f.write("\n".join(keys))
+        os.replace(base + '.npy.tmp', base + '.npy')
+        os.replace(base + '.keys.tmp', base + '.keys')
+        return name
@@ -0,0 +1,73 @@
+"""
+Rank Fusion Module
+Combines the rankings of several retrievers into one
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[List[Tuple[str, float]]],
+    top_k: int,
+    k: int = 60,
+    weights: Optional[Sequence[float]] = None
+) -> List[Tuple[str, float]]:
+    """
+    Fuse rankings by summing ``weight / (k + rank)`` over the lists an id appears in.
+
+    Only ranks are used, so retrievers with incomparable score scales
+    (BM25 and cosine similarity) can be combined directly.
+
+    Args:
+        rankings: Lists of (id, score) pairs, best first
+        top_k: Number of fused results to return
+        k: Rank offset damping the weight of the very top ranks
+        weights: Per-ranking weights (defaults to 1 each)
+
+    Returns:
+        List of (id, fused score) pairs, best first
+    """
+    weights = weights if weights is not None else [1.0] * len(rankings)
+    fused: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, (id_, _) in enumerate(ranking, 1):
+            fused[id_] = fused.get(id_, 0.0) + weight / (k + rank)
+    return _best(fused, top_k)
+
+
+def weighted_score_fusion(
+    rankings: Sequence[List[Tuple[str, float]]],
+    top_k: int,
+    weights: Optional[Sequence[float]] = None
+) -> List[Tuple[str, float]]:
+    """
+    Fuse rankings by a weighted sum of min-max normalized scores.
+
+    An id missing from a ranking scores 0 for it, i.e. as low as that
+    ranking's last candidate.
+
+    Args:
+        rankings: Lists of (id, score) pairs, best first
+        top_k: Number of fused results to return
+        weights: Per-ranking weights (defaults to 1 each)
+
+    Returns:
+        List of (id, fused score) pairs, best first
+    """
+    weights = weights if weights is not None else [1.0] * len(rankings)
+    fused: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        if not ranking:
+            continue
+        scores = [score for _, score in ranking]
+        low, high = min(scores), max(scores)
+        span = high - low
+        for id_, score in ranking:
+            normalized = (score - low) / span if span > 0 else 1.0
+            fused[id_] = fused.get(id_, 0.0) + weight * normalized
+    return _best(fused, top_k)
+
+
+def _best(fused: Dict[str, float], top_k: int) -> List[Tuple[str, float]]:
+    """Highest fused scores, ties kept in first-seen order"""
+    return sorted(fused.items(), key=lambda item: -item[1])[:top_k]
@@ -0,0 +1,351 @@
+"""
+Keyword Index Module
+Inverted index with BM25 scoring for keyword retrieval
+"""
+
+import heapq
+import math
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+try:
+    from utils.helpers import tokenize
+except ImportError:
+    from ..utils.helpers import tokenize
+
+
+# (query trigger, document token prefixes, boost) - a query containing the
+# trigger boosts every document holding a token that starts with a prefix
+DEFAULT_BOOST_RULES: List[Tuple[str, Tuple[str, ...], float]] = [
+    ('escalat', ('escalat', 'supervisor'), 50.0),
+    ('fraud', ('fraud',), 50.0),
+    ('delivery', ('delivery',), 50.0),
+    ('error', ('error',), 30.0),
+]
+
+
+class KeywordIndex:
+    """
+    Tokenized inverted index over transcripts.
+
+    Postings map each term to the documents containing it together with the
+    term frequency, so a query only touches the posting lists of its own
+    terms. Domain boosts are resolved at indexing time into per-rule
+    document sets instead of being re-checked on every query.
+
+    Removed documents are tombstoned and skipped at query time; ``compact``
+    rewrites the postings without them.
+
+    An index restored from a snapshot keeps its postings in flat arrays
+    and decodes a term's list the first time a query needs it.
+    """
+
+    def __init__(
+        self,
+        k1: float = 1.5,
+        b: float = 0.75,
+        boost_rules: List[Tuple[str, Tuple[str, ...], float]] = None
+    ):
+        """Initialize an empty index"""
+        self.k1 = k1
+        self.b = b
+        self.boost_rules = boost_rules if boost_rules is not None else DEFAULT_BOOST_RULES
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_ids: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+        self.boosted_docs: List[set] = [set() for _ in self.boost_rules]
+        self.positions: Dict[str, int] = {}
+        self.deleted: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.positions
+
+    def add(self, doc_id: str, text: str) -> int:
+        """Index a document and return its internal position"""
+        return self.add_tokens(doc_id, tokenize(text))
+
+    def add_tokens(self, doc_id: str, tokens: List[str]) -> int:
+        """Index an already tokenized document, replacing any previous version"""
+        self.remove(doc_id)
+        if not isinstance(self.postings, dict):
+            self.postings = dict(self.postings.items())
+        doc_idx = len(self.doc_ids)
+
+        term_freqs: Dict[str, int] = {}
+        for token in tokens:
+            term_freqs[token] = term_freqs.get(token, 0) + 1
+
+        for term, tf in term_freqs.items():
+            self.postings.setdefault(term, {})[doc_idx] = tf
+
+        for rule_idx, (_, prefixes, _) in enumerate(self.boost_rules):
+            if any(term.startswith(prefixes) for term in term_freqs):
+                self.boosted_docs[rule_idx].add(doc_idx)
+
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        self.positions[doc_id] = doc_idx
+        return doc_idx
+
+    def remove(self, doc_id: str) -> bool:
+        """Tombstone a document"""
+        doc_idx = self.positions.pop(doc_id, None)
+        if doc_idx is None:
+            return False
+        self.deleted.add(doc_idx)
+        self.total_length -= self.doc_lengths[doc_idx]
+        for docs in self.boosted_docs:
+            docs.discard(doc_idx)
+        return True
+
+    def compact(self) -> int:
+        """Rewrite postings without tombstoned documents and return how many were dropped"""
+        dropped = len(self.deleted)
+        if not dropped:
+            return 0
+        remap = {}
+        for old_idx in range(len(self.doc_ids)):
+            if old_idx not in self.deleted:
+                remap[old_idx] = len(remap)
+
+        postings = {}
+        for term, docs in self.postings.items():
+            live = {remap[d]: tf for d, tf in docs.items() if d in remap}
+            if live:
+                postings[term] = live
+        self.postings = postings
+        self.doc_ids = [self.doc_ids[old] for old in remap]
+        self.doc_lengths = [self.doc_lengths[old] for old in remap]
+        self.boosted_docs = [set(remap[d] for d in docs) for docs in self.boosted_docs]
+        self.positions = {doc_id: idx for idx, doc_id in enumerate(self.doc_ids)}
+        self.deleted = set()
+        return dropped
+
+    def snapshot(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Postings as CSR arrays plus document tables, for ``save_snapshot``"""
+        if isinstance(self.postings, FrozenPostings):
+            indptr, docs, tfs = self.postings.arrays
+        else:
+            indptr = array('q', [0])
+            docs = array('i')
+            tfs = array('i')
+            for postings in self.postings.values():
+                docs.extend(postings.keys())
+                tfs.extend(postings.values())
+                indptr.append(len(docs))
+        boosted_indptr = array('q', [0])
+        boosted = array('i')
+        for rule_docs in self.boosted_docs:
+            boosted.extend(sorted(rule_docs))
+            boosted_indptr.append(len(boosted))
+
+        arrays = {
+            'indptr': indptr,
+            'docs': docs,
+            'tfs': tfs,
+            'doc_lengths': array('q', self.doc_lengths),
+            'boosted_indptr': boosted_indptr,
+            'boosted': boosted
+        }
+        state = {
+            'k1': self.k1,
+            'b': self.b,
+            'boost_rules': self.boost_rules,
+            'terms': list(self.postings),
+            'doc_ids': self.doc_ids,
+            'total_length': self.total_length,
+            'deleted': sorted(self.deleted)
+        }
+        return arrays, state
+
+    def restore(self, arrays: Dict[str, Any], state: Dict[str, Any]) -> None:
+        """Replace the contents with a snapshot written by ``snapshot``"""
+        self.k1 = state['k1']
+        self.b = state['b']
+        self.boost_rules = [(trigger, tuple(prefixes), boost) for trigger, prefixes, boost in state['boost_rules']]
+        self.postings = FrozenPostings(state['terms'], arrays['indptr'], arrays['docs'], arrays['tfs'])
+        self.doc_ids = state['doc_ids']
+        self.doc_lengths = arrays['doc_lengths'].tolist()
+        self.total_length = state['total_length']
+        indptr, boosted = arrays['boosted_indptr'], arrays['boosted']
+        self.boosted_docs = [set(boosted[indptr[i]:indptr[i + 1]]) for i in range(len(self.boost_rules))]
+        self.deleted = set(state['deleted'])
+        self.positions = {
+            doc_id: idx for idx, doc_id in enumerate(self.doc_ids) if idx not in self.deleted
+        }
+
+    def query_weights(self, query: str) -> Tuple[Dict[str, float], float, List[int]]:
+        """
+        Resolve a query against the corpus statistics.
+
+        Returns:
+            idf of each query term, the best BM25 score the query can reach
+            and the boost rules it triggers
+        """
+        n_docs = len(self.positions)
+        query_lower = query.lower()
+        idfs = {
+            term: self._idf(term, n_docs)
+            for term in set(t for t in tokenize(query_lower) if len(t) > 2)
+        }
+        max_score = 0.0
+        for idf in idfs.values():
+            max_score += idf * (self.k1 + 1)
+        rules = [i for i, (trigger, _, _) in enumerate(self.boost_rules) if trigger in query_lower]
+        return idfs, max_score, rules
+
+    def _idf(self, term: str, n_docs: int) -> float:
+        """BM25 inverse document frequency of a term"""
+        # Tombstoned documents still count towards df until compaction
+        df = min(len(self.postings.get(term, ())), n_docs)
+        return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        candidates: Optional[Iterable[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Score documents for a query.
+
+        BM25 scores are rescaled against the best score the query could
+        reach (every term matched), which keeps the domain boosts on the
+        same 0-100 scale as the original word-coverage scorer.
+
+        Args:
+            query: Natural language query
+            top_k: Number of results to return
+            candidates: Only score these doc ids
+
+        Returns:
+            List of (doc_id, score) pairs with positive scores, best first
+        """
+        return self.search_many([query], top_k, candidates)[0]
+
+    def search_many(
+        self,
+        queries: List[str],
+        top_k: int,
+        candidates: Optional[Iterable[str]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Score documents for a batch of queries.
+
+        Each distinct term's posting list is walked once for the whole
+        batch and its BM25 contributions are added to every query that
+        contains the term. With ``candidates``, a posting list longer than
+        the candidate set is probed per candidate instead of walked, so a
+        selective filter makes the query proportionally cheaper. Corpus
+        statistics (idf, average length) stay those of the whole index.
+
+        Args:
+            queries: Natural language queries
+            top_k: Number of results per query
+            candidates: Only score these doc ids
+
+        Returns:
+            One list of (doc_id, score) pairs per query, as from ``search``
+        """
+        n_docs = len(self.positions)
+        if n_docs == 0 or top_k <= 0:
+            return [[] for _ in queries]
+
+        queries_lower = [query.lower() for query in queries]
+        term_queries: Dict[str, List[int]] = {}
+        for q, query_lower in enumerate(queries_lower):
+            for term in set(t for t in tokenize(query_lower) if len(t) > 2):
+                term_queries.setdefault(term, []).append(q)
+        avg_length = self.total_length / n_docs
+        allowed = None
+        if candidates is not None:
+            allowed = set(self.positions[d] for d in candidates if d in self.positions)
+
+        scores: List[Dict[int, float]] = [{} for _ in queries]
+        max_scores = [0.0] * len(queries)
+        for term, owners in term_queries.items():
+            postings = self.postings.get(term, {})
+            idf = self._idf(term, n_docs)
+            if allowed is None:
+                matches = [(d, tf) for d, tf in postings.items() if d not in self.deleted]
+            elif len(allowed) < len(postings):
+                matches = [(d, postings[d]) for d in allowed if d in postings]
+            else:
+                matches = [(d, tf) for d, tf in postings.items() if d in allowed]
+            contributions = [
+                (doc_idx, idf * tf * (self.k1 + 1) / (
+                    tf + self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_idx] / avg_length)
+                ))
+                for doc_idx, tf in matches
+            ]
+            for q in owners:
+                max_scores[q] += idf * (self.k1 + 1)
+                query_scores = scores[q]
+                for doc_idx, contribution in contributions:
+                    query_scores[doc_idx] = query_scores.get(doc_idx, 0.0) + contribution
+
+        results = []
+        for query_lower, query_scores, max_score in zip(queries_lower, scores, max_scores):
+            if max_score > 0:
+                query_scores = {d: s / max_score * 100 for d, s in query_scores.items()}
+
+            for rule_idx, (trigger, _, boost) in enumerate(self.boost_rules):
+                if trigger in query_lower:
+                    boosted = self.boosted_docs[rule_idx]
+                    if allowed is not None:
+                        boosted = boosted & allowed
+                    for doc_idx in boosted:
+                        query_scores[doc_idx] = query_scores.get(doc_idx, 0.0) + boost
+
+            top = heapq.nsmallest(
+                top_k,
+                ((score, doc_idx) for doc_idx, score in query_scores.items() if score > 0),
+                key=lambda item: (-item[0], item[1])
+            )
+            results.append([(self.doc_ids[doc_idx], score) for score, doc_idx in top])
+        return results
+
+
+class FrozenPostings(Mapping):
+    """
+    Read-only term to {doc: tf} mapping over CSR arrays.
+
+    A term's posting list is decoded into a dict on first access and kept,
+    so loading an index does not pay for terms no query uses.
+    """
+
+    def __init__(self, terms: List[str], indptr: Any, docs: Any, tfs: Any):
+        """Wrap the arrays written by ``KeywordIndex.snapshot``"""
+        self._rows = {term: row for row, term in enumerate(terms)}
+        self._indptr = indptr
+        self._docs = docs
+        self._tfs = tfs
+        self._decoded: Dict[str, Dict[int, int]] = {}
+
+    @property
+    def arrays(self) -> Tuple[Any, Any, Any]:
+        """The underlying (indptr, docs, tfs) arrays"""
+        return self._indptr, self._docs, self._tfs
+
+    def __getitem__(self, term: str) -> Dict[int, int]:
+        postings = self._decoded.get(term)
+        if postings is None:
+            row = self._rows[term]
+            start, end = self._indptr[row], self._indptr[row + 1]
+            postings = self._decoded[term] = dict(zip(self._docs[start:end], self._tfs[start:end]))
+        return postings
+
+    def __contains__(self, term: object) -> bool:
+        return term in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
@@ -0,0 +1,242 @@
+"""
+Metadata Index Module
+Filter indexes over transcript domain, outcome and interaction time
+"""
+
+import math
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from .snapshot import to_array
+
+Values = Union[str, Iterable[str]]
+
+_SET_BIT = re.compile('1')
+
+
+class MetadataIndex:
+    """
+    Filter index over transcript domain, outcome and interaction time.
+
+    Every domain and outcome value keeps an array of the positions holding
+    it. Filters combine them as bitmaps (one bit per position, held in a
+    Python int), built on first use and kept until the index changes, so
+    intersecting conditions is a few word-wise ANDs. Interaction times are
+    stored as epoch seconds next to a time-sorted position array that is
+    extended in place while transcripts arrive in time order and re-sorted
+    on the next range query otherwise. Removed transcripts are tombstoned
+    and dropped by ``compact``.
+    """
+
+    FIELDS = ('domain', 'outcome')
+
+    def __init__(self):
+        """Initialize an empty index"""
+        self.doc_ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.deleted: Set[int] = set()
+        self.values: Dict[str, Dict[str, array]] = {f: {} for f in self.FIELDS}
+        self.times = array('d')
+        self._sorted_times = array('d')
+        self._time_order = array('i')
+        self._time_dirty = False
+        self._bitmaps: Dict[Any, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.positions
+
+    def add(self, doc_id: str, domain: str, outcome: str, time_of_interaction: Any = None) -> int:
+        """Index a transcript's metadata, replacing any previous version"""
+        self.remove(doc_id)
+        self._bitmaps = {}
+        position = len(self.doc_ids)
+        for field, value in zip(self.FIELDS, (domain, outcome)):
+            self.values[field].setdefault(value, array('i')).append(position)
+
+        timestamp = _to_epoch(time_of_interaction)
+        self.times.append(math.nan if timestamp is None else timestamp)
+        if timestamp is not None and not self._time_dirty:
+            if self._sorted_times and timestamp < self._sorted_times[-1]:
+                self._time_dirty = True
+            else:
+                self._sorted_times.append(timestamp)
+                self._time_order.append(position)
+
+        self.doc_ids.append(doc_id)
+        self.positions[doc_id] = position
+        return position
+
+    def remove(self, doc_id: str) -> bool:
+        """Tombstone a transcript"""
+        position = self.positions.pop(doc_id, None)
+        if position is None:
+            return False
+        self.deleted.add(position)
+        self._bitmaps = {}
+        return True
+
+    def compact(self) -> int:
+        """Rebuild the indexes without tombstoned transcripts and return how many were dropped"""
+        dropped = len(self.deleted)
+        if not dropped:
+            return 0
+        remap = {}
+        for old in range(len(self.doc_ids)):
+            if old not in self.deleted:
+                remap[old] = len(remap)
+
+        self.values = {
+            field: {
+                value: array('i', (remap[p] for p in positions if p in remap))
+                for value, positions in values.items()
+            }
+            for field, values in self.values.items()
+        }
+        for values in self.values.values():
+            for value in [v for v, positions in values.items() if not positions]:
+                del values[value]
+        self.doc_ids = [self.doc_ids[old] for old in remap]
+        self.times = array('d', (self.times[old] for old in remap))
+        self.positions = {doc_id: p for p, doc_id in enumerate(self.doc_ids)}
+        self.deleted = set()
+        self._time_dirty = True
+        self._bitmaps = {}
+        return dropped
+
+    def snapshot(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Position arrays and value tables for ``save_snapshot``"""
+        arrays = {'times': self.times}
+        values = {}
+        for field, field_values in self.values.items():
+            indptr = array('q', [0])
+            positions = array('i')
+            for value_positions in field_values.values():
+                positions.extend(value_positions)
+                indptr.append(len(positions))
+            arrays[field + '_indptr'] = indptr
+            arrays[field + '_positions'] = positions
+            values[field] = list(field_values)
+        state = {'doc_ids': self.doc_ids, 'deleted': sorted(self.deleted), 'values': values}
+        return arrays, state
+
+    def restore(self, arrays: Dict[str, Any], state: Dict[str, Any]) -> None:
+        """Replace the contents with a snapshot written by ``snapshot``"""
+        self.doc_ids = state['doc_ids']
+        self.deleted = set(state['deleted'])
+        self.positions = {
+            doc_id: p for p, doc_id in enumerate(self.doc_ids) if p not in self.deleted
+        }
+        self.values = {}
+        for field in self.FIELDS:
+            indptr, positions = arrays[field + '_indptr'], arrays[field + '_positions']
+            self.values[field] = {
+                value: to_array(positions[indptr[i]:indptr[i + 1]], 'i')
+                for i, value in enumerate(state['values'][field])
+            }
+        self.times = to_array(arrays['times'], 'd')
+        self._time_dirty = True
+        self._bitmaps = {}
+
+    def match(
+        self,
+        domain: Optional[Values] = None,
+        outcome: Optional[Values] = None,
+        since: Any = None,
+        until: Any = None
+    ) -> List[str]:
+        """
+        Ids of live transcripts matching every given condition.
+
+        Args:
+            domain: Domain or domains to keep
+            outcome: Outcome or outcomes to keep
+            since: Earliest interaction time (datetime, date or ISO string), inclusive
+            until: Latest interaction time (datetime, date or ISO string),
+                inclusive; a date without a time includes that whole day
+
+        Returns:
+            Matching ids in load order
+        """
+        bitmap = self._bitmap('live', self.positions.values)
+        for field, wanted in zip(self.FIELDS, (domain, outcome)):
+            if wanted is None:
+                continue
+            wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+            selected = 0
+            for value in wanted:
+                selected |= self._bitmap((field, value), lambda: self.values[field].get(value, ()))
+            bitmap &= selected
+
+        if since is not None or until is not None:
+            bounds = [_to_epoch(since), _to_epoch(until, end_of_day=True)]
+            for bound, epoch in zip((since, until), bounds):
+                if bound is not None and epoch is None:
+                    raise ValueError(f"Cannot interpret {bound!r} as a time")
+            bitmap &= self._to_bitmap(self._time_range(*bounds))
+
+        bits = bin(bitmap)[:1:-1]
+        return [self.doc_ids[m.start()] for m in _SET_BIT.finditer(bits)]
+
+    def _bitmap(self, key: Any, positions: Callable[[], Iterable[int]]) -> int:
+        """Cached bitmap for a key, built from ``positions()`` on a miss"""
+        bitmap = self._bitmaps.get(key)
+        if bitmap is None:
+            bitmap = self._bitmaps[key] = self._to_bitmap(positions())
+        return bitmap
+
+    def _to_bitmap(self, positions: Iterable[int]) -> int:
+        """Bitmap with the given positions set"""
+        bits = bytearray((len(self.doc_ids) >> 3) + 1)
+        for p in positions:
+            bits[p >> 3] |= 1 << (p & 7)
+        return int.from_bytes(bits, 'little')
+
+    def _time_range(self, since: Optional[float], until: Optional[float]) -> "array":
+        """Positions whose interaction time falls within the bounds"""
+        if self._time_dirty:
+            order = sorted(
+                (p for p in range(len(self.times)) if not math.isnan(self.times[p])),
+                key=self.times.__getitem__
+            )
+            self._time_order = array('i', order)
+            self._sorted_times = array('d', (self.times[p] for p in order))
+            self._time_dirty = False
+        lo = 0 if since is None else bisect_left(self._sorted_times, since)
+        hi = len(self._sorted_times) if until is None else bisect_right(self._sorted_times, until)
+        return self._time_order[lo:hi]
+
+
+def _to_epoch(value: Any, end_of_day: bool = False) -> Optional[float]:
+    """
+    Epoch seconds of a datetime, date or ISO 8601 string, None if unparseable.
+
+    With ``end_of_day``, a date without a time stands for the last instant
+    of that day instead of its midnight, for inclusive upper bounds.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            value = date.fromisoformat(text)
+        except ValueError:
+            try:
+                value = datetime.fromisoformat(text)
+            except ValueError:
+                return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, date):
+        day = datetime(value.year, value.month, value.day)
+        if end_of_day:
+            return (day + timedelta(days=1)).timestamp() - 1e-6
+        return day.timestamp()
+    return None
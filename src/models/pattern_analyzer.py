@@ -3,14 +3,147 @@ Pattern Analyzer Module
 Contains trained patterns for causal analysis
 """
 
+import multiprocessing
+import os
 import re
-from typing import Dict, List, Tuple, Any
+from array import array
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Match, Optional, Pattern, Tuple, Any
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# A compiled pattern and the literals one of which every match contains
+Gated = Tuple[Pattern, Tuple[str, ...]]
+
+# Between the texts of a chunk joined for classify_many
+SEPARATOR = '\x00'
+
+
+def _compile_pattern(pattern: str, flags: int = 0) -> Gated:
+    """Compile a pattern along with its required literals"""
+    literals = _required_literals(sre_parse.parse(pattern, flags))
+    if flags & re.IGNORECASE:
+        # Matched against lowercased ASCII text only
+        if not all(literal.isascii() for literal in literals):
+            literals = ()
+        literals = tuple(literal.lower() for literal in literals)
+    return re.compile(pattern, flags), literals
+
+
+def _required_literals(parsed: Any) -> Tuple[str, ...]:
+    """
+    Literals one of which every match of a parsed pattern contains.
+    
+    Runs of literal characters, mandatory groups and repeats, and branches
+    whose every alternative requires a literal are candidates; the one
+    with the longest shortest literal wins. Empty when nothing is required.
+    """
+    best: Tuple[str, ...] = ()
+    run = ''
+    for op, av in [*parsed, (None, None)]:
+        if op is sre_parse.LITERAL:
+            run += chr(av)
+            continue
+        candidates = [(run,)] if run else []
+        run = ''
+        if op is sre_parse.SUBPATTERN:
+            candidates.append(_required_literals(av[-1]))
+        elif op is sre_parse.BRANCH:
+            branches = [_required_literals(branch) for branch in av[1]]
+            if all(branches):
+                candidates.append(tuple(sorted({literal for branch in branches for literal in branch})))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            candidates.append(_required_literals(av[2]))
+        for candidate in candidates:
+            if candidate and (not best or min(map(len, candidate)) > min(map(len, best))):
+                best = candidate
+    return best
+
+
+def _looks_behind(parsed: Any) -> bool:
+    """
+    Whether a parsed pattern can look at text before where a search starts.
+    
+    True for ``^``, ``\\A`` and lookbehinds, which see the start of a
+    string differently from a search started at ``pos`` inside it.
+    """
+    for op, av in parsed:
+        if op is sre_parse.AT and av in (sre_parse.AT_BEGINNING, sre_parse.AT_BEGINNING_STRING):
+            return True
+        if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT) and av[0] < 0:
+            return True
+        for item in av if isinstance(av, (tuple, list)) else ():
+            for sub in item if isinstance(item, list) else (item,):
+                if isinstance(sub, sre_parse.SubPattern) and _looks_behind(sub):
+                    return True
+    return False
+
+
+def _search(gated: Gated, text: str) -> Optional[Match]:
+    """First match of a gated pattern, skipping the scan when a required literal is missing"""
+    regex, literals = gated
+    if literals and not any(literal in text for literal in literals):
+        return None
+    return regex.search(text)
+
+
+def _matching_rows(gated: Gated, joined: str, starts: List[int]) -> Iterator[int]:
+    """
+    Rows of a joined chunk a gated pattern matches, in order.
+    
+    Instead of searching every row, seeks the next occurrence of a
+    required literal and searches only the row holding it, within that
+    row's bounds, then carries on from the next row. ``starts`` holds the
+    offset of each row and, last, the length of ``joined`` plus one.
+    """
+    regex, literals = gated
+    # Next occurrence of each literal, found again only once passed
+    hits = {literal: joined.find(literal) for literal in literals}
+    pos = 0
+    while True:
+        for literal, hit in hits.items():
+            if 0 <= hit < pos:
+                hits[literal] = joined.find(literal, pos)
+        found = [hit for hit in hits.values() if hit >= 0]
+        if not found:
+            return
+        row = bisect_right(starts, min(found)) - 1
+        if regex.search(joined, starts[row], starts[row + 1] - 1):
+            yield row
+        pos = starts[row + 1]
+
+
+def _chunked(texts: Iterable[str], size: int) -> Iterator[List[str]]:
+    """Consecutive lists of up to ``size`` texts"""
+    texts = iter(texts)
+    chunk = list(islice(texts, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(texts, size))
 
 
 class PatternAnalyzer:
     """
     Pattern-based analyzer containing trained patterns for identifying
     causal relationships in customer service conversations.
+    
+    Patterns are compiled when the analyzer is created, each with the
+    literals one of which any of its matches must contain. A pattern is
+    only run over a text holding such a literal; the substring tests cost
+    a fraction of a regex scan, and most patterns have no match in a given
+    conversation. Results are the same as running every pattern.
     """
     
     def __init__(self):
@@ -18,6 +151,28 @@ class PatternAnalyzer:
         self.outcome_patterns = self._load_outcome_patterns()
         self.causal_patterns = self._load_causal_patterns()
         self.entity_patterns = self._load_entity_patterns()
+        
+        # Compiled once; edits to the pattern tables need a new analyzer
+        self._outcome_regexes = {
+            outcome: [_compile_pattern(p) for p in patterns]
+            for outcome, patterns in self.outcome_patterns.items()
+        }
+        # Outcome patterns classify_many can seek through a joined chunk
+        self._outcome_seekable = {
+            outcome: [
+                bool(literals) and not _looks_behind(sre_parse.parse(regex.pattern))
+                for regex, literals in self._outcome_regexes[outcome]
+            ]
+            for outcome in self._outcome_regexes
+        }
+        self._causal_regexes = {
+            category: [(_compile_pattern(p), template) for p, template in patterns]
+            for category, patterns in self.causal_patterns.items()
+        }
+        self._entity_regexes = {
+            entity_type: _compile_pattern(p, re.IGNORECASE)
+            for entity_type, p in self.entity_patterns.items()
+        }
     
     def _load_outcome_patterns(self) -> Dict[str, List[str]]:
         """Load patterns for outcome classification"""
@@ -106,8 +261,8 @@ class PatternAnalyzer:
         text_lower = text.lower()
         scores = {}
         
-        for outcome, patterns in self.outcome_patterns.items():
-            matches = sum(1 for p in patterns if re.search(p, text_lower))
+        for outcome, patterns in self._outcome_regexes.items():
+            matches = sum(1 for p in patterns if _search(p, text_lower))
             scores[outcome] = matches / len(patterns)
         
         if not scores:
@@ -116,6 +271,98 @@ class PatternAnalyzer:
         best_outcome = max(scores, key=scores.get)
         return (best_outcome, scores[best_outcome])
     
+    def classify_many(
+        self,
+        texts: Iterable[str],
+        n_workers: Optional[int] = None,
+        chunk_size: int = 1000
+    ) -> Tuple[Any, List[str], Any]:
+        """
+        Classify the outcome of many conversations at once.
+        
+        Texts are classified a chunk at a time. A chunk's lowercased texts
+        are joined into one string, and a pattern that requires a literal
+        jumps from one occurrence of it to the next with ``str.find``,
+        running the regex only inside the text holding it, where a per-text
+        loop tests every text. Chunks go to a pool of worker processes,
+        submitted a few ahead of the results being collected so texts can
+        be streamed from a generator. The score matrix for every outcome is
+        one matrix division.
+        
+        Args:
+            texts: Conversation texts
+            n_workers: Worker processes; 1 classifies in this process, and
+                None uses one per CPU once there is more than one chunk
+            chunk_size: Texts per work unit
+            
+        Returns:
+            Tuple of (scores, labels, confidences): a float matrix with a
+            row per text and a column per outcome in ``outcome_patterns``
+            order, and each text's best outcome and its score, the same as
+            ``classify_outcome`` returns
+            
+        Raises:
+            ImportError: If numpy is not installed
+        """
+        if not HAS_NUMPY:
+            raise ImportError("classify_many requires numpy")
+        outcomes = list(self._outcome_regexes)
+        if not outcomes:
+            n_texts = sum(1 for _ in texts)
+            return np.zeros((n_texts, 0)), ['unknown'] * n_texts, np.zeros(n_texts)
+        
+        counts = array('H')
+        chunks = _chunked(texts, max(1, chunk_size))
+        first = next(chunks, [])
+        second = next(chunks, None)
+        if n_workers is None:
+            n_workers = (os.cpu_count() or 1) if second is not None else 1
+        chunks = chain([first], [second] if second is not None else [], chunks)
+        if n_workers <= 1:
+            for chunk in chunks:
+                counts.extend(self._outcome_counts(chunk))
+        else:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(
+                max_workers=n_workers,
+                mp_context=context,
+                initializer=_init_classify_worker,
+                initargs=(self,)
+            ) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(_classify_worker_chunk, chunk))
+                    if len(pending) >= 2 * n_workers:
+                        counts.extend(pending.popleft().result())
+                while pending:
+                    counts.extend(pending.popleft().result())
+        
+        sizes = np.array([len(self._outcome_regexes[outcome]) for outcome in outcomes], dtype=np.float64)
+        scores = np.frombuffer(counts, dtype=np.uint16).reshape(-1, len(outcomes)) / sizes
+        best = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), best]
+        return scores, [outcomes[i] for i in best.tolist()], confidences
+    
+    def _outcome_counts(self, texts: List[str]) -> array:
+        """Matching outcome patterns per text and outcome, row after row"""
+        n_outcomes = len(self._outcome_regexes)
+        counts = array('H', bytes(2 * n_outcomes * len(texts)))
+        lowered = [text.lower() for text in texts]
+        joined = SEPARATOR.join(lowered)
+        starts = [0]
+        for text in lowered:
+            starts.append(starts[-1] + len(text) + 1)
+        
+        for column, outcome in enumerate(self._outcome_regexes):
+            for gated, seekable in zip(self._outcome_regexes[outcome], self._outcome_seekable[outcome]):
+                if seekable:
+                    rows = _matching_rows(gated, joined, starts)
+                else:
+                    rows = (row for row, text in enumerate(lowered) if _search(gated, text))
+                for row in rows:
+                    counts[row * n_outcomes + column] += 1
+        return counts
+    
     def extract_causal_factors(self, text: str) -> List[str]:
         """
         Extract causal factors from conversation text.
@@ -129,9 +376,9 @@ class PatternAnalyzer:
         text_lower = text.lower()
         factors = []
         
-        for category, patterns in self.causal_patterns.items():
+        for category, patterns in self._causal_regexes.items():
             for pattern, template in patterns:
-                match = re.search(pattern, text_lower)
+                match = _search(pattern, text_lower)
                 if match:
                     if match.groups():
                         factor = template.format(*match.groups())
@@ -152,9 +399,12 @@ class PatternAnalyzer:
             Dictionary of entity types to extracted values
         """
         entities = {}
+        text_lower = text.lower() if text.isascii() else None
         
-        for entity_type, pattern in self.entity_patterns.items():
-            matches = re.findall(pattern, text, re.IGNORECASE)
+        for entity_type, (regex, literals) in self._entity_regexes.items():
+            if literals and text_lower is not None and not any(l in text_lower for l in literals):
+                continue
+            matches = regex.findall(text)
             if matches:
                 entities[entity_type] = matches
         
@@ -166,4 +416,18 @@ class PatternAnalyzer:
             'outcome_patterns': sum(len(p) for p in self.outcome_patterns.values()),
             'causal_patterns': sum(len(p) for p in self.causal_patterns.values()),
             'entity_patterns': len(self.entity_patterns)
-        }
\ No newline at end of file
+        }
+
+
+# Analyzer of a classify_many worker process
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_classify_worker(analyzer: PatternAnalyzer):
+    """Keep the analyzer sent to a worker process"""
+    _WORKER['analyzer'] = analyzer
+
+
+def _classify_worker_chunk(texts: List[str]) -> array:
+    """Outcome pattern counts of one chunk in a worker process"""
+    return _WORKER['analyzer']._outcome_counts(texts)
\ No newline at end of file
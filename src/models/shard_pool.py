@@ -0,0 +1,304 @@
+"""
+Shard Pool Module
+Fans retrieval out to worker processes over memory-mapped index snapshots
+"""
+
+import heapq
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+from .keyword_index import KeywordIndex
+from .vector_index import VectorIndex, _dequantized_scores, _normalize, _top_k
+
+logger = logging.getLogger(__name__)
+
+# Per query: [(term row, idf)], best reachable score, [(boost rule row, boost)]
+KeywordPlan = Tuple[List[Tuple[int, float]], float, List[Tuple[int, float]]]
+
+
+class ShardPool:
+    """
+    Worker processes that each score one contiguous slice of the corpus.
+
+    The keyword postings (as CSR arrays) and the embedding matrix are
+    written once as ``.npy`` files to a private temporary directory. Every
+    worker memory-maps the same files, so index memory is shared through
+    the page cache instead of being pickled into each process, and only
+    queries and per-shard top-k results cross the pipes. The parent
+    resolves query terms and corpus-wide statistics, which keeps merged
+    scores identical to an unsharded search. A quantized embedding matrix
+    is snapshotted as stored and expanded by the workers while scoring.
+
+    A pool is a snapshot: it does not see transcripts added or removed
+    after it was built.
+    """
+
+    def __init__(
+        self,
+        n_workers: int,
+        keyword_index: KeywordIndex,
+        vector_index: Optional[VectorIndex] = None
+    ):
+        """
+        Snapshot the indexes and start the workers
+
+        Args:
+            n_workers: Worker processes (shards)
+            keyword_index: Keyword index to snapshot
+            vector_index: Embedding matrix to snapshot, if semantic search is used
+        """
+        if not HAS_NUMPY:
+            raise ImportError("ShardPool requires numpy")
+        self.n_workers = max(1, n_workers)
+        self.keyword_index = keyword_index
+        self.directory = tempfile.mkdtemp(prefix="retriever-shards-")
+        self._workers: List[Any] = []
+        self._connections: List[Any] = []
+        self._lock = threading.Lock()
+
+        try:
+            arrays, self.doc_ids, self.vocabulary = keyword_arrays(keyword_index)
+            self.vector_ids: List[str] = []
+            if vector_index is not None and len(vector_index):
+                live = vector_index.candidate_rows(vector_index.ids)
+                arrays['vectors'], scales = vector_index.stored(live)
+                if scales is not None:
+                    arrays['scales'] = scales
+                self.vector_ids = [vector_index.ids[r] for r in live]
+            for name, values in arrays.items():
+                np.save(os.path.join(self.directory, name + '.npy'), np.ascontiguousarray(values))
+
+            params = {'k1': keyword_index.k1, 'b': keyword_index.b}
+            context = multiprocessing.get_context('spawn')
+            for shard in range(self.n_workers):
+                parent, child = context.Pipe()
+                worker = context.Process(
+                    target=_worker_main,
+                    args=(child, self.directory, shard, self.n_workers, params),
+                    name=f"retriever-shard-{shard}",
+                    daemon=True
+                )
+                worker.start()
+                child.close()
+                self._workers.append(worker)
+                self._connections.append(parent)
+        except Exception:
+            self.close()
+            raise
+        logger.info(f"Started {self.n_workers} retrieval shards over {len(self.doc_ids)} transcripts")
+
+    def __len__(self) -> int:
+        return self.n_workers
+
+    def keyword_search_many(self, queries: List[str], top_k: int) -> List[List[Tuple[str, float]]]:
+        """BM25 search for a batch of queries, as ``KeywordIndex.search_many``"""
+        if not self.doc_ids or top_k <= 0:
+            return [[] for _ in queries]
+        plans = [self._plan(query) for query in queries]
+        n_docs = len(self.keyword_index)
+        stats = (self.keyword_index.total_length / n_docs, n_docs)
+        shard_results = self._broadcast(('keyword', plans, stats, top_k))
+
+        results = []
+        for q in range(len(queries)):
+            top = heapq.nsmallest(
+                top_k,
+                ((score, idx) for shard in shard_results for idx, score in zip(*shard[q])),
+                key=lambda item: (-item[0], item[1])
+            )
+            results.append([(self.doc_ids[idx], score) for score, idx in top])
+        return results
+
+    def vector_search_many(self, query_vectors: "np.ndarray", top_k: int) -> List[List[Tuple[str, float]]]:
+        """Exact cosine search for a batch of normalized query vectors"""
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        queries = _normalize(queries.reshape(len(queries), -1))
+        if not self.vector_ids or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+        shard_results = self._broadcast(('vector', queries, None, top_k))
+
+        results = []
+        for q in range(len(queries)):
+            top = heapq.nlargest(
+                top_k,
+                ((score, idx) for shard in shard_results for idx, score in zip(*shard[q])),
+                key=lambda item: item[0]
+            )
+            results.append([(self.vector_ids[idx], score) for score, idx in top])
+        return results
+
+    def close(self) -> None:
+        """Stop the workers and delete the snapshot"""
+        for connection in self._connections:
+            try:
+                connection.send(None)
+                connection.close()
+            except OSError:
+                pass
+        for worker in self._workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self._connections = []
+        self._workers = []
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _plan(self, query: str) -> KeywordPlan:
+        """Resolve a query to term rows and weights against the snapshot vocabulary"""
+        idfs, max_score, rules = self.keyword_index.query_weights(query)
+        terms = [(self.vocabulary[t], idf) for t, idf in idfs.items() if t in self.vocabulary]
+        boosts = [(rule, self.keyword_index.boost_rules[rule][2]) for rule in rules]
+        return terms, max_score, boosts
+
+    def _broadcast(self, request: Tuple) -> List[Any]:
+        """Send a request to every worker and collect their replies in shard order"""
+        with self._lock:
+            for connection in self._connections:
+                connection.send(request)
+            replies = [connection.recv() for connection in self._connections]
+        for status, payload in replies:
+            if status != 'ok':
+                raise RuntimeError(f"Shard search failed: {payload}")
+        return [payload for _, payload in replies]
+
+
+def keyword_arrays(index: KeywordIndex) -> Tuple[Dict[str, "np.ndarray"], List[str], Dict[str, int]]:
+    """
+    Flatten the live part of a keyword index into CSR arrays.
+
+    Returns:
+        Arrays (indptr, docs, tfs, lengths, boosted), the doc id of every
+        dense doc number and the row of every term
+    """
+    live = sorted(index.positions.values())
+    dense = {old: new for new, old in enumerate(live)}
+    vocabulary: Dict[str, int] = {}
+    indptr = [0]
+    docs: List[int] = []
+    tfs: List[int] = []
+    for term, postings in index.postings.items():
+        entries = sorted((dense[d], tf) for d, tf in postings.items() if d in dense)
+        if not entries:
+            continue
+        vocabulary[term] = len(vocabulary)
+        docs.extend(d for d, _ in entries)
+        tfs.extend(tf for _, tf in entries)
+        indptr.append(len(docs))
+
+    boosted = np.zeros((len(index.boost_rules), len(live)), dtype=bool)
+    for rule, rule_docs in enumerate(index.boosted_docs):
+        rows = [dense[d] for d in rule_docs if d in dense]
+        boosted[rule, rows] = True
+
+    arrays = {
+        'indptr': np.asarray(indptr, dtype=np.int64),
+        'docs': np.asarray(docs, dtype=np.int64),
+        'tfs': np.asarray(tfs, dtype=np.float64),
+        'lengths': np.asarray([index.doc_lengths[d] for d in live], dtype=np.float64),
+        'boosted': boosted
+    }
+    return arrays, [index.doc_ids[d] for d in live], vocabulary
+
+
+def _worker_main(connection, directory: str, shard: int, n_shards: int, params: Dict[str, float]):
+    """Serve search requests for one shard until told to stop"""
+    arrays = {
+        name[:-4]: np.load(os.path.join(directory, name), mmap_mode='r')
+        for name in os.listdir(directory) if name.endswith('.npy')
+    }
+    n_docs = arrays['lengths'].shape[0]
+    doc_range = (n_docs * shard // n_shards, n_docs * (shard + 1) // n_shards)
+    n_rows = arrays['vectors'].shape[0] if 'vectors' in arrays else 0
+    row_range = (n_rows * shard // n_shards, n_rows * (shard + 1) // n_shards)
+
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        kind, queries, stats, top_k = request
+        try:
+            if kind == 'keyword':
+                reply = [_score_keyword(arrays, doc_range, plan, stats, params, top_k) for plan in queries]
+            else:
+                reply = _score_vectors(arrays['vectors'], arrays.get('scales'), row_range, queries, top_k)
+            connection.send(('ok', reply))
+        except Exception as e:
+            connection.send(('error', repr(e)))
+    connection.close()
+
+
+def _score_keyword(
+    arrays: Dict[str, "np.ndarray"],
+    doc_range: Tuple[int, int],
+    plan: KeywordPlan,
+    stats: Tuple[float, int],
+    params: Dict[str, float],
+    top_k: int
+) -> Tuple[List[int], List[float]]:
+    """BM25 over one doc range with corpus-wide statistics, same arithmetic as KeywordIndex"""
+    lo, hi = doc_range
+    terms, max_score, boosts = plan
+    avg_length, _ = stats
+    k1, b = params['k1'], params['b']
+    indptr, docs, tfs, lengths = arrays['indptr'], arrays['docs'], arrays['tfs'], arrays['lengths']
+
+    scores = np.zeros(hi - lo, dtype=np.float64)
+    for term, idf in terms:
+        start, end = indptr[term], indptr[term + 1]
+        term_docs = docs[start:end]
+        first = start + np.searchsorted(term_docs, lo)
+        last = start + np.searchsorted(term_docs, hi)
+        d = docs[first:last]
+        tf = tfs[first:last]
+        norm = k1 * (1 - b + b * lengths[d] / avg_length)
+        scores[d - lo] += idf * tf * (k1 + 1) / (tf + norm)
+
+    if max_score > 0:
+        scores = scores / max_score * 100
+    for rule, boost in boosts:
+        scores[arrays['boosted'][rule, lo:hi]] += boost
+
+    hits = np.flatnonzero(scores > 0)
+    if len(hits) > top_k:
+        # Keep the lowest doc numbers among ties, like the unsharded heap
+        hit_scores = scores[hits]
+        kth = np.partition(hit_scores, len(hits) - top_k)[len(hits) - top_k]
+        better = hits[hit_scores > kth]
+        hits = np.concatenate([better, hits[hit_scores == kth][:top_k - len(better)]])
+    return (hits + lo).tolist(), scores[hits].tolist()
+
+
+def _score_vectors(
+    vectors: "np.ndarray",
+    scales: Optional["np.ndarray"],
+    row_range: Tuple[int, int],
+    queries: "np.ndarray",
+    top_k: int
+) -> List[Tuple[List[int], List[float]]]:
+    """Top-k rows of one slice of the (possibly quantized) embedding matrix for each query"""
+    lo, hi = row_range
+    if hi <= lo:
+        return [([], []) for _ in range(len(queries))]
+    if vectors.dtype == np.float32:
+        scores = queries @ vectors[lo:hi].T
+    else:
+        scores = _dequantized_scores(queries, vectors[lo:hi], None if scales is None else scales[lo:hi])
+    results = []
+    for row in scores:
+        top = _top_k(row, top_k)
+        results.append(((top + lo).tolist(), row[top].tolist()))
+    return results
@@ -0,0 +1,151 @@
+"""
+Snapshot Module
+Versioned, memory-mappable on-disk format for retriever state
+"""
+
+import json
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+FORMAT_NAME = 'conversation-retriever-snapshot'
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+
+# Arrays and JSON-serializable state of one component
+Part = Tuple[Dict[str, Any], Dict[str, Any]]
+
+
+def save_snapshot(path: str, parts: Dict[str, Part], info: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Write named parts to a snapshot directory, replacing any previous one.
+
+    Every array is its own file: ``array.array``, memoryview and bytes
+    buffers as raw native-endian bytes, numpy arrays as ``.npy``. Their
+    type codes and each part's state go into a JSON manifest written
+    last, so no file is ever unpickled. The new snapshot is assembled
+    next to ``path`` and swapped in with renames.
+
+    Args:
+        path: Snapshot directory
+        parts: Part name to (arrays, state)
+        info: Extra JSON-serializable information stored in the manifest
+    """
+    path = os.path.abspath(path)
+    staging = path + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    manifest = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'info': info or {},
+        'parts': {}
+    }
+    for part, (arrays, state) in parts.items():
+        entries = {}
+        for name, values in arrays.items():
+            filename = f"{part}.{name}"
+            if HAS_NUMPY and isinstance(values, np.ndarray):
+                filename += '.npy'
+                np.save(os.path.join(staging, filename), np.ascontiguousarray(values), allow_pickle=False)
+                entries[name] = {'file': filename, 'type': 'npy'}
+                continue
+            if isinstance(values, array):
+                typecode = values.typecode
+            elif isinstance(values, memoryview):
+                typecode = values.format
+            else:
+                typecode = 'B'
+            filename += '.bin'
+            with open(os.path.join(staging, filename), 'wb') as f:
+                f.write(values)
+            entries[name] = {'file': filename, 'type': typecode}
+        manifest['parts'][part] = {'arrays': entries, 'state': state}
+
+    with open(os.path.join(staging, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, default=str)
+
+    retired = path + '.old'
+    shutil.rmtree(retired, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, retired)
+    os.rename(staging, path)
+    shutil.rmtree(retired, ignore_errors=True)
+
+
+def snapshot_info(path: str) -> Optional[Dict[str, Any]]:
+    """The ``info`` stored with a snapshot, or None if there is no readable one"""
+    try:
+        return Snapshot(path).info
+    except (OSError, ValueError):
+        return None
+
+
+class Snapshot:
+    """
+    Read side of a snapshot directory.
+
+    Raw arrays are memory-mapped read-only and handed out as typed
+    memoryviews (byte buffers as the ``mmap`` itself, whose slices are
+    ``bytes``), numpy arrays as read-only memmaps. Nothing is copied, so
+    opening a snapshot costs the same whatever the corpus size, and
+    processes opening the same snapshot share its pages. Components copy
+    a buffer into a growable one only when they are first modified.
+    """
+
+    def __init__(self, path: str):
+        """Read and validate the manifest"""
+        self.path = path
+        with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != FORMAT_NAME:
+            raise ValueError(f"{path} is not a retriever snapshot")
+        if manifest.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {manifest.get('version')}")
+        if manifest.get('byteorder') != sys.byteorder:
+            raise ValueError(f"Snapshot was written on a {manifest.get('byteorder')}-endian machine")
+        self.info: Dict[str, Any] = manifest['info']
+        self._parts: Dict[str, Dict[str, Any]] = manifest['parts']
+
+    def __contains__(self, part: str) -> bool:
+        return part in self._parts
+
+    def part(self, name: str) -> Part:
+        """Arrays and state of one part"""
+        entry = self._parts[name]
+        arrays = {key: self._open(spec) for key, spec in entry['arrays'].items()}
+        return arrays, entry['state']
+
+    def _open(self, spec: Dict[str, str]) -> Any:
+        """Map one array file"""
+        filename = os.path.join(self.path, spec['file'])
+        if spec['type'] == 'npy':
+            if not HAS_NUMPY:
+                raise ImportError("Reading embedding arrays requires numpy")
+            return np.load(filename, mmap_mode='r', allow_pickle=False)
+        typecode = spec['type']
+        with open(filename, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                return b'' if typecode == 'B' else array(typecode)
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped if typecode == 'B' else memoryview(mapped).cast(typecode)
+
+
+def to_array(values: Any, typecode: str) -> "array":
+    """Growable copy of a buffer returned by ``Snapshot.part``"""
+    if isinstance(values, array):
+        return array(typecode, values)
+    copy = array(typecode)
+    copy.frombytes(values.cast('B') if isinstance(values, memoryview) else values)
+    return copy
@@ -0,0 +1,84 @@
+"""
+Turn Postings Module
+Token to turn lookup within one transcript
+"""
+
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Dict, Sequence, Tuple
+
+try:
+    from utils.helpers import tokenize
+except ImportError:
+    from ..utils.helpers import tokenize
+
+
+# Width of each turn's field in a packed turn set
+FIELD_BITS = 16
+
+
+class TurnPostings:
+    """
+    Inverted index from token to the turns of one transcript containing it.
+
+    The vocabulary is a sorted tuple of interned tokens next to each
+    token's turns packed into an int: one ``FIELD_BITS`` wide field per
+    turn, set to 1 where the turn contains the token. Adding packed sets
+    (times a weight) adds every turn's field at once, so scoring all turns
+    for several terms is a few integer additions, and ``unpack`` reads the
+    totals back. A field holds up to 65535, far beyond any query. Terms
+    match every token they are a prefix of ("escalate" finds "escalated").
+    Tokens that are no other token's prefix, which is most of them, are
+    also kept in a dict, so looking one of them up skips the bisection.
+    """
+
+    __slots__ = ('vocabulary', 'turns', 'leaves', 'turn_count')
+
+    def __init__(self, vocabulary: Tuple[str, ...] = (), turns: Tuple[int, ...] = (), turn_count: int = 0):
+        self.vocabulary = vocabulary
+        self.turns = turns
+        self.turn_count = turn_count
+        self.leaves: Dict[str, int] = {
+            token: turns[i] for i, token in enumerate(vocabulary)
+            if i + 1 == len(vocabulary) or not vocabulary[i + 1].startswith(token)
+        }
+
+    @classmethod
+    def build(cls, texts: Sequence[str]) -> "TurnPostings":
+        """Index lowercased turn texts"""
+        postings: Dict[str, int] = {}
+        for index, text in enumerate(texts):
+            field = 1 << FIELD_BITS * index
+            for token in set(tokenize(text, lowercase=False)):
+                postings[token] = postings.get(token, 0) | field
+        vocabulary = sorted(postings)
+        return cls(
+            tuple(sys.intern(token) for token in vocabulary),
+            tuple(postings[token] for token in vocabulary),
+            len(texts)
+        )
+
+    def __len__(self) -> int:
+        return len(self.vocabulary)
+
+    def lookup(self, term: str) -> int:
+        """Packed set of the turns with a token starting with ``term``"""
+        turns = self.leaves.get(term)
+        if turns is not None:
+            return turns
+        vocabulary = self.vocabulary
+        i = bisect_left(vocabulary, term)
+        turns = 0
+        while i < len(vocabulary) and vocabulary[i].startswith(term):
+            turns |= self.turns[i]
+            i += 1
+        return turns
+
+    def unpack(self, packed: int) -> array:
+        """Per-turn fields of a packed turn set or of a sum of them"""
+        fields = array('H')
+        fields.frombytes(packed.to_bytes(FIELD_BITS // 8 * self.turn_count, 'little'))
+        if sys.byteorder == 'big':
+            fields.byteswap()
+        return fields
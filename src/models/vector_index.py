@@ -0,0 +1,740 @@
+"""
+Vector Index Module
+Contiguous embedding matrix for semantic retrieval
+"""
+
+import hashlib
+import logging
+import tempfile
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+from .ann_index import IVFIndex
+from .snapshot import to_array
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on score matrix entries computed at once by batched searches
+SCORE_BLOCK = 1 << 24
+
+# Upper bound on quantized matrix entries expanded to float32 at once
+DEQUANT_BLOCK = 1 << 22
+
+# Supported storage types of the embedding matrix
+DTYPES = ('float32', 'float16', 'int8')
+
+
+class VectorIndex:
+    """
+    Dense embedding matrix with a parallel id list.
+
+    Vectors are L2-normalized float32 rows in one contiguous array, so
+    cosine similarity against a query is a single matrix-vector product.
+    Storage grows by doubling to keep repeated appends amortized O(1).
+    An optional IVF index narrows the scan to a few clusters once the
+    corpus is large enough for the exact scan to dominate latency.
+    Removed rows are tombstoned and masked out of searches until
+    ``compact`` drops them.
+
+    With ``dtype`` 'float16' or 'int8' (one float32 scale per row) the
+    matrix is stored quantized, halving or quartering its memory, and is
+    expanded to float32 a block at a time while scoring. ``rerank`` keeps
+    the exact float32 rows in a memory-mapped temporary file and re-scores
+    that many of the best quantized matches against them.
+    """
+
+    def __init__(self, dim: int = 0, dtype: str = 'float32', rerank: int = 0):
+        """
+        Initialize an empty index
+
+        Args:
+            dim: Embedding dimension (taken from the first batch if 0)
+            dtype: Storage type of the matrix, one of ``DTYPES``
+            rerank: Quantized matches re-scored exactly per query (0 disables)
+        """
+        if not HAS_NUMPY:
+            raise ImportError("VectorIndex requires numpy")
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown embedding dtype {dtype!r}; expected {', '.join(DTYPES)}")
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.quantized = dtype != 'float32'
+        self.rerank = rerank if self.quantized else 0
+        self.ids: List[str] = []
+        self._vectors = np.zeros((0, dim), dtype=self.dtype)
+        self._scales = np.zeros(0, dtype=np.float32) if dtype == 'int8' else None
+        self._exact = _disk_matrix(0, dim) if self.rerank else None
+        self._deleted = np.zeros(0, dtype=bool)
+        self._positions: Dict[str, int] = {}
+        self.n_deleted = 0
+        self.ann: Optional[IVFIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.ids) - self.n_deleted
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self._positions
+
+    @property
+    def rows(self) -> int:
+        """Number of stored rows, including tombstoned ones"""
+        return len(self.ids)
+
+    @property
+    def matrix(self) -> "np.ndarray":
+        """Populated rows as float32 (a view, or an expanded copy when quantized)"""
+        return self.dequantize()
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the populated rows and their scales, not counting the on-disk exact copy"""
+        size = len(self.ids) * self.dim * self.dtype.itemsize
+        if self._scales is not None:
+            size += len(self.ids) * self._scales.itemsize
+        return size
+
+    def add(self, ids: List[str], vectors: "np.ndarray", unique: bool = True) -> None:
+        """
+        Append a batch of vectors with their ids.
+
+        With ``unique`` (the default) an id that is already present is
+        replaced; otherwise ids are plain row labels and may repeat.
+        """
+        if not len(ids):
+            return
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+        if not self.dim:
+            self.dim = vectors.shape[1]
+            self._vectors = np.zeros((0, self.dim), dtype=self.dtype)
+            if self._exact is not None:
+                self._exact = _disk_matrix(0, self.dim)
+
+        size = len(self.ids)
+        needed = size + len(ids)
+        if needed > self._vectors.shape[0]:
+            capacity = max(needed, 2 * self._vectors.shape[0], 64)
+            grown = np.zeros((capacity, self.dim), dtype=self.dtype)
+            grown[:size] = self._vectors[:size]
+            self._vectors = grown
+            deleted = np.zeros(capacity, dtype=bool)
+            deleted[:size] = self._deleted[:size]
+            self._deleted = deleted
+            if self._scales is not None:
+                scales = np.zeros(capacity, dtype=np.float32)
+                scales[:size] = self._scales[:size]
+                self._scales = scales
+            if self._exact is not None:
+                self._exact = _disk_matrix(capacity, self.dim, self._exact[:size])
+
+        stored, scales = _quantize(vectors, self.dtype)
+        self._vectors[size:needed] = stored
+        if scales is not None:
+            self._scales[size:needed] = scales
+        if self._exact is not None:
+            self._exact[size:needed] = vectors
+        self.ids.extend(ids)
+        if unique:
+            for row, id_ in enumerate(ids, size):
+                old = self._positions.get(id_)
+                if old is not None:
+                    self._deleted[old] = True
+                    self.n_deleted += 1
+                self._positions[id_] = row
+
+    def remove(self, id_: str) -> bool:
+        """Tombstone the row stored for an id"""
+        row = self._positions.pop(id_, None)
+        if row is None:
+            return False
+        self._deleted[row] = True
+        self.n_deleted += 1
+        return True
+
+    def compact(self) -> int:
+        """Drop tombstoned rows and return how many were removed"""
+        dropped = self.n_deleted
+        if not dropped:
+            return 0
+        self.keep_rows(~self._deleted[:len(self.ids)])
+        return dropped
+
+    def keep_rows(self, keep: "np.ndarray") -> None:
+        """Rebuild the storage from the populated rows selected by a boolean mask"""
+        size = len(self.ids)
+        self._vectors = np.ascontiguousarray(self._vectors[:size][keep])
+        if self._scales is not None:
+            self._scales = self._scales[:size][keep]
+        if self._exact is not None:
+            self._exact = _disk_matrix(self._vectors.shape[0], self.dim, self._exact[:size][keep])
+        self._deleted = np.zeros(self._vectors.shape[0], dtype=bool)
+        self.ids = [id_ for id_, k in zip(self.ids, keep) if k]
+        self._positions = {id_: row for row, id_ in enumerate(self.ids)} if self._positions else {}
+        self.n_deleted = 0
+        # Row numbers changed, so the IVF lists are stale
+        self.ann = None
+
+    def dequantize(self, rows: Optional["np.ndarray"] = None) -> "np.ndarray":
+        """Float32 vectors of the given rows (all populated rows by default)"""
+        stored, scales = self.stored(rows)
+        if not self.quantized:
+            return stored
+        vectors = stored.astype(np.float32)
+        if scales is not None:
+            vectors *= scales[:, None]
+        return vectors
+
+    def stored(self, rows: Optional["np.ndarray"] = None) -> Tuple["np.ndarray", Optional["np.ndarray"]]:
+        """Rows as stored, with their int8 scales (None for float types)"""
+        if rows is None:
+            stored = self._vectors[:len(self.ids)]
+            scales = None if self._scales is None else self._scales[:len(self.ids)]
+        else:
+            stored = self._vectors[rows]
+            scales = None if self._scales is None else self._scales[rows]
+        return stored, scales
+
+    def scores(self, queries: "np.ndarray", rows: Optional["np.ndarray"] = None) -> "np.ndarray":
+        """
+        Similarities of normalized queries to the given rows (all populated rows by default).
+
+        A single query vector gives a vector of scores, a matrix of queries
+        one row of scores per query.
+        """
+        stored, scales = self.stored(rows)
+        if not self.quantized:
+            return stored @ queries if queries.ndim == 1 else queries @ stored.T
+        return _dequantized_scores(queries, stored, scales)
+
+    def search(
+        self,
+        query_vector: "np.ndarray",
+        top_k: int,
+        exact: bool = False,
+        candidates: Optional[Iterable[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Cosine search, approximate when an ANN index is built.
+
+        Args:
+            query_vector: Query embedding
+            top_k: Number of results to return
+            exact: Force a full scan even if an ANN index exists
+            candidates: Only score these ids
+
+        Returns:
+            List of (id, similarity) pairs, best first
+        """
+        if not self.ids or top_k <= 0:
+            return []
+        query = _normalize(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+
+        allowed = None if candidates is None else self.candidate_rows(candidates)
+        if self.ann is not None and not exact:
+            rows = self.ann.candidates(query, len(self.ids))
+            if allowed is not None:
+                # Scan whichever of the filter and the probed lists is smaller,
+                # falling back to the whole filter if the lists miss it
+                if len(allowed) <= len(rows):
+                    rows = allowed
+                else:
+                    rows = rows[np.isin(rows, allowed)]
+                    if len(rows) < min(top_k, len(allowed)):
+                        rows = allowed
+            elif self.n_deleted:
+                rows = rows[~self._deleted[rows]]
+            return self._select(query, self.scores(query, rows), top_k, rows)
+
+        if allowed is not None:
+            return self._select(query, self.scores(query, allowed), top_k, allowed)
+
+        scores = self.scores(query)
+        if self.n_deleted:
+            scores[self._deleted[:len(self.ids)]] = -np.inf
+        return self._select(query, scores, min(top_k, len(self)))
+
+    def search_many(
+        self,
+        query_vectors: "np.ndarray",
+        top_k: int,
+        exact: bool = False,
+        candidates: Optional[Iterable[str]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Cosine search for a batch of queries.
+
+        Without an ANN index the whole batch is scored as one matrix-matrix
+        product, split into blocks of queries so the score matrix stays
+        around ``SCORE_BLOCK`` floats. ``candidates`` restricts every query
+        to the same ids, scoring only their rows.
+
+        Returns:
+            One list of (id, similarity) pairs per query, best first
+        """
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        n_queries = len(queries)
+        if not self.ids or top_k <= 0 or not n_queries:
+            return [[] for _ in range(n_queries)]
+        queries = _normalize(queries.reshape(n_queries, -1))
+
+        if self.ann is not None and not exact:
+            if candidates is not None:
+                candidates = list(candidates)
+            return [self.search(query, top_k, candidates=candidates) for query in queries]
+
+        if candidates is not None:
+            rows = self.candidate_rows(candidates)
+            n_rows = k = len(rows)
+        else:
+            rows = None
+            n_rows, k = len(self.ids), len(self)
+        if not n_rows:
+            return [[] for _ in range(n_queries)]
+        k = min(top_k, k)
+        block = max(1, SCORE_BLOCK // n_rows)
+        results = []
+        for start in range(0, n_queries, block):
+            batch = queries[start:start + block]
+            scores = self.scores(batch, rows)
+            if rows is None and self.n_deleted:
+                scores[:, self._deleted[:len(self.ids)]] = -np.inf
+            for query, row in zip(batch, scores):
+                results.append(self._select(query, row, k, rows))
+        return results
+
+    def rerank_ids(self, query_vector: "np.ndarray", ids: Iterable[str], top_k: int) -> List[Tuple[str, float]]:
+        """Re-score the live rows of the given ids against the exact vectors, best first"""
+        query = _normalize(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+        return self._rerank(query, self.candidate_rows(ids), top_k)
+
+    def candidate_rows(self, candidates: Iterable[str]) -> "np.ndarray":
+        """Sorted live row numbers of the given ids"""
+        positions = self._positions
+        return np.sort(np.fromiter(
+            (positions[id_] for id_ in set(candidates) if id_ in positions), dtype=np.int64
+        ))
+
+    def snapshot(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Stored rows, scales, exact rows and IVF lists for ``save_snapshot``"""
+        size = len(self.ids)
+        arrays = {'vectors': self._vectors[:size]}
+        if self._scales is not None:
+            arrays['scales'] = self._scales[:size]
+        if self._exact is not None:
+            arrays['exact'] = self._exact[:size]
+        state = {
+            'dim': self.dim,
+            'dtype': self.dtype.name,
+            'ids': self.ids,
+            'unique': bool(self._positions),
+            'deleted': np.flatnonzero(self._deleted[:size]).tolist(),
+            'ann': None
+        }
+        if self.ann is not None:
+            arrays.update(ann_centroids=self.ann.centroids, ann_order=self.ann.order, ann_offsets=self.ann.offsets)
+            state['ann'] = {'nprobe': self.ann.nprobe, 'fingerprint': self.ann.fingerprint}
+        return arrays, state
+
+    def restore(self, arrays: Dict[str, Any], state: Dict[str, Any]) -> None:
+        """
+        Replace the contents with a snapshot written by ``snapshot``.
+
+        The matrix stays memory-mapped until rows are added or compacted.
+
+        Raises:
+            ValueError: If the snapshot was stored with another dtype, or
+                without the exact rows this index re-ranks against
+        """
+        if state['dtype'] != self.dtype.name:
+            raise ValueError(f"Snapshot stores {state['dtype']} vectors, index uses {self.dtype.name}")
+        if self._exact is not None and 'exact' not in arrays:
+            raise ValueError("Snapshot has no exact vectors to re-rank against")
+        self.dim = state['dim']
+        self.ids = state['ids']
+        self._vectors = arrays['vectors']
+        if self._scales is not None:
+            self._scales = arrays['scales']
+        if self._exact is not None:
+            self._exact = arrays['exact']
+        self._deleted = np.zeros(len(self.ids), dtype=bool)
+        self._deleted[state['deleted']] = True
+        self.n_deleted = len(state['deleted'])
+        self._positions = {}
+        if state['unique']:
+            self._positions = {id_: row for row, id_ in enumerate(self.ids) if not self._deleted[row]}
+        self.ann = None
+        if state['ann'] is not None:
+            self.ann = IVFIndex(
+                arrays['ann_centroids'], arrays['ann_order'], arrays['ann_offsets'],
+                state['ann']['nprobe'], state['ann']['fingerprint']
+            )
+
+    def build_ann(self, n_lists: Optional[int] = None, nprobe: int = 8) -> IVFIndex:
+        """Cluster the current rows into an IVF index"""
+        self.ann = IVFIndex.build(self.matrix, n_lists=n_lists, nprobe=nprobe)
+        self.ann.fingerprint = self._fingerprint(len(self.ids))
+        return self.ann
+
+    def save_ann(self, path: str) -> None:
+        """Persist the ANN index next to the corpus"""
+        if self.ann is not None:
+            self.ann.save(path)
+
+    def load_ann(self, path: str, nprobe: int = 8) -> bool:
+        """Load a persisted ANN index if it was built over these rows"""
+        try:
+            ann = IVFIndex.load(path, nprobe)
+        except (OSError, KeyError, ValueError) as e:
+            logger.info(f"No usable ANN index at {path}: {e}")
+            return False
+        if ann.size > len(self.ids) or ann.fingerprint != self._fingerprint(ann.size):
+            logger.info(f"ANN index at {path} does not match the loaded corpus")
+            return False
+        self.ann = ann
+        return True
+
+    def _select(
+        self,
+        query: "np.ndarray",
+        scores: "np.ndarray",
+        top_k: int,
+        rows: Optional["np.ndarray"] = None
+    ) -> List[Tuple[str, float]]:
+        """Best (id, similarity) pairs of one query's scores over ``rows`` (all rows if None)"""
+        if self.rerank and top_k > 0:
+            top = _top_k(scores, max(top_k, self.rerank))
+            top = top[np.isfinite(scores[top])]
+            return self._rerank(query, top if rows is None else rows[top], top_k)
+        top = _top_k(scores, top_k)
+        if rows is None:
+            return [(self.ids[i], float(scores[i])) for i in top]
+        return [(self.ids[rows[i]], float(scores[i])) for i in top]
+
+    def _rerank(self, query: "np.ndarray", rows: "np.ndarray", top_k: int) -> List[Tuple[str, float]]:
+        """Top-k of the given rows by exact similarity (dequantized if no exact copy is kept)"""
+        if not len(rows):
+            return []
+        if self._exact is None:
+            exact = self.dequantize(rows) @ query
+        else:
+            exact = np.asarray(self._exact[rows]) @ query
+        return [(self.ids[rows[i]], float(exact[i])) for i in _top_k(exact, top_k)]
+
+    def _fingerprint(self, size: int) -> str:
+        """Hash of the first ``size`` ids, tying an ANN index to its rows"""
+        return hashlib.sha1("\n".join(self.ids[:size]).encode('utf-8')).hexdigest()
+
+
+class TurnIndex:
+    """
+    Turn-level embedding matrix with max or top-n pooled transcript scores.
+
+    Each row embeds a window of consecutive turns. Rows of one transcript
+    are contiguous, so ``offsets[i]:offsets[i + 1]`` is the row range of
+    the i-th transcript and pooling is a segmented reduction over the
+    score vector. Searches also report which turns scored best, so
+    evidence extraction does not need to rescan the transcript. Removed
+    transcripts are masked out until ``compact`` rebuilds the arrays.
+    """
+
+    def __init__(self, window: int = 1, pool_n: int = 1, max_turns: int = 3, dtype: str = 'float32'):
+        """
+        Initialize an empty index
+
+        Args:
+            window: Consecutive turns embedded per row
+            pool_n: Best rows averaged per transcript (1 means max pooling)
+            max_turns: Best-matching rows reported per transcript
+            dtype: Storage type of the chunk matrix, one of ``DTYPES``
+        """
+        self.window = max(1, window)
+        self.pool_n = max(1, pool_n)
+        self.max_turns = max_turns
+        self.vectors = VectorIndex(dtype=dtype)
+        self.transcript_ids: List[str] = []
+        self.offsets: List[int] = [0]
+        self.first_turns = array('i')
+        self.turn_counts = array('i')
+        self._offsets_array = None
+        self._positions: Dict[str, int] = {}
+        self._deleted: set = set()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, transcript_id: str) -> bool:
+        return transcript_id in self._positions
+
+    def chunk(self, texts: List[str]) -> List[Tuple[int, int, str]]:
+        """Split a transcript's turn texts into (first turn, turn count, text) windows"""
+        if len(texts) <= self.window:
+            return [(0, len(texts), " ".join(texts))] if texts else []
+        return [
+            (i, self.window, " ".join(texts[i:i + self.window]))
+            for i in range(len(texts) - self.window + 1)
+        ]
+
+    def add(self, transcript_id: str, chunks: List[Tuple[int, int]], vectors: "np.ndarray") -> None:
+        """Append the (first turn, turn count) chunks of one transcript with their vectors"""
+        self.remove(transcript_id)
+        if not chunks:
+            return
+        self.vectors.add([transcript_id] * len(chunks), vectors, unique=False)
+        self._positions[transcript_id] = len(self.transcript_ids)
+        self.transcript_ids.append(transcript_id)
+        for first, count in chunks:
+            self.first_turns.append(first)
+            self.turn_counts.append(count)
+        self.offsets.append(self.offsets[-1] + len(chunks))
+        self._offsets_array = None
+
+    def remove(self, transcript_id: str) -> bool:
+        """Mask a transcript out of future searches"""
+        position = self._positions.pop(transcript_id, None)
+        if position is None:
+            return False
+        self._deleted.add(position)
+        return True
+
+    def compact(self) -> int:
+        """Rebuild the arrays without removed transcripts"""
+        dropped = len(self._deleted)
+        if not dropped:
+            return 0
+        kept = [t for t in range(len(self.transcript_ids)) if t not in self._deleted]
+        lengths = [self.offsets[t + 1] - self.offsets[t] for t in kept]
+        rows = [r for t in kept for r in range(self.offsets[t], self.offsets[t + 1])]
+
+        keep = np.zeros(self.vectors.rows, dtype=bool)
+        keep[rows] = True
+        self.vectors.keep_rows(keep)
+        self.first_turns = array('i', (self.first_turns[r] for r in rows))
+        self.turn_counts = array('i', (self.turn_counts[r] for r in rows))
+        self.transcript_ids = [self.transcript_ids[t] for t in kept]
+        self.offsets = [0]
+        for length in lengths:
+            self.offsets.append(self.offsets[-1] + length)
+        self._positions = {tid: i for i, tid in enumerate(self.transcript_ids)}
+        self._deleted = set()
+        self._offsets_array = None
+        return dropped
+
+    def snapshot(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Chunk matrix and turn tables for ``save_snapshot``"""
+        arrays, vector_state = self.vectors.snapshot()
+        arrays.update(
+            offsets=array('q', self.offsets),
+            first_turns=self.first_turns,
+            turn_counts=self.turn_counts
+        )
+        state = {
+            'window': self.window,
+            'vectors': vector_state,
+            'transcript_ids': self.transcript_ids,
+            'deleted': sorted(self._deleted)
+        }
+        return arrays, state
+
+    def restore(self, arrays: Dict[str, Any], state: Dict[str, Any]) -> None:
+        """
+        Replace the contents with a snapshot written by ``snapshot``.
+
+        Raises:
+            ValueError: If the snapshot was chunked with another window or
+                stored with another dtype
+        """
+        if state['window'] != self.window:
+            raise ValueError(f"Snapshot chunks {state['window']} turns, index uses {self.window}")
+        self.vectors.restore(arrays, state['vectors'])
+        self.transcript_ids = state['transcript_ids']
+        self.offsets = arrays['offsets'].tolist()
+        self.first_turns = to_array(arrays['first_turns'], 'i')
+        self.turn_counts = to_array(arrays['turn_counts'], 'i')
+        self._deleted = set(state['deleted'])
+        self._positions = {
+            tid: i for i, tid in enumerate(self.transcript_ids) if i not in self._deleted
+        }
+        self._offsets_array = None
+
+    def search(
+        self,
+        query_vector: "np.ndarray",
+        top_k: int,
+        candidates: Optional[Iterable[str]] = None
+    ) -> List[Tuple[str, float, List[int]]]:
+        """
+        Score transcripts by pooling their chunk similarities.
+
+        Args:
+            query_vector: Query embedding
+            top_k: Number of transcripts to return
+            candidates: Only score the chunks of these transcript ids
+
+        Returns:
+            List of (transcript_id, pooled score, matched turn ids), best first
+        """
+        if not self._positions or top_k <= 0:
+            return []
+        query = _normalize(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+        if candidates is None:
+            return self._rank(self.vectors.scores(query), top_k)
+        rows, offsets, transcripts = self._candidate_rows(candidates)
+        return self._rank(self.vectors.scores(query, rows), top_k, rows, offsets, transcripts)
+
+    def search_many(
+        self,
+        query_vectors: "np.ndarray",
+        top_k: int,
+        candidates: Optional[Iterable[str]] = None
+    ) -> List[List[Tuple[str, float, List[int]]]]:
+        """Pooled search for a batch of queries, scoring chunks in blocks of queries"""
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        n_queries = len(queries)
+        if not self._positions or top_k <= 0 or not n_queries:
+            return [[] for _ in range(n_queries)]
+        queries = _normalize(queries.reshape(n_queries, -1))
+
+        if candidates is None:
+            rows = offsets = transcripts = None
+            n_rows = self.vectors.rows
+        else:
+            rows, offsets, transcripts = self._candidate_rows(candidates)
+            n_rows = len(rows)
+        block = max(1, SCORE_BLOCK // max(n_rows, 1))
+        results = []
+        for start in range(0, n_queries, block):
+            for scores in self.vectors.scores(queries[start:start + block], rows):
+                results.append(self._rank(scores, top_k, rows, offsets, transcripts))
+        return results
+
+    def _offsets(self) -> "np.ndarray":
+        """Chunk row offsets as an array, cached until the next change"""
+        if self._offsets_array is None:
+            self._offsets_array = np.asarray(self.offsets, dtype=np.int64)
+        return self._offsets_array
+
+    def _candidate_rows(
+        self,
+        candidates: Iterable[str]
+    ) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+        """Chunk rows, subset offsets and transcript positions of the live candidates"""
+        transcripts = np.sort(np.fromiter(
+            (self._positions[tid] for tid in set(candidates) if tid in self._positions),
+            dtype=np.int64
+        ))
+        all_offsets = self._offsets()
+        starts = all_offsets[transcripts]
+        counts = all_offsets[transcripts + 1] - starts
+        offsets = np.zeros(len(transcripts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        rows = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+        return rows, offsets, transcripts
+
+    def _rank(
+        self,
+        scores: "np.ndarray",
+        top_k: int,
+        rows: Optional["np.ndarray"] = None,
+        offsets: Optional["np.ndarray"] = None,
+        transcripts: Optional["np.ndarray"] = None
+    ) -> List[Tuple[str, float, List[int]]]:
+        """
+        Pool one query's chunk scores per transcript and pick the best transcripts.
+
+        ``rows``, ``offsets`` and ``transcripts`` describe a subset of the
+        index (see ``_candidate_rows``); without them ``scores`` covers
+        every chunk row.
+        """
+        if transcripts is None:
+            offsets = self._offsets()
+            limit = len(self)
+        else:
+            limit = len(transcripts)
+        if not limit:
+            return []
+        starts = offsets[:-1]
+
+        if self.pool_n == 1:
+            pooled = np.maximum.reduceat(scores, starts)
+        else:
+            counts = np.diff(offsets)
+            owner = np.repeat(np.arange(len(counts)), counts)
+            order = np.lexsort((-scores, owner))
+            rank = np.arange(len(order)) - starts[owner[order]]
+            keep = order[rank < self.pool_n]
+            pooled = np.bincount(owner[keep], weights=scores[keep], minlength=len(counts))
+            pooled = (pooled / np.minimum(counts, self.pool_n)).astype(np.float32)
+
+        if transcripts is None and self._deleted:
+            pooled[list(self._deleted)] = -np.inf
+
+        results = []
+        for t in _top_k(pooled, min(top_k, limit)):
+            start, end = offsets[t], offsets[t + 1]
+            best = _top_k(scores[start:end], self.max_turns)
+            turns = []
+            for row in best:
+                chunk = start + row if rows is None else rows[start + row]
+                first = self.first_turns[chunk]
+                count = self.turn_counts[chunk]
+                turns.extend(i for i in range(first, first + count) if i not in turns)
+            position = t if transcripts is None else transcripts[t]
+            results.append((self.transcript_ids[position], float(pooled[t]), turns))
+        return results
+
+
+def _normalize(vectors: "np.ndarray") -> "np.ndarray":
+    """L2-normalize rows, leaving zero rows untouched"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _quantize(vectors: "np.ndarray", dtype: "np.dtype") -> Tuple["np.ndarray", Optional["np.ndarray"]]:
+    """Convert float32 rows to the storage type, with per-row scales for int8"""
+    if dtype != np.int8:
+        return vectors.astype(dtype), None
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def _dequantized_scores(
+    queries: "np.ndarray",
+    stored: "np.ndarray",
+    scales: Optional["np.ndarray"] = None
+) -> "np.ndarray":
+    """``queries @ stored.T`` for quantized rows, expanding ``DEQUANT_BLOCK`` entries at a time"""
+    single = queries.ndim == 1
+    queries = queries.reshape(1, -1) if single else queries
+    scores = np.empty((len(queries), stored.shape[0]), dtype=np.float32)
+    step = max(1, DEQUANT_BLOCK // max(stored.shape[1], 1))
+    for start in range(0, stored.shape[0], step):
+        block = stored[start:start + step].astype(np.float32)
+        scores[:, start:start + step] = queries @ block.T
+    if scales is not None:
+        scores *= scales
+    return scores[0] if single else scores
+
+
+def _disk_matrix(rows: int, dim: int, source: Optional["np.ndarray"] = None) -> "np.ndarray":
+    """Float32 matrix memory-mapped from an anonymous temporary file"""
+    matrix = np.memmap(tempfile.TemporaryFile(), dtype=np.float32, mode='w+', shape=(max(rows, 1), max(dim, 1)))
+    if source is not None and len(source):
+        matrix[:len(source)] = source
+    return matrix
+
+
+def _top_k(scores: "np.ndarray", k: int) -> "np.ndarray":
+    """Indices of the k highest scores, best first, via partial selection"""
+    k = min(k, scores.shape[0])
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
@@ -2,24 +2,58 @@
 Task 1: Conversation Retrieval System
 """
 
+import importlib.util
 import logging
+import os
 import re
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
+from dataclasses import dataclass, field
+
+try:
+    from models.embedding_cache import EmbeddingCache
+    from models.fusion import reciprocal_rank_fusion, weighted_score_fusion
+    from models.keyword_index import KeywordIndex
+    from models.metadata_index import MetadataIndex
+    from models.shard_pool import ShardPool
+    from models.snapshot import Snapshot, save_snapshot, snapshot_info, to_array
+    from models.vector_index import DTYPES, TurnIndex, VectorIndex
+    from utils.helpers import is_jsonl_file, iter_jsonl, load_json_file, tokenize
+except ImportError:
+    from .models.embedding_cache import EmbeddingCache
+    from .models.fusion import reciprocal_rank_fusion, weighted_score_fusion
+    from .models.keyword_index import KeywordIndex
+    from .models.metadata_index import MetadataIndex
+    from .models.shard_pool import ShardPool
+    from .models.snapshot import Snapshot, save_snapshot, snapshot_info, to_array
+    from .models.vector_index import DTYPES, TurnIndex, VectorIndex
+    from .utils.helpers import is_jsonl_file, iter_jsonl, load_json_file, tokenize
 
 logger = logging.getLogger(__name__)
 
-# Try importing optional packages
-try:
-    from sentence_transformers import SentenceTransformer, util
-    HAS_EMBEDDINGS = True
+# Detect optional packages without importing them; sentence-transformers
+# pulls in torch, which is only imported once a semantic encode is needed
+HAS_EMBEDDINGS = importlib.util.find_spec("sentence_transformers") is not None
+if HAS_EMBEDDINGS:
     logger.info("Sentence transformers available")
-except ImportError:
-    HAS_EMBEDDINGS = False
+else:
     logger.info("Using keyword-based retrieval (no sentence-transformers)")
 
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
 
-@dataclass
+# Keys accepted by the filters argument of the retrieve methods
+FILTER_KEYS = ('domain', 'outcome', 'since', 'until')
+
+# Slotted dataclasses need Python 3.10+
+_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_SLOTS)
 class ConversationTurn:
     """Single turn in conversation"""
     turn_id: int
@@ -28,65 +62,828 @@ class ConversationTurn:
     timestamp: Optional[str] = None
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class ConversationTranscript:
-    """Complete conversation transcript"""
+    """
+    Complete conversation transcript
+    
+    The lowercased text, per-turn lowercased texts and tokens are computed
+    on first use and cached. Replacing or resizing ``turns`` invalidates
+    the cache automatically; call ``invalidate_cache`` after editing a
+    turn in place.
+    """
     transcript_id: str
     domain: str
     outcome: str
     turns: List[ConversationTurn]
     metadata: Dict[str, Any]
+    _normalized: Optional[Tuple[str, List[str], List[str]]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _normalized_key: Optional[Tuple[int, int]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
     
     def get_full_text(self) -> str:
         """Get concatenated text from all turns"""
         return " ".join([turn.text for turn in self.turns])
+    
+    @property
+    def normalized_text(self) -> str:
+        """Lowercased full text"""
+        return self._get_normalized()[0]
+    
+    @property
+    def normalized_turns(self) -> List[str]:
+        """Lowercased text of each turn"""
+        return self._get_normalized()[1]
+    
+    @property
+    def tokens(self) -> List[str]:
+        """Tokens of the full text"""
+        return self._get_normalized()[2]
+    
+    def invalidate_cache(self):
+        """Drop cached normalized text after turns were edited in place"""
+        self._normalized = None
+        self._normalized_key = None
+    
+    def _get_normalized(self) -> Tuple[str, List[str], List[str]]:
+        """Compute the normalized representation once per version of the turns"""
+        key = (id(self.turns), len(self.turns))
+        if self._normalized is None or self._normalized_key != key:
+            turns = [turn.text.lower() for turn in self.turns]
+            text = " ".join(turns)
+            self._normalized = (text, turns, tokenize(text, lowercase=False))
+            self._normalized_key = key
+        return self._normalized
+
+
+class TranscriptStore:
+    """
+    Columnar storage for transcripts.
+    
+    Turn texts live in one UTF-8 arena, joined by single spaces within a
+    transcript, and are addressed by start/end offset arrays, so the full
+    text of a transcript is one slice. Speakers, domains and outcomes are
+    stored as small integer codes into interned value tables. Transcript
+    and turn objects are only materialized when requested; the most
+    recently used ones are kept so their normalized text cache survives
+    between queries. A store restored from a snapshot reads the arena and
+    columns straight from the memory-mapped files and copies them into
+    growable buffers on the first write.
+    """
+    
+    def __init__(self, view_cache_size: int = 1024):
+        """Initialize an empty store"""
+        self.view_cache_size = view_cache_size
+        self._views: "OrderedDict[str, ConversationTranscript]" = OrderedDict()
+        self._rows: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._turn_bounds = array('q', [0])
+        self._domains = array('H')
+        self._outcomes = array('H')
+        self._metadata: Dict[str, List[Any]] = {}
+        
+        self._arena = bytearray()
+        self._text_starts = array('q')
+        self._text_ends = array('q')
+        self._turn_ids = array('i')
+        self._speakers = array('H')
+        self._timestamps: Dict[int, str] = {}
+        
+        self._values: List[str] = []
+        self._codes: Dict[str, int] = {}
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def __contains__(self, transcript_id: str) -> bool:
+        return transcript_id in self._rows
+    
+    def __iter__(self) -> Iterator[ConversationTranscript]:
+        for transcript_id, row in self._rows.items():
+            view = self._views.get(transcript_id)
+            yield view if view is not None else self._materialize(row)
+    
+    @property
+    def turn_count(self) -> int:
+        return len(self._turn_ids)
+    
+    @property
+    def dead_rows(self) -> int:
+        """Rows left behind by removed or replaced transcripts"""
+        return len(self._ids) - len(self._rows)
+    
+    def ids(self) -> List[str]:
+        """Transcript ids in load order"""
+        return list(self._rows)
+    
+    def add(self, transcript: ConversationTranscript) -> int:
+        """Append a transcript, replacing any with the same id, and return its row"""
+        self.remove(transcript.transcript_id)
+        self._thaw()
+        row = len(self._ids)
+        
+        for i, turn in enumerate(transcript.turns):
+            if i:
+                self._arena += b" "
+            self._text_starts.append(len(self._arena))
+            self._arena += turn.text.encode('utf-8')
+            self._text_ends.append(len(self._arena))
+            self._turn_ids.append(turn.turn_id)
+            self._speakers.append(self._code(turn.speaker))
+            if turn.timestamp is not None:
+                self._timestamps[len(self._turn_ids) - 1] = turn.timestamp
+        
+        self._turn_bounds.append(len(self._turn_ids))
+        self._domains.append(self._code(transcript.domain))
+        self._outcomes.append(self._code(transcript.outcome))
+        
+        for key in transcript.metadata:
+            if key not in self._metadata:
+                self._metadata[key] = [_MISSING] * row
+        for key, column in self._metadata.items():
+            value = transcript.metadata.get(key, _MISSING)
+            column.append(sys.intern(value) if isinstance(value, str) and len(value) <= 64 else value)
+        
+        self._ids.append(transcript.transcript_id)
+        self._rows[transcript.transcript_id] = row
+        self._cache_view(transcript)
+        return row
+    
+    def remove(self, transcript_id: str) -> bool:
+        """Drop a transcript; its row stays allocated until compaction"""
+        self._views.pop(transcript_id, None)
+        return self._rows.pop(transcript_id, None) is not None
+    
+    def compact(self) -> int:
+        """Rewrite the columns without dead rows and return how many were dropped"""
+        dropped = self.dead_rows
+        if not dropped:
+            return 0
+        views = self._views
+        fresh = TranscriptStore(view_cache_size=0)
+        for row in self._rows.values():
+            fresh.add(self._materialize(row))
+        fresh.view_cache_size = self.view_cache_size
+        fresh._views = views
+        self.__dict__.update(fresh.__dict__)
+        return dropped
+    
+    def get(self, transcript_id: str) -> Optional[ConversationTranscript]:
+        """Materialize a transcript by id"""
+        view = self._views.get(transcript_id)
+        if view is not None:
+            self._views.move_to_end(transcript_id)
+            return view
+        row = self._rows.get(transcript_id)
+        if row is None:
+            return None
+        view = self._materialize(row)
+        self._cache_view(view)
+        return view
+    
+    def full_text(self, transcript_id: str) -> str:
+        """Concatenated turn text without materializing turns"""
+        row = self._rows.get(transcript_id)
+        if row is None:
+            return ""
+        first, last = self._turn_bounds[row], self._turn_bounds[row + 1]
+        if first == last:
+            return ""
+        return self._arena[self._text_starts[first]:self._text_ends[last - 1]].decode('utf-8')
+    
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the columnar buffers"""
+        arrays = (
+            self._turn_bounds, self._domains, self._outcomes, self._text_starts,
+            self._text_ends, self._turn_ids, self._speakers
+        )
+        total = len(self._arena) + sum(a.itemsize * len(a) for a in arrays)
+        total += sum(sys.getsizeof(tid) for tid in self._ids) + 8 * (len(self._ids) + 2 * len(self._rows))
+        for column in self._metadata.values():
+            total += 8 * len(column) + sum(
+                sys.getsizeof(v) for v in column if isinstance(v, str) and len(v) > 64
+            )
+        return total
+    
+    def snapshot(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Columns and tables for ``save_snapshot``"""
+        arrays = {'arena': self._arena}
+        arrays.update((name, getattr(self, '_' + name)) for name, _ in _COLUMNS)
+        metadata = {}
+        for key, column in self._metadata.items():
+            metadata[key] = {
+                'values': [None if v is _MISSING else v for v in column],
+                'missing': [row for row, v in enumerate(column) if v is _MISSING]
+            }
+        state = {
+            'ids': self._ids,
+            'live': list(self._rows.values()),
+            'values': self._values,
+            'timestamps': self._timestamps,
+            'metadata': metadata
+        }
+        return arrays, state
+    
+    def restore(self, arrays: Dict[str, Any], state: Dict[str, Any]):
+        """Replace the contents with a snapshot written by ``snapshot``"""
+        self._views.clear()
+        self._arena = arrays['arena']
+        for name, _ in _COLUMNS:
+            setattr(self, '_' + name, arrays[name])
+        self._ids = state['ids']
+        self._rows = {self._ids[row]: row for row in state['live']}
+        self._values = state['values']
+        self._codes = {value: code for code, value in enumerate(self._values)}
+        self._timestamps = {int(i): ts for i, ts in state['timestamps'].items()}
+        self._metadata = {}
+        for key, column in state['metadata'].items():
+            values = column['values']
+            for row in column['missing']:
+                values[row] = _MISSING
+            self._metadata[key] = values
+    
+    def _thaw(self):
+        """Copy memory-mapped columns into growable buffers before the first write"""
+        if isinstance(self._arena, bytearray):
+            return
+        self._arena = bytearray(self._arena)
+        for name, typecode in _COLUMNS:
+            setattr(self, '_' + name, to_array(getattr(self, '_' + name), typecode))
+    
+    def _cache_view(self, transcript: ConversationTranscript):
+        """Keep a materialized transcript in the bounded LRU"""
+        if self.view_cache_size <= 0:
+            return
+        self._views[transcript.transcript_id] = transcript
+        self._views.move_to_end(transcript.transcript_id)
+        while len(self._views) > self.view_cache_size:
+            self._views.popitem(last=False)
+    
+    def _code(self, value: str) -> int:
+        """Intern a categorical value"""
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._values)
+            self._values.append(value)
+            self._codes[value] = code
+        return code
+    
+    def _materialize(self, row: int) -> ConversationTranscript:
+        """Build transcript and turn objects for a row"""
+        turns = []
+        for i in range(self._turn_bounds[row], self._turn_bounds[row + 1]):
+            turns.append(ConversationTurn(
+                turn_id=self._turn_ids[i],
+                speaker=self._values[self._speakers[i]],
+                text=self._arena[self._text_starts[i]:self._text_ends[i]].decode('utf-8'),
+                timestamp=self._timestamps.get(i)
+            ))
+        metadata = {
+            key: column[row] for key, column in self._metadata.items()
+            if column[row] is not _MISSING
+        }
+        return ConversationTranscript(
+            transcript_id=self._ids[row],
+            domain=self._values[self._domains[row]],
+            outcome=self._values[self._outcomes[row]],
+            turns=turns,
+            metadata=metadata
+        )
+
+
+_MISSING = object()
+
+# Per-row and per-turn columns of TranscriptStore with their array type codes
+_COLUMNS = (
+    ('turn_bounds', 'q'), ('domains', 'H'), ('outcomes', 'H'),
+    ('text_starts', 'q'), ('text_ends', 'q'), ('turn_ids', 'i'), ('speakers', 'H')
+)
+
+
+@dataclass
+class RetrievalResult:
+    """Ranked conversation IDs with the time spent in each retrieval stage"""
+    ids: List[str]
+    scores: List[float]
+    turns: Dict[str, List[int]] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
 
 
 class ConversationRetriever:
     """Retrieves relevant conversations based on queries"""
     
-    def __init__(self, use_embeddings: bool = True):
-        """Initialize the retriever"""
-        self.conversations_by_id: Dict[str, ConversationTranscript] = {}
-        self.embeddings: Dict[str, Any] = {}
+    def __init__(
+        self,
+        use_embeddings: bool = True,
+        batch_size: int = 64,
+        cache_dir: Optional[str] = None,
+        ann_min_size: int = 10000,
+        ann_nprobe: int = 8,
+        ann_path: Optional[str] = None,
+        index_mode: str = 'transcript',
+        turn_window: int = 1,
+        pool_n: int = 1,
+        compaction_threshold: float = 0.25,
+        retrieval_mode: str = 'auto',
+        fusion: str = 'rrf',
+        hybrid_candidates: int = 50,
+        hybrid_weights: Tuple[float, float] = (1.0, 1.0),
+        rrf_k: int = 60,
+        n_shards: int = 0,
+        shard_rebuild_fraction: float = 0.1,
+        embedding_dtype: str = 'float32',
+        rerank_candidates: int = 0
+    ):
+        """
+        Initialize the retriever
+        
+        Args:
+            use_embeddings: Use semantic search when sentence-transformers is installed
+            batch_size: Transcripts encoded per model call
+            cache_dir: Directory for the persistent embedding cache
+            ann_min_size: Corpus size at which the IVF index replaces exact search
+            ann_nprobe: IVF clusters scanned per query (higher is slower but more accurate)
+            ann_path: File the IVF index is loaded from and saved to
+            index_mode: 'transcript' embeds whole transcripts, 'turn' embeds
+                windows of turn_window turns and pools them per transcript
+            turn_window: Consecutive turns per embedded chunk in turn mode
+            pool_n: Best chunks averaged per transcript in turn mode (1 = max)
+            compaction_threshold: Fraction of dead rows that triggers compaction
+            retrieval_mode: 'auto' uses semantic search when available and
+                keyword search otherwise, 'hybrid' runs both and fuses them
+            fusion: 'rrf' (reciprocal rank fusion) or 'weighted' (normalized scores)
+            hybrid_candidates: Candidates taken from each search in hybrid mode
+            hybrid_weights: Weights of the (keyword, semantic) rankings
+            rrf_k: Rank offset for reciprocal rank fusion
+            n_shards: Worker processes that split keyword and exact semantic
+                scoring (0 or 1 scores in this process)
+            shard_rebuild_fraction: Fraction of the sharded corpus that may change
+                before the shards are rebuilt; until then changed transcripts
+                are scored in this process and merged with the shard results
+            embedding_dtype: Storage type of the embedding matrix, 'float32',
+                'float16' or 'int8' (2x and 4x smaller, slightly less accurate)
+            rerank_candidates: Best quantized matches re-scored against exact
+                float32 vectors kept on disk, in transcript mode (0 disables)
+        """
+        if embedding_dtype not in DTYPES:
+            raise ValueError(f"Unknown embedding dtype {embedding_dtype!r}; expected {', '.join(DTYPES)}")
+        
+        self.store = TranscriptStore()
+        self.keyword_index = KeywordIndex()
+        self.metadata_index = MetadataIndex()
+        self.vector_index = None
+        self.turn_index = None
+        self.embedding_cache = None
+        self.batch_size = batch_size
+        self.ann_min_size = ann_min_size
+        self.ann_nprobe = ann_nprobe
+        self.ann_path = ann_path
+        self.compaction_threshold = compaction_threshold
+        self.retrieval_mode = retrieval_mode
+        self.fusion = fusion
+        self.hybrid_candidates = hybrid_candidates
+        self.hybrid_weights = hybrid_weights
+        self.rrf_k = rrf_k
+        self.n_shards = n_shards
+        self.shard_rebuild_fraction = shard_rebuild_fraction
+        self.version = 0
         self.has_embeddings = HAS_EMBEDDINGS and use_embeddings
         self.model = None
         
+        # Transcripts waiting for the model; embedded on first semantic use
+        self._backlog: List[str] = []
+        self._embed_lock = threading.RLock()
+        self._warmup_thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._shards: Optional[ShardPool] = None
+        # Ids added, replaced, removed or embedded since the shards were built
+        self._shard_changes: Set[str] = set()
+        self._listeners: List[Any] = []
+        # Records ever passed to add_transcripts; numbers the default ids
+        self._records_seen = 0
+        
         if self.has_embeddings:
             try:
-                self.model = SentenceTransformer('all-MiniLM-L6-v2')
-                logger.info("Loaded embedding model")
+                if index_mode == 'turn':
+                    self.turn_index = TurnIndex(window=turn_window, pool_n=pool_n, dtype=embedding_dtype)
+                else:
+                    self.vector_index = VectorIndex(dtype=embedding_dtype, rerank=rerank_candidates)
+                if cache_dir:
+                    self.embedding_cache = EmbeddingCache(cache_dir, EMBEDDING_MODEL)
             except Exception as e:
-                logger.warning(f"Could not load embedding model: {e}")
+                logger.warning(f"Could not initialize semantic index: {e}")
                 self.has_embeddings = False
         
         logger.info(f"ConversationRetriever initialized (embeddings: {self.has_embeddings})")
     
+    def load_file(self, filepath: str) -> int:
+        """
+        Load conversations from a JSON or JSON Lines file (optionally gzipped).
+        
+        JSON Lines files are streamed, so only one embedding batch of
+        parsed transcripts is pending at any time.
+        """
+        if is_jsonl_file(filepath):
+            return self.load_conversations(iter_jsonl(filepath))
+        data = load_json_file(filepath)
+        return self.load_conversations(data) if data else 0
+    
     def load_conversations(self, data: Any) -> int:
-        """Load conversations from JSON data"""
+        """Load conversations from JSON data or an iterable of conversation records"""
+        self.add_transcripts(data)
+        logger.info(f"Loaded {len(self.store)} conversations")
+        return len(self.store)
+    
+    def add_transcripts(self, data: Any) -> int:
+        """
+        Add conversations to the store and every index.
+        
+        A transcript whose id is already loaded replaces the old version.
+        Records without a ``transcript_id`` are numbered across calls
+        (``conv_0``, ``conv_1``, ...), so a later batch never replaces them.
+        
+        Args:
+            data: JSON data or an iterable of conversation records
+            
+        Returns:
+            Number of transcripts added or replaced
+        """
         conversations = self._extract_conversations(data)
+        pending: List[ConversationTranscript] = []
+        added = 0
         
-        for idx, conv_data in enumerate(conversations):
+        for idx, conv_data in enumerate(conversations, self._records_seen):
+            self._records_seen = idx + 1
             try:
                 transcript = self._parse_conversation(conv_data, idx)
-                self.conversations_by_id[transcript.transcript_id] = transcript
+                self._index_transcript(transcript)
+                added += 1
                 
-                # Create embeddings if available
-                if self.has_embeddings and self.model:
-                    try:
-                        text = transcript.get_full_text()
-                        embedding = self.model.encode(text, convert_to_tensor=True)
-                        self.embeddings[transcript.transcript_id] = embedding
-                    except:
-                        pass
+                # Embed in batches once the model is loaded, otherwise defer
+                if self.has_embeddings:
+                    pending.append(transcript)
+                    if len(pending) >= self.batch_size:
+                        self._embed_or_defer(pending)
+                        pending = []
                     
             except Exception as e:
                 logger.warning(f"Could not parse conversation {idx}: {e}")
         
-        logger.info(f"Loaded {len(self.conversations_by_id)} conversations")
-        return len(self.conversations_by_id)
+        if pending:
+            self._embed_or_defer(pending)
+        with self._embed_lock:
+            if self.embedding_cache is not None:
+                self.embedding_cache.flush()
+            if added:
+                self.version += 1
+                self._maybe_compact()
+            self._refresh_ann_index()
+        return added
+    
+    def save(self, path: str, source: Optional[Dict[str, Any]] = None):
+        """
+        Write the corpus and every index to a snapshot directory.
+        
+        The snapshot holds raw arrays and JSON only (no pickle) and replaces
+        any previous snapshot at ``path``. Transcripts still waiting for the
+        embedding model are recorded and embedded after ``load`` instead.
+        
+        Args:
+            path: Snapshot directory
+            source: JSON-serializable description of the data the snapshot
+                was built from, returned by ``snapshot_source``
+        """
+        with self._embed_lock:
+            parts = {
+                'store': self.store.snapshot(),
+                'keyword': self.keyword_index.snapshot(),
+                'metadata': self.metadata_index.snapshot()
+            }
+            if self.vector_index is not None:
+                parts['vectors'] = self.vector_index.snapshot()
+            if self.turn_index is not None:
+                parts['turns'] = self.turn_index.snapshot()
+            for listener in self._listeners:
+                parts.update(listener.snapshot_parts())
+            save_snapshot(path, parts, {
+                'transcripts': len(self.store),
+                'embedding_model': EMBEDDING_MODEL,
+                'backlog': self._backlog,
+                'records_seen': self._records_seen,
+                'source': source
+            })
+        logger.info(f"Saved snapshot of {len(self.store)} conversations to {path}")
+    
+    def load(self, path: str) -> int:
+        """
+        Replace the corpus and indexes with a snapshot written by ``save``.
+        
+        Nothing is parsed, tokenized or encoded: the text arena, postings
+        and embedding matrix are memory-mapped and only copied once they
+        are modified. Embeddings saved for another model, index mode or
+        dtype are discarded and the transcripts re-embedded on first
+        semantic use, mostly from the embedding cache.
+        
+        Returns:
+            Number of transcripts loaded
+            
+        Raises:
+            OSError: If there is no snapshot at ``path``
+            ValueError: If the snapshot has an unsupported format version
+        """
+        snapshot = Snapshot(path)
+        store = TranscriptStore()
+        store.restore(*snapshot.part('store'))
+        keyword_index = KeywordIndex()
+        keyword_index.restore(*snapshot.part('keyword'))
+        metadata_index = MetadataIndex()
+        metadata_index.restore(*snapshot.part('metadata'))
+        
+        with self._embed_lock:
+            self.close_shards()
+            self.store = store
+            self.keyword_index = keyword_index
+            self.metadata_index = metadata_index
+            self._backlog = []
+            self._records_seen = snapshot.info.get('records_seen', len(store))
+            if self.has_embeddings:
+                self._backlog = self._restore_semantic_index(snapshot)
+            self.version += 1
+            self._refresh_ann_index()
+            for listener in self._listeners:
+                if listener.transcripts_restored(snapshot):
+                    continue
+                listener.transcripts_cleared()
+                for transcript in self.store:
+                    listener.transcript_added(transcript)
+        logger.info(f"Loaded snapshot of {len(self.store)} conversations from {path}")
+        return len(self.store)
+    
+    @staticmethod
+    def snapshot_source(path: str) -> Optional[Dict[str, Any]]:
+        """The ``source`` a snapshot was saved with, or None if there is no usable snapshot"""
+        info = snapshot_info(path)
+        return None if info is None else info.get('source')
+    
+    def _restore_semantic_index(self, snapshot: Snapshot) -> List[str]:
+        """Restore the embedding index from a snapshot and return the ids left to embed"""
+        part = 'turns' if self.turn_index is not None else 'vectors'
+        index = self._empty_semantic_index()
+        try:
+            if snapshot.info.get('embedding_model') != EMBEDDING_MODEL:
+                raise ValueError(f"Snapshot embeddings come from {snapshot.info.get('embedding_model')}")
+            if part not in snapshot:
+                raise ValueError(f"Snapshot has no {part} index")
+            index.restore(*snapshot.part(part))
+            backlog = [tid for tid in snapshot.info.get('backlog', []) if tid in self.store]
+        except (ValueError, ImportError) as e:
+            logger.info(f"Re-embedding snapshot transcripts: {e}")
+            index = self._empty_semantic_index()
+            backlog = self.store.ids()
+        if part == 'turns':
+            self.turn_index = index
+        else:
+            self.vector_index = index
+        return backlog
+    
+    def _empty_semantic_index(self) -> Any:
+        """New empty embedding index configured like the current one"""
+        if self.turn_index is not None:
+            index = self.turn_index
+            return TurnIndex(index.window, index.pool_n, index.max_turns, index.vectors.dtype.name)
+        return VectorIndex(dtype=self.vector_index.dtype.name, rerank=self.vector_index.rerank)
+    
+    def warm_up(self, background: bool = False) -> bool:
+        """
+        Load the embedding model and embed any deferred transcripts.
+        
+        Args:
+            background: Do the work in a daemon thread; keyword retrieval
+                serves queries until it finishes
+            
+        Returns:
+            Whether semantic search is ready (always False when started
+            in the background)
+        """
+        if not self.has_embeddings:
+            return False
+        if background:
+            if self._warmup_thread is None or not self._warmup_thread.is_alive():
+                self._warmup_thread = threading.Thread(
+                    target=self._prepare_semantic, name="embedding-warmup", daemon=True
+                )
+                self._warmup_thread.start()
+            return False
+        return self._prepare_semantic()
+    
+    def _load_model(self) -> bool:
+        """Import sentence-transformers and load the model on first use"""
+        if self.model is None and self.has_embeddings:
+            try:
+                from sentence_transformers import SentenceTransformer
+                self.model = SentenceTransformer(EMBEDDING_MODEL)
+                logger.info("Loaded embedding model")
+            except Exception as e:
+                logger.warning(f"Could not load embedding model: {e}")
+                self.has_embeddings = False
+        return self.model is not None
+    
+    def _prepare_semantic(self) -> bool:
+        """Load the model and drain the backlog of unembedded transcripts"""
+        with self._embed_lock:
+            if not self._load_model():
+                return False
+            if self._backlog:
+                backlog, self._backlog = self._backlog, []
+                for start in range(0, len(backlog), self.batch_size):
+                    batch = [self.store.get(tid) for tid in backlog[start:start + self.batch_size]]
+                    self._embed_transcripts([t for t in batch if t is not None])
+                if self.embedding_cache is not None:
+                    self.embedding_cache.flush()
+                # Semantic results replace the keyword ones served meanwhile
+                self.version += 1
+                self._refresh_ann_index()
+            return True
+    
+    def _semantic_ready(self) -> bool:
+        """Whether a query can use semantic search right now"""
+        if not self.has_embeddings:
+            return False
+        if self._warmup_thread is not None and self._warmup_thread.is_alive():
+            return False
+        return self._prepare_semantic() and bool(self.vector_index or self.turn_index)
+    
+    def _embed_or_defer(self, transcripts: List[ConversationTranscript]):
+        """Embed a batch now if the model is loaded, otherwise queue it"""
+        with self._embed_lock:
+            if self.model is not None and not self._backlog:
+                self._embed_transcripts(transcripts)
+            else:
+                self._backlog.extend(t.transcript_id for t in transcripts)
+    
+    def update_transcript(self, conv_data: Dict[str, Any]) -> bool:
+        """Replace an already loaded transcript; returns False if its id is unknown"""
+        transcript_id = conv_data.get("transcript_id")
+        if transcript_id not in self.store:
+            return False
+        return self.add_transcripts([conv_data]) == 1
+    
+    def remove_transcript(self, transcript_id: str) -> bool:
+        """Remove a transcript from the store and every index"""
+        with self._embed_lock:
+            if not self.store.remove(transcript_id):
+                return False
+            self.keyword_index.remove(transcript_id)
+            self.metadata_index.remove(transcript_id)
+            if self.vector_index is not None:
+                self.vector_index.remove(transcript_id)
+            if self.turn_index is not None:
+                self.turn_index.remove(transcript_id)
+            if self._shards is not None:
+                self._shard_changes.add(transcript_id)
+            for listener in self._listeners:
+                listener.transcript_removed(transcript_id)
+            self.version += 1
+            self._maybe_compact()
+            return True
+    
+    def subscribe(self, listener: Any):
+        """
+        Keep ``listener`` informed of every change to the corpus.
+        
+        The listener is first given every loaded transcript, then has its
+        ``transcript_added(transcript)`` called for each added or replaced
+        transcript and ``transcript_removed(transcript_id)`` for each removal.
+        ``save`` stores the parts returned by its ``snapshot_parts()`` with
+        the snapshot, and ``load`` hands it the snapshot through
+        ``transcripts_restored(snapshot)``; when that returns False the
+        listener gets ``transcripts_cleared()`` and every loaded transcript
+        instead.
+        """
+        with self._embed_lock:
+            self._listeners.append(listener)
+            for transcript in self.store:
+                listener.transcript_added(transcript)
+    
+    def compact(self) -> int:
+        """Drop tombstoned rows from the store and indexes; returns dead store rows dropped"""
+        with self._embed_lock:
+            dropped = self.store.compact()
+            self.keyword_index.compact()
+            self.metadata_index.compact()
+            if self.vector_index is not None:
+                self.vector_index.compact()
+            if self.turn_index is not None:
+                self.turn_index.compact()
+            self._refresh_ann_index()
+            return dropped
+    
+    def _maybe_compact(self):
+        """Compact once dead rows pass the configured fraction of the corpus"""
+        if self.store.dead_rows > self.compaction_threshold * max(len(self.store), 1):
+            self.compact()
+    
+    def _index_transcript(self, transcript: ConversationTranscript):
+        """Add one parsed transcript to the store and keyword index"""
+        self.store.add(transcript)
+        if self._shards is not None:
+            self._shard_changes.add(transcript.transcript_id)
+        self.keyword_index.add_tokens(
+            transcript.transcript_id,
+            transcript.tokens + tokenize(transcript.metadata.get('reason_for_call', ''))
+        )
+        self.metadata_index.add(
+            transcript.transcript_id,
+            transcript.domain,
+            transcript.outcome,
+            transcript.metadata.get('time_of_interaction')
+        )
+        for listener in self._listeners:
+            listener.transcript_added(transcript)
+    
+    def _embed_transcripts(self, transcripts: List[ConversationTranscript]):
+        """Encode a batch of transcripts into the vector or turn index"""
+        try:
+            if self.turn_index is not None:
+                chunks = [self.turn_index.chunk([turn.text for turn in t.turns]) for t in transcripts]
+                vectors = self._encode_texts([text for c in chunks for _, _, text in c])
+                start = 0
+                for transcript, transcript_chunks in zip(transcripts, chunks):
+                    end = start + len(transcript_chunks)
+                    self.turn_index.add(
+                        transcript.transcript_id,
+                        [(first, count) for first, count, _ in transcript_chunks],
+                        vectors[start:end]
+                    )
+                    start = end
+            else:
+                vectors = self._encode_texts([t.get_full_text() for t in transcripts])
+                self.vector_index.add([t.transcript_id for t in transcripts], vectors)
+                if self._shards is not None:
+                    self._shard_changes.update(t.transcript_id for t in transcripts)
+        except Exception as e:
+            logger.warning(f"Could not embed batch of {len(transcripts)} conversations: {e}")
+    
+    def _encode_texts(self, texts: List[str]) -> List[Any]:
+        """Encode texts in one model call, reusing cached vectors"""
+        vectors = [None] * len(texts)
+        
+        if self.embedding_cache is not None:
+            keys = [EmbeddingCache.key(text) for text in texts]
+            vectors = [self.embedding_cache.get(key) for key in keys]
+        
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            encoded = self.model.encode(
+                [texts[i] for i in missing],
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+                if self.embedding_cache is not None:
+                    self.embedding_cache.put(keys[i], vector)
+        
+        return vectors
+    
+    def _embedding_texts(self, transcript: ConversationTranscript) -> List[str]:
+        """Texts embedded for a transcript in the current index mode"""
+        if self.turn_index is not None:
+            return [text for _, _, text in self.turn_index.chunk([turn.text for turn in transcript.turns])]
+        return [transcript.get_full_text()]
+    
+    def _refresh_ann_index(self):
+        """Load or (re)build the IVF index once the corpus is large enough"""
+        if self.vector_index is None or len(self.vector_index) < self.ann_min_size:
+            return
+        
+        if self.vector_index.ann is None and self.ann_path and os.path.exists(self.ann_path):
+            self.vector_index.load_ann(self.ann_path, self.ann_nprobe)
+        
+        # Rebuild when unindexed rows outnumber the indexed ones
+        ann = self.vector_index.ann
+        if ann is None or self.vector_index.rows > 2 * ann.size:
+            self.vector_index.build_ann(nprobe=self.ann_nprobe)
+            if self.ann_path:
+                self.vector_index.save_ann(self.ann_path)
     
-    def _extract_conversations(self, data: Any) -> List[Dict]:
+    def compact_embedding_cache(self) -> int:
+        """Drop cached embeddings for texts no longer in the corpus"""
+        if self.embedding_cache is None:
+            return 0
+        live_keys = (
+            EmbeddingCache.key(text)
+            for t in self.store
+            for text in self._embedding_texts(t)
+        )
+        return self.embedding_cache.compact(live_keys)
+    
+    def _extract_conversations(self, data: Any) -> Iterable[Dict]:
         """Extract conversation list from various JSON formats"""
         if isinstance(data, list):
             return data
@@ -97,8 +894,18 @@ class ConversationRetriever:
                 return data['conversations']
             elif 'conversation' in data or 'transcript_id' in data:
                 return [data]
+        elif data is not None and not isinstance(data, (str, bytes)) and hasattr(data, '__iter__'):
+            return self._iter_records(data)
         return []
     
+    def _iter_records(self, records: Iterable[Any]) -> Iterable[Dict]:
+        """Flatten a stream of records, each a transcript or a container of them"""
+        for record in records:
+            if isinstance(record, dict) and ('conversation' in record or 'turns' in record):
+                yield record
+            else:
+                yield from self._extract_conversations(record)
+    
     def _parse_conversation(self, conv_data: Dict[str, Any], idx: int) -> ConversationTranscript:
         """Parse a single conversation into structured format"""
         # Extract turns
@@ -155,71 +962,407 @@ class ConversationRetriever:
         else:
             return intent if intent else 'general_inquiry'
     
-    def retrieve(self, query: str, top_k: int = 3) -> List[str]:
-        """Retrieve relevant conversation IDs for a query"""
-        if self.has_embeddings and self.embeddings:
-            return self._retrieve_semantic(query, top_k)
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = 3,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        """
+        Retrieve relevant conversation IDs for a query
+        
+        Args:
+            query: Natural language query
+            top_k: Number of results to return
+            filters: Restrict results by 'domain' and 'outcome' (a value or
+                list of values) and interaction time ('since', 'until');
+                only matching transcripts are scored
+        """
+        if self.retrieval_mode == 'hybrid':
+            return self.retrieve_hybrid(query, top_k, filters).ids
+        candidates = self._filter_candidates(filters)
+        if self._semantic_ready():
+            return self._retrieve_semantic(query, top_k, candidates)
         else:
-            return self._retrieve_keyword(query, top_k)
+            return self._retrieve_keyword(query, top_k, candidates)
+    
+    def _filter_candidates(self, filters: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+        """Ids of transcripts matching the filters, None when there are none"""
+        if not filters:
+            return None
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filters {sorted(unknown)}; expected {', '.join(FILTER_KEYS)}")
+        return self.metadata_index.match(**filters)
     
-    def _retrieve_semantic(self, query: str, top_k: int) -> List[str]:
+    def retrieve_hybrid(
+        self,
+        query: str,
+        top_k: int = 3,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> RetrievalResult:
+        """
+        Run keyword and semantic search together and fuse their rankings.
+        
+        Each search contributes at most ``hybrid_candidates`` transcripts,
+        so fusion only re-ranks a bounded candidate set. While the model
+        is ready, encoding and the vector scan run on a worker thread as
+        BM25 scores in the calling thread; otherwise only keyword results
+        are used.
+        
+        Returns:
+            RetrievalResult with the fused ranking and per-stage timings in ms
+        """
+        start = time.perf_counter()
+        candidates = self._filter_candidates(filters)
+        timings = {'filter_ms': (time.perf_counter() - start) * 1000} if filters else {}
+        n_candidates = max(top_k, self.hybrid_candidates)
+        semantic = None
+        if self._semantic_ready():
+            semantic = self._semantic_executor().submit(
+                self._semantic_candidates, query, n_candidates, candidates
+            )
+        
+        stage = time.perf_counter()
+        rankings = self._keyword_search_many([query], n_candidates, candidates)
+        timings['keyword_ms'] = (time.perf_counter() - stage) * 1000
+        
+        turns = {}
+        if semantic is not None:
+            try:
+                matches, semantic_timings = semantic.result()
+                timings.update(semantic_timings)
+                rankings.append([(tid, score) for tid, score, _ in matches])
+                turns = {tid: matched for tid, _, matched in matches}
+            except Exception as e:
+                logger.warning(f"Semantic retrieval failed: {e}")
+        
+        stage = time.perf_counter()
+        fused = self._fuse(rankings, top_k)
+        if not fused:
+            fused = [(tid, 0.0) for tid in self._fallback_ids(top_k, candidates)]
+        timings['fusion_ms'] = (time.perf_counter() - stage) * 1000
+        timings['total_ms'] = (time.perf_counter() - start) * 1000
+        
+        return RetrievalResult(
+            ids=[tid for tid, _ in fused],
+            scores=[score for _, score in fused],
+            turns={tid: turns[tid] for tid, _ in fused if turns.get(tid)},
+            timings={name: round(ms, 3) for name, ms in timings.items()}
+        )
+    
+    def retrieve_many(
+        self,
+        queries: List[str],
+        top_k: int = 3,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[str]]:
+        """
+        Retrieve conversation IDs for a batch of queries.
+        
+        Queries are encoded in one model call and scored against the corpus
+        together; keyword retrieval walks each posting list once per batch.
+        
+        Args:
+            queries: Natural language queries
+            top_k: Number of results per query
+            filters: Filters applied to every query, as for ``retrieve``
+            
+        Returns:
+            One list of conversation IDs per query, as from ``retrieve``
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        candidates = self._filter_candidates(filters)
+        hybrid = self.retrieval_mode == 'hybrid'
+        n_candidates = max(top_k, self.hybrid_candidates) if hybrid else top_k
+        
+        semantic = None
+        if self._semantic_ready():
+            if hybrid:
+                semantic = self._semantic_executor().submit(
+                    self._semantic_search_many, queries, n_candidates, candidates
+                )
+            else:
+                try:
+                    return [
+                        [tid for tid, _, _ in m]
+                        for m in self._semantic_search_many(queries, top_k, candidates)
+                    ]
+                except Exception as e:
+                    logger.warning(f"Semantic retrieval failed: {e}")
+        
+        # Keyword scoring overlaps with the semantic batch in hybrid mode
+        keyword = self._keyword_search_many(queries, n_candidates, candidates)
+        if semantic is not None:
+            try:
+                semantic_matches = semantic.result()
+                keyword = [
+                    self._fuse([k, [(tid, score) for tid, score, _ in m]], top_k)
+                    for k, m in zip(keyword, semantic_matches)
+                ]
+            except Exception as e:
+                logger.warning(f"Semantic retrieval failed: {e}")
+        
+        fallback = None
+        results = []
+        for matches in keyword:
+            matches = matches[:top_k]
+            if not matches:
+                fallback = fallback if fallback is not None else self._fallback_ids(top_k, candidates)
+            results.append([tid for tid, _ in matches] if matches else list(fallback))
+        return results
+    
+    def retrieve_with_turns(
+        self,
+        query: str,
+        top_k: int = 3,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, List[int]]]:
+        """
+        Retrieve conversation IDs together with their best-matching turns.
+        
+        Turn ids are only known in turn index mode; otherwise each
+        transcript comes back with an empty list.
+        """
+        if self.retrieval_mode == 'hybrid':
+            result = self.retrieve_hybrid(query, top_k, filters)
+            return [(tid, result.turns.get(tid, [])) for tid in result.ids]
+        if self.turn_index is not None and self._semantic_ready():
+            candidates = self._filter_candidates(filters)
+            try:
+                query_embedding = self.encode_query(query)
+                with self._embed_lock:
+                    matches = self.turn_index.search(query_embedding, top_k, candidates)
+                return [(tid, turns) for tid, _, turns in matches]
+            except Exception as e:
+                logger.warning(f"Semantic retrieval failed: {e}")
+        return [(tid, []) for tid in self.retrieve(query, top_k, filters)]
+    
+    def _fuse(self, rankings: List[List[Tuple[str, float]]], top_k: int) -> List[Tuple[str, float]]:
+        """Combine keyword and semantic rankings with the configured fusion"""
+        if self.fusion == 'weighted':
+            return weighted_score_fusion(rankings, top_k, self.hybrid_weights)
+        return reciprocal_rank_fusion(rankings, top_k, k=self.rrf_k, weights=self.hybrid_weights)
+    
+    def _semantic_executor(self) -> ThreadPoolExecutor:
+        """Worker thread that runs semantic search alongside keyword scoring"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="semantic-search")
+        return self._executor
+    
+    def _semantic_candidates(
+        self,
+        query: str,
+        top_k: int,
+        candidates: Optional[List[str]] = None
+    ) -> Tuple[List[Tuple[str, float, List[int]]], Dict[str, float]]:
+        """Semantic (id, score, turns) matches for one query with encode and search timings"""
+        start = time.perf_counter()
+        query_embedding = self.encode_query(query)
+        encoded = time.perf_counter()
+        with self._embed_lock:
+            if self.turn_index is not None:
+                matches = self.turn_index.search(query_embedding, top_k, candidates)
+            else:
+                matches = [
+                    (tid, score, [])
+                    for tid, score in self._vector_search_many([query_embedding], top_k, candidates)[0]
+                ]
+        timings = {
+            'encode_ms': (encoded - start) * 1000,
+            'semantic_ms': (time.perf_counter() - encoded) * 1000
+        }
+        return matches, timings
+    
+    def _semantic_search_many(
+        self,
+        queries: List[str],
+        top_k: int,
+        candidates: Optional[List[str]] = None
+    ) -> List[List[Tuple[str, float, List[int]]]]:
+        """Semantic (id, score, turns) matches for a batch of queries"""
+        query_embeddings = self.encode_queries(queries)
+        with self._embed_lock:
+            if self.turn_index is not None:
+                return self.turn_index.search_many(query_embeddings, top_k, candidates)
+            return [
+                [(tid, score, []) for tid, score in m]
+                for m in self._vector_search_many(query_embeddings, top_k, candidates)
+            ]
+    
+    def encode_query(self, query: str) -> Any:
+        """Encode a query into a normalized embedding"""
+        self._load_model()
+        return self.model.encode(query, convert_to_numpy=True, normalize_embeddings=True)
+    
+    def encode_queries(self, queries: List[str]) -> Any:
+        """Encode a batch of queries into a matrix of normalized embeddings"""
+        self._load_model()
+        return self.model.encode(
+            queries,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+    
+    def _keyword_search_many(
+        self,
+        queries: List[str],
+        top_k: int,
+        candidates: Optional[List[str]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """BM25 search, fanned out to the shard workers when they are enabled"""
+        pool = self._shard_pool() if candidates is None else None
+        if pool is not None:
+            try:
+                changed = self._changed_since_shards()
+                if not changed:
+                    return pool.keyword_search_many(queries, top_k)
+                positions = self.keyword_index.positions
+                tail = self.keyword_index.search_many(
+                    queries, top_k, [tid for tid in changed if tid in positions]
+                )
+                return [
+                    _merge_shard_results(base, extra, changed, top_k, lambda tid: positions[tid])
+                    for base, extra in zip(pool.keyword_search_many(queries, top_k + len(changed)), tail)
+                ]
+            except Exception as e:
+                logger.warning(f"Sharded keyword search failed: {e}")
+        return self.keyword_index.search_many(queries, top_k, candidates)
+    
+    def _vector_search_many(
+        self,
+        query_embeddings: Any,
+        top_k: int,
+        candidates: Optional[List[str]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Cosine search, fanned out to the shard workers for exact unfiltered scans"""
+        pool = None
+        if candidates is None and self.vector_index.ann is None:
+            pool = self._shard_pool()
+        if pool is not None and pool.vector_ids:
+            try:
+                rerank = self.vector_index.rerank
+                k = max(top_k, rerank) if rerank else top_k
+                changed = self._changed_since_shards()
+                shortlists = pool.vector_search_many(query_embeddings, k + len(changed))
+                if changed:
+                    tail = self.vector_index.search_many(
+                        query_embeddings, k, candidates=[tid for tid in changed if tid in self.vector_index]
+                    )
+                    shortlists = [
+                        _merge_shard_results(base, extra, changed, k)
+                        for base, extra in zip(shortlists, tail)
+                    ]
+                if not rerank:
+                    return shortlists
+                return [
+                    self.vector_index.rerank_ids(embedding, [tid for tid, _ in shortlist], top_k)
+                    for embedding, shortlist in zip(query_embeddings, shortlists)
+                ]
+            except Exception as e:
+                logger.warning(f"Sharded semantic search failed: {e}")
+        if len(query_embeddings) == 1:
+            return [self.vector_index.search(query_embeddings[0], top_k, candidates=candidates)]
+        return self.vector_index.search_many(query_embeddings, top_k, candidates=candidates)
+    
+    def _shard_pool(self) -> Optional[ShardPool]:
+        """
+        Worker pool over a snapshot of the corpus.
+        
+        The pool is kept while transcripts change: searches drop changed
+        ids from its results and score them in this process instead. It is
+        rebuilt once more than ``shard_rebuild_fraction`` of its transcripts
+        have changed.
+        """
+        if self.n_shards <= 1 or not len(self.keyword_index):
+            return None
+        with self._embed_lock:
+            if self._shards is not None and (
+                len(self._shard_changes) > self.shard_rebuild_fraction * max(len(self._shards.doc_ids), 1)
+            ):
+                self.close_shards()
+            if self._shards is None:
+                try:
+                    self._shards = ShardPool(self.n_shards, self.keyword_index, self.vector_index)
+                    self._shard_changes = set()
+                except Exception as e:
+                    logger.warning(f"Could not start retrieval shards: {e}")
+                    self.n_shards = 0
+            return self._shards
+    
+    def close_shards(self):
+        """Stop the shard workers, if any"""
+        with self._embed_lock:
+            if self._shards is not None:
+                self._shards.close()
+                self._shards = None
+            self._shard_changes = set()
+    
+    def _changed_since_shards(self) -> Set[str]:
+        """Copy of the ids changed since the shards were built"""
+        with self._embed_lock:
+            return set(self._shard_changes)
+    
+    def _retrieve_semantic(
+        self,
+        query: str,
+        top_k: int,
+        candidates: Optional[List[str]] = None
+    ) -> List[str]:
         """Semantic search using embeddings"""
         try:
-            query_embedding = self.model.encode(query, convert_to_tensor=True)
-            scores = {}
-            
-            for tid, embedding in self.embeddings.items():
-                similarity = util.pytorch_cos_sim(query_embedding, embedding)[0][0].item()
-                scores[tid] = similarity
-            
-            sorted_ids = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-            return [tid for tid, _ in sorted_ids[:top_k]]
+            matches, _ = self._semantic_candidates(query, top_k, candidates)
+            return [tid for tid, _, _ in matches]
             
         except Exception as e:
             logger.warning(f"Semantic retrieval failed: {e}")
-            return self._retrieve_keyword(query, top_k)
+            return self._retrieve_keyword(query, top_k, candidates)
     
-    def _retrieve_keyword(self, query: str, top_k: int) -> List[str]:
-        """Keyword-based retrieval with domain scoring"""
-        query_lower = query.lower()
-        scores = {}
-        
-        for tid, transcript in self.conversations_by_id.items():
-            score = 0
-            
-            # Get all searchable text
-            all_text = transcript.get_full_text().lower()
-            reason = transcript.metadata.get('reason_for_call', '').lower()
-            all_content = all_text + " " + reason
-            
-            # Word matching
-            query_words = [w for w in query_lower.split() if len(w) > 2]
-            if query_words:
-                matches = sum(1 for w in query_words if w in all_content)
-                score = (matches / len(query_words)) * 100
-            
-            # Domain-specific boosting
-            if 'escalat' in query_lower and ('escalat' in all_content or 'supervisor' in all_content):
-                score += 50
-            if 'fraud' in query_lower and 'fraud' in all_content:
-                score += 50
-            if 'delivery' in query_lower and 'delivery' in all_content:
-                score += 50
-            if 'error' in query_lower and 'error' in all_content:
-                score += 30
-            
-            scores[tid] = score
-        
-        # Sort and return
-        sorted_ids = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        result = [tid for tid, score in sorted_ids[:top_k] if score > 0]
-        
-        return result if result else list(self.conversations_by_id.keys())[:top_k]
+    def _retrieve_keyword(
+        self,
+        query: str,
+        top_k: int,
+        candidates: Optional[List[str]] = None
+    ) -> List[str]:
+        """Keyword-based retrieval using the BM25 inverted index"""
+        result = [tid for tid, _ in self._keyword_search_many([query], top_k, candidates)[0]]
+        return result if result else self._fallback_ids(top_k, candidates)
+    
+    def _fallback_ids(self, top_k: int, candidates: Optional[List[str]] = None) -> List[str]:
+        """First loaded transcripts (within the filter) when nothing matches the query"""
+        return (candidates if candidates is not None else self.store.ids())[:top_k]
     
     def get_transcript(self, transcript_id: str) -> Optional[ConversationTranscript]:
         """Get transcript by ID"""
-        return self.conversations_by_id.get(transcript_id)
+        return self.store.get(transcript_id)
     
     def get_all_transcripts(self) -> List[ConversationTranscript]:
         """Get all loaded transcripts"""
-        return list(self.conversations_by_id.values())
\ No newline at end of file
+        return list(self.store)
+
+
+def _merge_shard_results(
+    base: List[Tuple[str, float]],
+    extra: List[Tuple[str, float]],
+    changed: Set[str],
+    top_k: int,
+    order: Optional[Any] = None
+) -> List[Tuple[str, float]]:
+    """
+    Top-k of shard results without changed ids and in-process results over them.
+    
+    Ties are broken by ``order(id)`` when given (the keyword index position,
+    as in an unsharded search), otherwise shard results come first. Shards
+    and this process add the same terms in a different order, so scores
+    are compared rounded to keep equal ones equal.
+    """
+    merged = [(tid, score) for tid, score in base if tid not in changed] + extra
+    if order is None:
+        merged.sort(key=lambda item: -item[1])
+    else:
+        merged.sort(key=lambda item: (-round(item[1], 9), order(item[0])))
+    return merged[:top_k]
\ No newline at end of file
@@ -2,22 +2,196 @@
 Task 2: Causal Analysis and Explanation Generation
 """
 
-import re
+import hashlib
+import json
 import logging
-from typing import List, Dict, Any, Tuple, Optional
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Set, Tuple, Optional
 from dataclasses import dataclass, field
 from datetime import datetime
 
 # Import ConversationTranscript from task1
 try:
-    from task1_retrieval import ConversationTranscript
+    from task1_retrieval import (
+        FILTER_KEYS, ConversationRetriever, ConversationTranscript, ConversationTurn, TranscriptStore
+    )
+    from models.analysis_history import AnalysisHistory
+    from models.cause_cube import CauseCube
+    from models.cue_matcher import CueHits, CueMatcher
+    from models.snapshot import Part, Snapshot, save_snapshot
+    from models.turn_postings import TurnPostings
 except ImportError:
     # If running as module
-    from .task1_retrieval import ConversationTranscript
+    from .task1_retrieval import (
+        FILTER_KEYS, ConversationRetriever, ConversationTranscript, ConversationTurn, TranscriptStore
+    )
+    from .models.analysis_history import AnalysisHistory
+    from .models.cause_cube import CauseCube
+    from .models.cue_matcher import CueHits, CueMatcher
+    from .models.snapshot import Part, Snapshot, save_snapshot
+    from .models.turn_postings import TurnPostings
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class CueRule:
+    """Emits ``text`` when any cue is present and no ``unless`` cue is"""
+    cues: Tuple[str, ...]
+    text: str
+    unless: Tuple[str, ...] = ()
+    # Value-free name the rule is counted under across transcripts
+    label: str = ''
+    
+    @property
+    def name(self) -> str:
+        return self.label or self.text
+
+
+# Regex cues; a rule using one formats the captured value into its text
+CAPTURES = {
+    'error_code': r'error\s*(?:code\s*)?(\d+)',
+    'amount': r'\$[\d,]+\.?\d*',
+}
+
+# Per outcome keyword: cause prefix, fallback cause and rules in output order
+CAUSE_RULES: List[Tuple[str, str, str, List[CueRule]]] = [
+    ('escalation', "Customer escalated due to: ", "Customer requested escalation to supervisor", [
+        CueRule(('three weeks', 'weeks'), "prolonged issue duration (multiple weeks)"),
+        CueRule(('multiple', 'several', 'repeated'), "multiple failed resolution attempts"),
+        CueRule(('frustrated', 'frustration'), "accumulated customer frustration"),
+        CueRule(('nobody', 'no one'), "previous agents unable to resolve"),
+        CueRule(('error_code',), "unresolved error code {}", label="unresolved error code"),
+    ]),
+    ('fraud', "Fraud detected: ", "Fraudulent transaction identified and addressed", [
+        CueRule(('amount',), "unauthorized charge of {}", label="unauthorized charge"),
+        CueRule(('new york',), "transaction in New York (customer never visited)"),
+        CueRule(('different location',), "transaction from different location", unless=('new york',)),
+        CueRule(('fraud alert',), "automatic fraud detection triggered"),
+        CueRule(('blocked', 'block'), "card blocked for security"),
+    ]),
+    ('delivery', "Delivery issue: ", "Package delivery discrepancy reported", [
+        CueRule(('shows delivered', 'marked delivered'), "package marked delivered in tracking"),
+        CueRule(('never received', 'not there'), "customer did not receive package"),
+        CueRule(('camera', 'neighbor'), "customer verified non-delivery"),
+        CueRule(('wrong address',), "possible wrong address delivery"),
+    ]),
+]
+
+# Supporting factor rules in output order
+FACTOR_RULES: List[CueRule] = [
+    # Time-based factors
+    CueRule(('three weeks', 'weeks'), "Extended duration: issue persisted for weeks"),
+    CueRule(('yesterday', 'today'), "Recent occurrence: within last 24 hours"),
+    # Repetition factors
+    CueRule(('multiple', 'several'), "Multiple occurrences or attempts documented"),
+    CueRule(('repeated', 'again'), "Repeated failures noted"),
+    # Emotional factors
+    CueRule(('frustrated', 'frustration'), "Customer expressed frustration"),
+    CueRule(('upset', 'angry'), "Customer emotional distress"),
+    # Action factors
+    CueRule(('checked', 'verified'), "Customer performed verification steps"),
+    CueRule(('supervisor', 'manager'), "Escalation to supervisor requested"),
+    # Response factors
+    CueRule(('expedited', 'immediately'), "Agent provided swift response"),
+    CueRule(('blocked', 'reversed'), "Immediate security action taken"),
+]
+
+MAX_FACTORS = 6
+MAX_EVIDENCE = 4
+
+# Turns containing any of these are evidence whatever the query
+EVIDENCE_INDICATORS = (
+    'escalate', 'supervisor', 'fraud', 'unauthorized',
+    'delivered', 'error', 'frustrated', 'weeks', 'multiple'
+)
+
+# Relevance of an evidence turn per query term and per indicator it contains
+QUERY_TERM_WEIGHT = 2
+INDICATOR_WEIGHT = 1
+
+# Query terms: tokens, as tokenize splits them, longer than three characters
+QUERY_TERM_RE = re.compile(r"[a-z0-9]{4,}")
+
+
+def _compile_cues() -> CueMatcher:
+    """One matcher for every cue the rule tables use"""
+    rules = FACTOR_RULES + [rule for _, _, _, outcome_rules in CAUSE_RULES for rule in outcome_rules]
+    cues = {cue for rule in rules for cue in rule.cues + rule.unless}
+    return CueMatcher(cues - CAPTURES.keys(), CAPTURES)
+
+
+def _fired_rules(rules: List[CueRule], hits: CueHits) -> List[Tuple[CueRule, str]]:
+    """Rules that fire on a set of cue hits with the value of their cue, in rule order"""
+    fired = []
+    for rule in rules:
+        for cue in rule.cues:
+            value = hits[cue]
+            if value is not None:
+                if not (rule.unless and any(hits[other] is not None for other in rule.unless)):
+                    fired.append((rule, value))
+                break
+    return fired
+
+
+def _apply_rules(rules: List[CueRule], hits: CueHits) -> List[str]:
+    """Texts of the rules that fire on a set of cue hits, in rule order"""
+    return [rule.text.format(value) for rule, value in _fired_rules(rules, hits)]
+
+
+def _outcome_rules(outcome: str) -> List[CueRule]:
+    """Cause rules of an outcome, empty when it has none"""
+    for keyword, _, _, rules in CAUSE_RULES:
+        if keyword in outcome:
+            return rules
+    return []
+
+
+def _amount_bucket(amount: str) -> str:
+    """Order of magnitude of a captured dollar amount, e.g. 'amount $100-$999'"""
+    try:
+        dollars = int(float(amount.lstrip('$').replace(',', '')))
+    except ValueError:
+        return "amount"
+    if dollars < 100:
+        return "amount under $100"
+    if dollars >= 10000:
+        return "amount $10,000 or more"
+    low = 10 ** (len(str(dollars)) - 1)
+    return f"amount ${low:,}-${low * 10 - 1:,}"
+
+
+def _cube_labels(outcome: str, hits: CueHits) -> List[Tuple[str, str]]:
+    """Value-free (kind, label) pairs of a transcript for the cause cube"""
+    labels = [('cause', rule.name) for rule, _ in _fired_rules(_outcome_rules(outcome), hits)]
+    labels += [('factor', rule.name) for rule, _ in _fired_rules(FACTOR_RULES, hits)]
+    if hits['error_code'] is not None:
+        labels.append(('entity', "error code"))
+    if hits['amount'] is not None:
+        labels.append(('entity', _amount_bucket(hits['amount'])))
+    return labels
+
+
+# Changes whenever the rules do, so a cube saved under other rules is rebuilt
+RULES_DIGEST = hashlib.sha1(repr((CAPTURES, CAUSE_RULES, FACTOR_RULES)).encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class TranscriptFeatures:
+    """Query-independent analysis inputs of one transcript"""
+    cues: Dict[str, str]
+    postings: TurnPostings
+    # Packed per-turn relevance from evidence indicators (see TurnPostings)
+    indicator_relevance: int
+
+
 @dataclass
 class CausalExplanation:
     """Output structure for causal analysis"""
@@ -43,31 +217,82 @@ class CausalExplanation:
 
 
 class CausalAnalyzer:
-    """Pattern-based causal analyzer for customer service conversations"""
+    """
+    Pattern-based causal analyzer for customer service conversations
+    
+    The cue hits, captured entities, turn postings and evidence indicator
+    turns of a transcript do not depend on the query. They are extracted
+    the first time the transcript is analyzed and kept in a bounded LRU
+    map keyed by transcript id, together with a hash of the transcript's
+    content, so analyzing it again only merges stored features and an edited
+    transcript is extracted afresh.
+    
+    The history of analyses is a ring buffer of the latest
+    ``history_size`` records, optionally spilled to a JSON Lines file.
+    
+    Once ``track`` subscribes it to a retriever, the analyzer keeps a
+    ``CauseCube`` of the causes, factors and entities detected in every
+    ingested transcript, updated as transcripts are added and removed, and
+    cites how common the analysis' cause is across the corpus among its
+    supporting factors.
+    """
+    
+    # Compiled once for all analyzers
+    cue_matcher = _compile_cues()
     
-    def __init__(self):
-        """Initialize the analyzer"""
-        self.history: List[Dict] = []
+    def __init__(
+        self,
+        feature_cache_size: int = 4096,
+        history_size: int = 1000,
+        history_path: Optional[str] = None
+    ):
+        """
+        Initialize the analyzer
+        
+        Args:
+            feature_cache_size: Transcripts whose features are kept (0 disables it)
+            history_size: Analysis records kept in memory
+            history_path: JSON Lines file every analysis record is appended to
+        """
+        self.history = AnalysisHistory(history_size, history_path)
+        self.feature_cache_size = feature_cache_size
+        self._features: "OrderedDict[str, Tuple[Tuple[int, int], TranscriptFeatures]]" = OrderedDict()
+        self.cube: Optional[CauseCube] = None
         logger.info("CausalAnalyzer initialized")
     
     def analyze(
         self,
         query: str,
         transcripts: List[ConversationTranscript],
-        include_history: bool = True
+        include_history: bool = True,
+        matched_turns: Optional[Dict[str, List[int]]] = None
     ) -> CausalExplanation:
-        """Analyze transcripts to generate causal explanation"""
+        """
+        Analyze transcripts to generate causal explanation
+        
+        Args:
+            query: User query
+            transcripts: Retrieved transcripts
+            include_history: Record the analysis in the history
+            matched_turns: Best-matching turn ids per transcript id from
+                turn-level retrieval, used as evidence instead of scanning
+        """
         if not transcripts:
             return self._empty_explanation(query)
         
         # Determine outcome type
         outcome = transcripts[0].outcome
         
-        # Generate analysis
-        primary_cause = self._generate_primary_cause(outcome, transcripts)
-        factors = self._extract_supporting_factors(outcome, transcripts)
-        evidence = self._extract_evidence(query, transcripts)
+        # Generate analysis from the transcripts' stored features
+        features = [self.features(t) for t in transcripts]
+        hits = self._match_cues(transcripts, features)
+        primary_cause = self._generate_primary_cause(outcome, transcripts, hits)
+        factors = self._extract_supporting_factors(outcome, transcripts, hits)
+        evidence = self._extract_evidence(query, transcripts, matched_turns, features)
         confidence = self._calculate_confidence(transcripts, factors)
+        prevalence = self._corpus_prevalence(outcome, transcripts[0].domain, hits)
+        if prevalence:
+            factors = factors[:MAX_FACTORS - 1] + [prevalence]
         
         explanation = CausalExplanation(
             query=query,
@@ -80,14 +305,113 @@ class CausalAnalyzer:
         
         # Update history
         if include_history:
-            self.history.append({
-                'query': query,
-                'explanation': primary_cause,
-                'timestamp': explanation.timestamp
-            })
+            self.record(explanation)
         
         return explanation
     
+    def record(self, explanation: CausalExplanation):
+        """Append an explanation to the analysis history"""
+        self.history.append({
+            'query': explanation.query,
+            'explanation': explanation.primary_cause,
+            'confidence': explanation.confidence,
+            'transcript_ids': list(explanation.relevant_transcript_ids),
+            'timestamp': explanation.timestamp
+        })
+    
+    def analyze_corpus(
+        self,
+        retriever: ConversationRetriever,
+        output_path: str,
+        filters: Optional[Dict[str, Any]] = None,
+        n_workers: Optional[int] = None,
+        chunk_size: int = 1000
+    ) -> Dict[str, Any]:
+        """
+        Explain every transcript of a corpus and aggregate causes per outcome.
+        
+        Transcripts are partitioned by outcome and domain and each partition
+        is cut into chunks of ``chunk_size``. With more than one worker, the
+        transcript store is written once as a snapshot that every worker
+        process memory-maps, so only transcript ids go to the workers. Each
+        worker explains its chunk (one transcript at a time, with the
+        outcome as the query), writes the explanations to a part file and
+        returns cause, factor and domain counts. The parent appends part
+        files to ``output_path`` in chunk order as they finish, keeping a
+        bounded number of chunks in flight, and merges the counts.
+        
+        Args:
+            retriever: Retriever whose transcripts are analyzed
+            output_path: JSON Lines file receiving one explanation per transcript
+            filters: Retriever filters (domain, outcome, since, until) selecting
+                the transcripts; None analyzes the whole corpus
+            n_workers: Worker processes (None uses every core, 1 runs in this process)
+            chunk_size: Transcripts per work unit
+        
+        Returns:
+            Report with the transcript count, elapsed time and per-outcome
+            aggregates: transcripts, mean confidence, domains, causes and
+            supporting factors, each counted most frequent first. Causes and
+            factors are counted per rule under its value-free name, so an
+            unauthorized charge counts once whatever the amount
+        
+        Raises:
+            ValueError: If filters has keys other than domain, outcome, since and until
+        """
+        start = time.perf_counter()
+        n_workers = n_workers or os.cpu_count() or 1
+        tasks = _corpus_tasks(retriever, filters or {}, max(1, chunk_size))
+        directory = tempfile.mkdtemp(prefix="corpus-analysis-")
+        totals: Dict[str, Dict[str, Any]] = {}
+        
+        try:
+            with open(output_path, 'wb') as output:
+                if n_workers <= 1 or len(tasks) <= 1:
+                    worker = CausalAnalyzer(feature_cache_size=16, history_size=0)
+                    for task in tasks:
+                        summary = _analyze_chunk(retriever.store, worker, task, directory)
+                        _collect_chunk(summary, output, totals)
+                else:
+                    snapshot_path = os.path.join(directory, 'store')
+                    save_snapshot(snapshot_path, {'store': retriever.store.snapshot()})
+                    context = multiprocessing.get_context('spawn')
+                    with ProcessPoolExecutor(
+                        max_workers=n_workers,
+                        mp_context=context,
+                        initializer=_init_corpus_worker,
+                        initargs=(snapshot_path,)
+                    ) as pool:
+                        pending = deque()
+                        for task in tasks:
+                            pending.append(pool.submit(_corpus_worker_chunk, task, directory))
+                            if len(pending) >= 2 * n_workers:
+                                _collect_chunk(pending.popleft().result(), output, totals)
+                        while pending:
+                            _collect_chunk(pending.popleft().result(), output, totals)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        
+        outcomes = {}
+        for outcome, total in sorted(totals.items()):
+            outcomes[outcome] = {
+                'transcripts': total['transcripts'],
+                'mean_confidence': round(total['confidence'] / total['transcripts'], 3),
+                'domains': dict(total['domains'].most_common()),
+                'causes': dict(total['causes'].most_common()),
+                'factors': dict(total['factors'].most_common())
+            }
+        report = {
+            'transcripts': sum(o['transcripts'] for o in outcomes.values()),
+            'workers': n_workers,
+            'chunks': len(tasks),
+            'elapsed_s': round(time.perf_counter() - start, 3),
+            'output': output_path,
+            'outcomes': outcomes
+        }
+        logger.info(f"Analyzed {report['transcripts']} transcripts in {report['elapsed_s']}s "
+                    f"with {n_workers} worker(s)")
+        return report
+    
     def _empty_explanation(self, query: str) -> CausalExplanation:
         """Create empty explanation when no transcripts found"""
         return CausalExplanation(
@@ -102,149 +426,173 @@ class CausalAnalyzer:
     def _generate_primary_cause(
         self, 
         outcome: str, 
-        transcripts: List[ConversationTranscript]
+        transcripts: List[ConversationTranscript],
+        hits: Optional[CueHits] = None
     ) -> str:
         """Generate the primary causal explanation"""
-        text = " ".join([t.get_full_text() for t in transcripts]).lower()
+        if hits is None:
+            hits = self._match_cues(transcripts)
         reason = transcripts[0].metadata.get('reason_for_call', '')
         
-        if 'escalation' in outcome:
-            causes = []
-            
-            if 'three weeks' in text or 'weeks' in text:
-                causes.append("prolonged issue duration (multiple weeks)")
-            if 'multiple' in text or 'several' in text or 'repeated' in text:
-                causes.append("multiple failed resolution attempts")
-            if 'frustrated' in text or 'frustration' in text:
-                causes.append("accumulated customer frustration")
-            if 'nobody' in text or 'no one' in text:
-                causes.append("previous agents unable to resolve")
-            
-            # Extract error codes
-            error_match = re.search(r'error\s*(?:code\s*)?(\d+)', text)
-            if error_match:
-                causes.append(f"unresolved error code {error_match.group(1)}")
-            
-            if causes:
-                return "Customer escalated due to: " + "; ".join(causes)
-            return "Customer requested escalation to supervisor"
-        
-        elif 'fraud' in outcome:
-            causes = []
-            
-            # Extract amount
-            amount_match = re.search(r'\$[\d,]+\.?\d*', text)
-            if amount_match:
-                causes.append(f"unauthorized charge of {amount_match.group(0)}")
-            
-            # Location analysis
-            if 'new york' in text.lower():
-                causes.append("transaction in New York (customer never visited)")
-            elif 'different location' in text:
-                causes.append("transaction from different location")
-            
-            if 'fraud alert' in text:
-                causes.append("automatic fraud detection triggered")
-            
-            if 'blocked' in text or 'block' in text:
-                causes.append("card blocked for security")
-            
-            if causes:
-                return "Fraud detected: " + "; ".join(causes)
-            return "Fraudulent transaction identified and addressed"
-        
-        elif 'delivery' in outcome:
-            causes = []
-            
-            if 'shows delivered' in text or 'marked delivered' in text:
-                causes.append("package marked delivered in tracking")
-            if 'never received' in text or 'not there' in text:
-                causes.append("customer did not receive package")
-            if 'camera' in text or 'neighbor' in text:
-                causes.append("customer verified non-delivery")
-            if 'wrong address' in text:
-                causes.append("possible wrong address delivery")
-            
-            if causes:
-                return "Delivery issue: " + "; ".join(causes)
-            return "Package delivery discrepancy reported"
+        for keyword, prefix, fallback, rules in CAUSE_RULES:
+            if keyword in outcome:
+                causes = _apply_rules(rules, hits)
+                if causes:
+                    return prefix + "; ".join(causes)
+                return fallback
         
         # Default case
         if reason:
             return f"Issue identified: {reason}"
         return f"Issue type: {outcome}"
     
+    def features(self, transcript: ConversationTranscript) -> TranscriptFeatures:
+        """Query-independent features of a transcript, extracted once per content"""
+        text = transcript.normalized_text
+        # Strings cache their hash, so this is free for a cached transcript
+        digest = (hash(text), len(transcript.turns))
+        entry = self._features.get(transcript.transcript_id)
+        if entry is not None and entry[0] == digest:
+            self._features.move_to_end(transcript.transcript_id)
+            return entry[1]
+        
+        postings = TurnPostings.build(transcript.normalized_turns)
+        features = TranscriptFeatures(
+            cues=self.cue_matcher.find_all(text),
+            postings=postings,
+            indicator_relevance=sum(
+                INDICATOR_WEIGHT * postings.lookup(indicator) for indicator in EVIDENCE_INDICATORS
+            )
+        )
+        if self.feature_cache_size > 0:
+            self._features[transcript.transcript_id] = (digest, features)
+            self._features.move_to_end(transcript.transcript_id)
+            while len(self._features) > self.feature_cache_size:
+                self._features.popitem(last=False)
+        return features
+    
+    def clear_features(self):
+        """Drop all stored transcript features"""
+        self._features.clear()
+    
+    def track(self, retriever: ConversationRetriever) -> CauseCube:
+        """Count the labels of every transcript the retriever holds, now and as it changes"""
+        self.cube = CauseCube()
+        retriever.subscribe(self)
+        return self.cube
+    
+    def transcript_added(self, transcript: ConversationTranscript):
+        """Count an added or replaced transcript in the cube"""
+        hits = self.cue_matcher.merge([self.cue_matcher.find_all(transcript.normalized_text)])
+        self.cube.add(
+            transcript.transcript_id,
+            transcript.domain,
+            transcript.outcome,
+            transcript.metadata.get('time_of_interaction'),
+            _cube_labels(transcript.outcome, hits)
+        )
+    
+    def transcript_removed(self, transcript_id: str):
+        """Subtract a removed transcript from the cube"""
+        self.cube.remove(transcript_id)
+    
+    def transcripts_cleared(self):
+        """Empty the cube before the retriever reloads its corpus"""
+        self.cube.clear()
+    
+    def snapshot_parts(self) -> Dict[str, Part]:
+        """The cube, saved along with the retriever's snapshot"""
+        arrays, state = self.cube.snapshot()
+        return {'cause_cube': (arrays, dict(state, rules=RULES_DIGEST))}
+    
+    def transcripts_restored(self, snapshot: Snapshot) -> bool:
+        """Restore the cube saved with a snapshot; False if it has none for the current rules"""
+        if 'cause_cube' not in snapshot:
+            return False
+        arrays, state = snapshot.part('cause_cube')
+        if state.get('rules') != RULES_DIGEST:
+            return False
+        self.cube.restore(arrays, state)
+        return True
+    
+    def _corpus_prevalence(self, outcome: str, domain: str, hits: CueHits) -> Optional[str]:
+        """Share of the domain's transcripts with this outcome that show the most common fired cause rule"""
+        if self.cube is None:
+            return None
+        best, best_count, total = None, 0, 0
+        for rule, _ in _fired_rules(_outcome_rules(outcome), hits):
+            count, total = self.cube.count('cause', rule.name, domain, outcome)
+            if count > best_count:
+                best, best_count = rule.name, count
+        if best is None:
+            return None
+        return f"Corpus prevalence: {best} in {best_count} of {total} {outcome} calls in {domain} ({best_count / total:.0%})"
+    
+    def _match_cues(
+        self,
+        transcripts: List[ConversationTranscript],
+        features: Optional[List[TranscriptFeatures]] = None
+    ) -> CueHits:
+        """Cue hits over all transcripts, merged from their features"""
+        if features is None:
+            features = [self.features(t) for t in transcripts]
+        return self.cue_matcher.merge(f.cues for f in features)
+    
     def _extract_supporting_factors(
         self, 
         outcome: str, 
-        transcripts: List[ConversationTranscript]
+        transcripts: List[ConversationTranscript],
+        hits: Optional[CueHits] = None
     ) -> List[str]:
         """Extract supporting factors from transcripts"""
-        text = " ".join([t.get_full_text() for t in transcripts]).lower()
-        factors = []
-        
-        # Time-based factors
-        if 'three weeks' in text or 'weeks' in text:
-            factors.append("Extended duration: issue persisted for weeks")
-        if 'yesterday' in text or 'today' in text:
-            factors.append("Recent occurrence: within last 24 hours")
-        
-        # Repetition factors
-        if 'multiple' in text or 'several' in text:
-            factors.append("Multiple occurrences or attempts documented")
-        if 'repeated' in text or 'again' in text:
-            factors.append("Repeated failures noted")
-        
-        # Emotional factors
-        if 'frustrated' in text or 'frustration' in text:
-            factors.append("Customer expressed frustration")
-        if 'upset' in text or 'angry' in text:
-            factors.append("Customer emotional distress")
-        
-        # Action factors
-        if 'checked' in text or 'verified' in text:
-            factors.append("Customer performed verification steps")
-        if 'supervisor' in text or 'manager' in text:
-            factors.append("Escalation to supervisor requested")
-        
-        # Response factors
-        if 'expedited' in text or 'immediately' in text:
-            factors.append("Agent provided swift response")
-        if 'blocked' in text or 'reversed' in text:
-            factors.append("Immediate security action taken")
-        
-        return factors[:6]  # Return top 6 factors
+        if hits is None:
+            hits = self._match_cues(transcripts)
+        return _apply_rules(FACTOR_RULES, hits)[:MAX_FACTORS]
     
     def _extract_evidence(
         self, 
         query: str, 
-        transcripts: List[ConversationTranscript]
+        transcripts: List[ConversationTranscript],
+        matched_turns: Optional[Dict[str, List[int]]] = None,
+        features: Optional[List[TranscriptFeatures]] = None
     ) -> List[Tuple[int, str]]:
-        """Extract relevant evidence spans from transcripts"""
+        """
+        Extract relevant evidence spans from transcripts
+        
+        Without retrieval-matched turns, candidate turns come from each
+        transcript's turn postings: turns containing query terms or
+        evidence indicators. Each transcript, in retrieval order, gives
+        its turns ranked by weighted matches (ties in turn order) until
+        ``MAX_EVIDENCE`` are found, so the cost follows the matching turns
+        of the first transcripts rather than the length of them all.
+        """
         evidence = []
-        query_terms = set(w.lower() for w in query.split() if len(w) > 3)
         
-        # Key indicators to look for
-        key_indicators = [
-            'escalate', 'supervisor', 'fraud', 'unauthorized', 
-            'delivered', 'error', 'frustrated', 'weeks', 'multiple'
-        ]
+        # Turns already ranked by retrieval need no rescan
+        if matched_turns:
+            for transcript in transcripts:
+                for turn_id in matched_turns.get(transcript.transcript_id, []):
+                    if len(evidence) >= MAX_EVIDENCE:
+                        return evidence
+                    if 0 <= turn_id < len(transcript.turns):
+                        evidence.append(self._evidence_span(transcript.turns[turn_id]))
+            if evidence:
+                return evidence
         
-        for transcript in transcripts:
-            for turn in transcript.turns:
-                text_lower = turn.text.lower()
-                
-                # Check for query term matches
-                query_matches = sum(1 for t in query_terms if t in text_lower)
-                
-                # Check for key indicators
-                indicator_matches = sum(1 for k in key_indicators if k in text_lower)
-                
-                if (query_matches > 0 or indicator_matches > 0) and len(evidence) < 4:
-                    display = turn.text[:120] + "..." if len(turn.text) > 120 else turn.text
-                    evidence.append((turn.turn_id, f"[{turn.speaker}] {display}"))
+        query_terms = set(QUERY_TERM_RE.findall(query.lower()))
+        if features is None:
+            features = [self.features(t) for t in transcripts]
         
-        return evidence
+        return [
+            self._evidence_span(transcripts[rank].turns[index])
+            for rank, index in _best_evidence(query_terms, features)
+        ]
+    
+    @staticmethod
+    def _evidence_span(turn: ConversationTurn) -> Tuple[int, str]:
+        """Turn id and truncated, speaker-labelled text of an evidence turn"""
+        display = turn.text[:120] + "..." if len(turn.text) > 120 else turn.text
+        return turn.turn_id, f"[{turn.speaker}] {display}"
     
     def _calculate_confidence(
         self, 
@@ -266,10 +614,146 @@ class CausalAnalyzer:
         
         return min(max(confidence, 0.6), 0.95)
     
-    def get_history(self) -> List[Dict]:
-        """Get analysis history"""
-        return self.history.copy()
+    def get_history(self, limit: Optional[int] = None) -> List[Dict]:
+        """Get the in-memory analysis history, optionally only the last ``limit`` records"""
+        return self.history.recent(limit)
     
     def clear_history(self):
-        """Clear analysis history"""
-        self.history = []
\ No newline at end of file
+        """Clear the in-memory analysis history"""
+        self.history.clear()
+    
+    def close(self):
+        """Close the analysis history's spill file"""
+        self.history.close()
+
+
+def _best_evidence(
+    query_terms: Set[str],
+    features: List[TranscriptFeatures]
+) -> List[Tuple[int, int]]:
+    """
+    (transcript rank, turn index) of up to ``MAX_EVIDENCE`` evidence turns
+    
+    Transcripts are taken in retrieval order and each contributes its most
+    relevant turns until ``MAX_EVIDENCE`` are found, so later transcripts
+    are usually never looked at. A transcript's turns are all scored at
+    once by adding the packed turn sets of the query terms to its packed
+    indicator relevance.
+    """
+    evidence: List[Tuple[int, int]] = []
+    for rank, transcript_features in enumerate(features):
+        postings = transcript_features.postings
+        relevance = transcript_features.indicator_relevance
+        for term in query_terms:
+            relevance += QUERY_TERM_WEIGHT * postings.lookup(term)
+        if not relevance:
+            continue
+        scores = postings.unpack(relevance)
+        # The sort is stable, so equal scores stay in turn order
+        ranked = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+        for index in ranked[:MAX_EVIDENCE - len(evidence)]:
+            if not scores[index]:
+                break
+            evidence.append((rank, index))
+        if len(evidence) >= MAX_EVIDENCE:
+            break
+    return evidence
+
+
+# Per-process state of corpus analysis workers
+_WORKER: Dict[str, Any] = {}
+
+
+def _corpus_tasks(
+    retriever: ConversationRetriever,
+    filters: Dict[str, Any],
+    chunk_size: int
+) -> List[Tuple[int, str, List[str]]]:
+    """Chunks of (chunk number, outcome, ids) covering each outcome/domain partition"""
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filters {sorted(unknown)}; expected {', '.join(FILTER_KEYS)}")
+    index = retriever.metadata_index
+    partitions = {}
+    for field_name in ('outcome', 'domain'):
+        wanted = filters.get(field_name)
+        if wanted is None:
+            partitions[field_name] = sorted(index.values[field_name])
+        else:
+            partitions[field_name] = [wanted] if isinstance(wanted, str) else list(wanted)
+    
+    tasks = []
+    for outcome in partitions['outcome']:
+        for domain in partitions['domain']:
+            ids = index.match(domain, outcome, filters.get('since'), filters.get('until'))
+            for i in range(0, len(ids), chunk_size):
+                tasks.append((len(tasks), outcome, ids[i:i + chunk_size]))
+    return tasks
+
+
+def _analyze_chunk(
+    store: TranscriptStore,
+    analyzer: CausalAnalyzer,
+    task: Tuple[int, str, List[str]],
+    directory: str
+) -> Dict[str, Any]:
+    """Explain one chunk into its part file and count its causes and factors per rule"""
+    number, outcome, ids = task
+    summary = {
+        'outcome': outcome,
+        'part': os.path.join(directory, f"part-{number:08d}.jsonl"),
+        'transcripts': 0,
+        'confidence': 0.0,
+        'domains': Counter(),
+        'causes': Counter(),
+        'factors': Counter()
+    }
+    with open(summary['part'], 'w', encoding='utf-8') as part:
+        for transcript_id in ids:
+            transcript = store.get(transcript_id)
+            if transcript is None:
+                continue
+            explanation = analyzer.analyze(outcome, [transcript], include_history=False)
+            hits = analyzer._match_cues([transcript])
+            causes = [rule.name for rule, _ in _fired_rules(_outcome_rules(outcome), hits)]
+            factors = [rule.name for rule, _ in _fired_rules(FACTOR_RULES, hits)[:MAX_FACTORS]]
+            record = {'transcript_id': transcript_id, 'domain': transcript.domain, 'outcome': outcome}
+            record.update(explanation.to_dict())
+            part.write(json.dumps(record, default=str) + "\n")
+            
+            summary['transcripts'] += 1
+            summary['confidence'] += explanation.confidence
+            summary['domains'][transcript.domain] += 1
+            summary['causes'].update(causes or [explanation.primary_cause])
+            summary['factors'].update(factors)
+    return summary
+
+
+def _collect_chunk(summary: Dict[str, Any], output, totals: Dict[str, Dict[str, Any]]):
+    """Append a finished chunk's part file to the output and merge its counts"""
+    with open(summary['part'], 'rb') as part:
+        shutil.copyfileobj(part, output)
+    os.remove(summary['part'])
+    if not summary['transcripts']:
+        return
+    total = totals.setdefault(summary['outcome'], {
+        'transcripts': 0, 'confidence': 0.0,
+        'domains': Counter(), 'causes': Counter(), 'factors': Counter()
+    })
+    total['transcripts'] += summary['transcripts']
+    total['confidence'] += summary['confidence']
+    for key in ('domains', 'causes', 'factors'):
+        total[key].update(summary[key])
+
+
+def _init_corpus_worker(snapshot_path: str):
+    """Memory-map the store snapshot once per worker process"""
+    store = TranscriptStore(view_cache_size=0)
+    store.restore(*Snapshot(snapshot_path).part('store'))
+    _WORKER['store'] = store
+    _WORKER['analyzer'] = CausalAnalyzer(feature_cache_size=16, history_size=0)
+
+
+def _corpus_worker_chunk(task: Tuple[int, str, List[str]], directory: str) -> Dict[str, Any]:
+    """Analyze one chunk in a worker process"""
+    return _analyze_chunk(_WORKER['store'], _WORKER['analyzer'], task, directory)
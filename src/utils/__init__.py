@@ -1,4 +1,10 @@
 """Utils module"""
-from .helpers import format_explanation, load_json_file
+from .helpers import (
+    format_explanation, is_jsonl_file, iter_jsonl, load_json_file, open_text,
+    save_results, tokenize
+)
 
-__all__ = ['format_explanation', 'load_json_file']
\ No newline at end of file
+__all__ = [
+    'format_explanation', 'is_jsonl_file', 'iter_jsonl', 'load_json_file',
+    'open_text', 'save_results', 'tokenize'
+]
\ No newline at end of file
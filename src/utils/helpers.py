@@ -2,9 +2,13 @@
 Helper utilities for the causal analysis system
 """
 
+import gzip
 import json
 import os
-from typing import Any, Dict, Optional
+import re
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
 
 
 def format_explanation(explanation: Any, use_emoji: bool = True) -> str:
@@ -39,14 +43,56 @@ def format_explanation(explanation: Any, use_emoji: bool = True) -> str:
     return "\n".join(lines)
 
 
+def open_text(filepath: str) -> IO[str]:
+    """Open a text file for reading, transparently decompressing gzip."""
+    with open(filepath, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(filepath, 'rt', encoding='utf-8')
+    return open(filepath, 'r', encoding='utf-8')
+
+
+def is_jsonl_file(filepath: str) -> bool:
+    """Check whether a path names a JSON Lines file (optionally gzipped)."""
+    name = filepath[:-3] if filepath.endswith('.gz') else filepath
+    return name.endswith(('.jsonl', '.ndjson'))
+
+
 def load_json_file(filepath: str) -> Optional[Dict]:
     """Load JSON data from file."""
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
+        with open_text(filepath) as f:
             return json.load(f)
     except FileNotFoundError:
         print(f"Error: File not found: {filepath}")
         return None
     except json.JSONDecodeError as e:
         print(f"Error: Invalid JSON in {filepath}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def iter_jsonl(filepath: str) -> Iterator[Dict]:
+    """Stream records from a JSON Lines file one line at a time."""
+    try:
+        with open_text(filepath) as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"Error: Invalid JSON on line {line_number} of {filepath}: {e}")
+    except FileNotFoundError:
+        print(f"Error: File not found: {filepath}")
+
+
+def save_results(results: Dict[str, Any], filepath: str) -> None:
+    """Save results dictionary as JSON."""
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, default=str)
+
+
+def tokenize(text: str, lowercase: bool = True) -> List[str]:
+    """Split text into lowercase alphanumeric tokens."""
+    return _TOKEN_RE.findall(text.lower() if lowercase else text)